@@ -0,0 +1,489 @@
+"""
+Detection of atypical days in the daily sales and profits of every company.
+
+Every closed day is compared with the days with sales before it: its sales are
+scored with the robust z-score of the rolling median and median absolute
+deviation (MAD) of the previous ANOMALY_WINDOW days, and days with a negative
+profit are flagged too. The scores of a series are computed at once with numpy.
+
+The flagged days are stored in ANOMALY_STORE with the last day checked of every
+company, so a detection only reads and scores the days closed since the last
+one, with the window of days before them (the whole series when those days are
+too sparse to fill the window). Change detection removes the flags from the
+first changed date onwards, and they are detected again.
+
+The API runs the detection in the background when ANOMALY_INTERVAL is over 0,
+and before answering a request otherwise.
+
+Usage:
+    python anomalies.py --all
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import query_builder
+from db import acquire_connection, execute_cached, release_connection
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# SQLite file of the flagged days, seconds between background detections (0
+# runs them on request), days of the rolling window and robust z-score over
+# which the sales of a day are atypical
+anomaly_store = os.getenv("ANOMALY_STORE", "anomalies.db")
+anomaly_interval = int(os.getenv("ANOMALY_INTERVAL", "0"))
+anomaly_window = int(os.getenv("ANOMALY_WINDOW", "28"))
+anomaly_threshold = float(os.getenv("ANOMALY_THRESHOLD", "3.5"))
+
+# Kinds of atypical days with their labels
+ANOMALY_KINDS = {
+    "sales_spike": "Venta atípicamente alta",
+    "sales_drop": "Venta atípicamente baja",
+    "negative_margin": "Margen negativo",
+}
+
+# Dataset of the daily series, its rows are read directly from the database
+SERIES_DATASET = "sales-vs-profit"
+
+_initialized = False
+_lock = threading.Lock()
+# Companies being detected, a detection of a company runs once at a time
+_running = set()
+
+
+def get_store_connection() -> sqlite3.Connection:
+    """
+    Opens the anomaly store, creating its tables on first use.
+
+    Returns:
+        sqlite3.Connection: The connection to the SQLite store.
+    """
+    global _initialized
+
+    connection = sqlite3.connect(anomaly_store, timeout=5)
+    if not _initialized:
+        with _lock:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS anomalies (
+                    db_number INTEGER NOT NULL,
+                    movement_date TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    value REAL NOT NULL,
+                    expected REAL,
+                    score REAL,
+                    detected_at TEXT NOT NULL,
+                    PRIMARY KEY (db_number, movement_date, kind)
+                )
+                """)
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS progress (
+                    db_number INTEGER PRIMARY KEY,
+                    last_date TEXT NOT NULL
+                )
+                """)
+            connection.commit()
+            _initialized = True
+    return connection
+
+
+def get_last_date(db_number: int) -> date:
+    """
+    Gets the last day checked of a company.
+
+    Args:
+        db_number (int): The database number.
+
+    Returns:
+        date: The last day checked, or None if it was never checked.
+    """
+    connection = get_store_connection()
+    try:
+        row = connection.execute(
+            "SELECT last_date FROM progress WHERE db_number = ?", (db_number,)
+        ).fetchone()
+    finally:
+        connection.close()
+    return date.fromisoformat(row[0]) if row is not None else None
+
+
+def fetch_series(db_number: int, since: date = None) -> tuple:
+    """
+    Reads the daily sales and profits of a company from the database.
+
+    Args:
+        db_number (int): The database number.
+        since (date): The first day to read (optional), all the days if None.
+
+    Returns:
+        tuple: The days, sales and profits as numpy arrays sorted by day, or None
+        if the connection fails.
+    """
+    import numpy as np  # Only needed for the detection
+
+    query, params, _ = query_builder.compile_dataset(
+        SERIES_DATASET,
+        os.getenv("DBMS"),
+        db_number,
+        "since" if since is not None else None,
+    )
+    if since is not None:
+        params += (query_builder.date_param(since),)
+
+    entry = acquire_connection(db_number)
+    if entry is None:
+        return None
+    reusable = False
+    try:
+        execute_cached(entry, query, params)
+        rows = entry["cursor"].fetchall()
+        reusable = True
+    finally:
+        release_connection(db_number, entry, reusable)
+
+    rows = sorted(
+        (str(movement_date)[:10], float(sales or 0), float(profit or 0))
+        for movement_date, sales, profit in rows
+    )
+    days = np.array([row[0] for row in rows], dtype="datetime64[D]")
+    sales = np.array([row[1] for row in rows], dtype=float)
+    profits = np.array([row[2] for row in rows], dtype=float)
+    return days, sales, profits
+
+
+def score_series(sales, window: int) -> tuple:
+    """
+    Scores the sales of every day against the rolling median and MAD of the
+    previous days.
+
+    Args:
+        sales (numpy.ndarray): The daily sales, sorted by day.
+        window (int): The number of previous days of the rolling window.
+
+    Returns:
+        tuple: The expected sales (rolling median) and the robust z-score of every
+        day, NaN for the first days, which have no full window.
+    """
+    import numpy as np
+
+    expected = np.full(len(sales), np.nan)
+    scores = np.full(len(sales), np.nan)
+    if len(sales) <= window:
+        return expected, scores
+
+    # Window of the previous days of every day from the window onwards
+    windows = np.lib.stride_tricks.sliding_window_view(sales, window)[:-1]
+    medians = np.median(windows, axis=1)
+    mads = np.median(np.abs(windows - medians[:, None]), axis=1)
+    deviations = sales[window:] - medians
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # 0.6745 makes the MAD consistent with the standard deviation
+        day_scores = np.where(mads > 0, 0.6745 * deviations / mads, 0.0)
+    expected[window:] = medians
+    scores[window:] = day_scores
+    return expected, scores
+
+
+def find_anomalies(days, sales, profits, after: date = None) -> list:
+    """
+    Finds the atypical days of a series.
+
+    Args:
+        days (numpy.ndarray): The days, sorted.
+        sales (numpy.ndarray): The sales of every day.
+        profits (numpy.ndarray): The profits of every day.
+        after (date): The last day already checked (optional), only the days
+            after it are returned.
+
+    Returns:
+        list: The day, kind, value, expected value and score of every atypical day.
+    """
+    import numpy as np
+
+    expected, scores = score_series(sales, anomaly_window)
+    checked = np.ones(len(days), dtype=bool)
+    if after is not None:
+        checked = days > np.datetime64(after, "D")
+
+    flags = [
+        ("sales_spike", checked & (scores > anomaly_threshold), sales, expected),
+        ("sales_drop", checked & (scores < -anomaly_threshold), sales, expected),
+        ("negative_margin", checked & (profits < 0), profits, None),
+    ]
+    anomalies = []
+    for kind, mask, values, expectations in flags:
+        for index in np.flatnonzero(mask):
+            anomalies.append(
+                (
+                    days[index].item(),
+                    kind,
+                    float(values[index]),
+                    float(expectations[index]) if expectations is not None else None,
+                    float(scores[index]) if expectations is not None else None,
+                )
+            )
+    return anomalies
+
+
+def detect(db_number: int, today: date = None) -> int:
+    """
+    Detects the atypical days of a company closed since its last detection.
+
+    Args:
+        db_number (int): The database number.
+        today (date): The current date (optional), today by default. The days
+            before it are closed.
+
+    Returns:
+        int: The number of atypical days found, or None if the detection of the
+        company is already running or the connection fails.
+    """
+    import numpy as np  # Only needed for the detection
+
+    last_closed = (today or date.today()) - timedelta(days=1)
+    with _lock:
+        if db_number in _running:
+            return None
+        _running.add(db_number)
+    try:
+        last_date = get_last_date(db_number)
+        if last_date is not None and last_date >= last_closed:
+            return 0
+
+        # The window of the first new day needs the previous days with sales,
+        # three times the window covers weekends and holidays
+        since = (
+            last_date - timedelta(days=3 * anomaly_window)
+            if last_date is not None
+            else None
+        )
+        series = fetch_series(db_number, since)
+        # On a sparse series those days don't fill the window, the new days
+        # would be left unscored, so the whole series is read instead
+        if (
+            series is not None
+            and since is not None
+            and np.count_nonzero(series[0] <= np.datetime64(last_date, "D"))
+            < anomaly_window
+        ):
+            series = fetch_series(db_number)
+        if series is None:
+            return None
+        days, sales, profits = series
+        closed = days <= last_closed
+        anomalies = find_anomalies(
+            days[closed], sales[closed], profits[closed], last_date
+        )
+
+        detected_at = datetime.now().isoformat(timespec="seconds")
+        connection = get_store_connection()
+        try:
+            connection.executemany(
+                "INSERT OR REPLACE INTO anomalies VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (db_number, day.isoformat(), *anomaly, detected_at)
+                    for day, *anomaly in anomalies
+                ],
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO progress VALUES (?, ?)",
+                (db_number, last_closed.isoformat()),
+            )
+            connection.commit()
+        finally:
+            connection.close()
+        return len(anomalies)
+    finally:
+        with _lock:
+            _running.discard(db_number)
+
+
+def get_anomalies(
+    db_number: int,
+    start: date = None,
+    end: date = None,
+    kinds: list = None,
+    limit: int = None,
+) -> list:
+    """
+    Gets the stored atypical days of a company, the most recent first.
+
+    Args:
+        db_number (int): The database number.
+        start (date): The first day (optional).
+        end (date): The first day after the period (optional).
+        kinds (list): The kinds of atypical days (optional), all if None.
+        limit (int): The maximum number of days (optional).
+
+    Returns:
+        list: The atypical days as dictionaries.
+    """
+    query = (
+        "SELECT movement_date, kind, value, expected, score FROM anomalies "
+        "WHERE db_number = ?"
+    )
+    params = [db_number]
+    if start is not None:
+        query += " AND movement_date >= ?"
+        params.append(start.isoformat())
+    if end is not None:
+        query += " AND movement_date < ?"
+        params.append(end.isoformat())
+    if kinds:
+        query += f" AND kind IN ({', '.join('?' for _ in kinds)})"
+        params += kinds
+    query += " ORDER BY movement_date DESC, kind"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+
+    connection = get_store_connection()
+    try:
+        rows = connection.execute(query, params).fetchall()
+    finally:
+        connection.close()
+    return [
+        {
+            "movement_date": movement_date,
+            "kind": kind,
+            "label": ANOMALY_KINDS[kind],
+            "value": value,
+            "expected": expected,
+            "score": score,
+        }
+        for movement_date, kind, value, expected, score in rows
+    ]
+
+
+def invalidate(db_number: int, since: date = None) -> int:
+    """
+    Removes the atypical days of a company from a date onwards, so they are
+    detected again.
+
+    Args:
+        db_number (int): The database number.
+        since (date): The first date that changed (optional), all the days if None.
+
+    Returns:
+        int: The number of atypical days removed.
+    """
+    try:
+        connection = get_store_connection()
+        try:
+            if since is None:
+                removed = connection.execute(
+                    "DELETE FROM anomalies WHERE db_number = ?", (db_number,)
+                ).rowcount
+                connection.execute(
+                    "DELETE FROM progress WHERE db_number = ?", (db_number,)
+                )
+            else:
+                removed = connection.execute(
+                    "DELETE FROM anomalies WHERE db_number = ? AND movement_date >= ?",
+                    (db_number, since.isoformat()),
+                ).rowcount
+                connection.execute(
+                    "UPDATE progress SET last_date = ? "
+                    "WHERE db_number = ? AND last_date >= ?",
+                    (
+                        (since - timedelta(days=1)).isoformat(),
+                        db_number,
+                        since.isoformat(),
+                    ),
+                )
+            connection.commit()
+        finally:
+            connection.close()
+    except sqlite3.Error as e:
+        print(f"Error al invalidar los días atípicos: {e}", flush=True)
+        return 0
+    return removed
+
+
+def detect_all(db_numbers: list) -> dict:
+    """
+    Detects the atypical days of several companies.
+
+    Args:
+        db_numbers (list): The database numbers.
+
+    Returns:
+        dict: The number of atypical days found per database number.
+    """
+    found = {}
+    for db_number in db_numbers:
+        try:
+            found[db_number] = detect(db_number)
+        except Exception as e:
+            print(
+                f"Error al detectar los días atípicos de la base {db_number}: {e}",
+                flush=True,
+            )
+    return found
+
+
+def watch(stop: threading.Event, interval: int, db_numbers: list):
+    """
+    Detects the atypical days of some companies until stopped.
+
+    Args:
+        stop (threading.Event): The event that stops the detection.
+        interval (int): The seconds between detections.
+        db_numbers (list): The database numbers.
+    """
+    while not stop.is_set():
+        detect_all(db_numbers)
+        stop.wait(interval)
+
+
+def start_detecting() -> threading.Event:
+    """
+    Starts the background detection of the atypical days, if enabled.
+
+    Returns:
+        threading.Event: The event that stops the detection, or None if disabled.
+    """
+    if anomaly_interval <= 0:
+        return None
+    number_of_databases = int(os.getenv("NUMBER_OF_DATABASES", "1"))
+    stop = threading.Event()
+    threading.Thread(
+        target=watch,
+        args=(stop, anomaly_interval, range(1, number_of_databases + 1)),
+        daemon=True,
+    ).start()
+    return stop
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Atypical days of the sales")
+    parser.add_argument("--db-number", type=int, default=1)
+    parser.add_argument("--all", action="store_true", help="Every company database")
+    parser.add_argument(
+        "--full", action="store_true", help="Detect again from the first day"
+    )
+    args = parser.parse_args()
+
+    db_numbers = (
+        range(1, int(os.getenv("NUMBER_OF_DATABASES", "1")) + 1)
+        if args.all
+        else [args.db_number]
+    )
+    for db_number in db_numbers:
+        if args.full:
+            invalidate(db_number)
+        start = time.perf_counter()
+        found = detect(db_number)
+        print(
+            f"  Base {db_number:02d}: {found} día(s) atípico(s) "
+            f"{(time.perf_counter() - start) * 1000:>8.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
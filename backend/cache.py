@@ -0,0 +1,254 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from datetime import date
+
+from datasets import DATASETS
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Seconds a dataset result is kept, it can be long when change detection is
+# enabled since changes invalidate the affected results (0 disables the cache)
+result_cache_ttl = int(os.getenv("RESULT_CACHE_TTL", "3600"))
+# SQLite file shared by the worker processes of the API (see serve.py), the
+# results are kept in the memory of the process when it's empty
+result_cache_file = os.getenv("RESULT_CACHE_FILE", "")
+
+_lock = threading.Lock()
+_entries = {}
+_initialized = False
+_local = threading.local()
+
+
+def get_store_connection() -> sqlite3.Connection:
+    """
+    Gets the connection of the current thread to the shared cache, creating its
+    table on first use.
+
+    Returns:
+        sqlite3.Connection: The connection to the SQLite cache.
+    """
+    global _initialized
+
+    connection = getattr(_local, "connection", None)
+    if connection is None:
+        connection = sqlite3.connect(result_cache_file, timeout=5)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        _local.connection = connection
+    if not _initialized:
+        with _lock:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    db_number INTEGER NOT NULL,
+                    tables TEXT NOT NULL,
+                    start_date TEXT,
+                    end_date TEXT,
+                    cached_at REAL NOT NULL,
+                    rows BLOB NOT NULL
+                )
+                """)
+            connection.commit()
+            _initialized = True
+    return connection
+
+
+def get_source_tables(name: str) -> set:
+    """
+    Gets the table prefixes a dataset reads from.
+
+    Args:
+        name (str): The dataset name.
+
+    Returns:
+        set: The table prefixes, e.g. {"FACTF", "CLIE"}.
+    """
+    dataset = DATASETS[name]
+    return {dataset["table"][0]} | {join[0] for join in dataset.get("joins", [])}
+
+
+def get(key: tuple):
+    """
+    Gets a cached dataset result.
+
+    Args:
+        key (tuple): The dataset name, database number, date filter and its bounds.
+
+    Returns:
+        list: The cached rows, or None if they are not cached or expired.
+    """
+    if result_cache_ttl <= 0:
+        return None
+    if result_cache_file:
+        return get_shared(key)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry["cached_at"] > result_cache_ttl:
+            del _entries[key]
+            return None
+        return entry["rows"]
+
+
+def put(key: tuple, rows: list, start: date = None, end: date = None):
+    """
+    Caches a dataset result.
+
+    Args:
+        key (tuple): The dataset name, database number, date filter and its bounds.
+        rows (list): The rows of the result.
+        start (date): The first date of the result (optional), None if unbounded.
+        end (date): The first date after the result (optional), None if unbounded.
+    """
+    if result_cache_ttl <= 0:
+        return
+    if result_cache_file:
+        put_shared(key, rows, start, end)
+        return
+    name, db_number = key[0], key[1]
+    with _lock:
+        _entries[key] = {
+            "rows": rows,
+            "db_number": db_number,
+            "tables": get_source_tables(name),
+            "start": start,
+            "end": end,
+            "cached_at": time.time(),
+        }
+
+
+def invalidate(db_number: int, table: str, since: date = None) -> int:
+    """
+    Removes the cached results of a database that read from a changed table.
+
+    Only the results that cover dates from since onwards are removed, the
+    results of closed periods before it are kept.
+
+    Args:
+        db_number (int): The database number.
+        table (str): The prefix of the changed table, e.g. FACTF.
+        since (date): The first date that changed (optional), None if unknown.
+
+    Returns:
+        int: The number of results removed.
+    """
+    if result_cache_file:
+        return invalidate_shared(db_number, table, since)
+    with _lock:
+        keys = [
+            key
+            for key, entry in _entries.items()
+            if entry["db_number"] == db_number
+            and table in entry["tables"]
+            and (since is None or entry["end"] is None or entry["end"] > since)
+        ]
+        for key in keys:
+            del _entries[key]
+    return len(keys)
+
+
+def clear():
+    """
+    Removes every cached result.
+    """
+    if result_cache_file:
+        connection = get_store_connection()
+        connection.execute("DELETE FROM results")
+        connection.commit()
+        return
+    with _lock:
+        _entries.clear()
+
+
+def get_shared(key: tuple):
+    """
+    Gets a dataset result from the shared cache.
+
+    Args:
+        key (tuple): The dataset name, database number, date filter and its bounds.
+
+    Returns:
+        list: The cached rows, or None if they are not cached, expired or the
+        cache can't be read.
+    """
+    try:
+        row = (
+            get_store_connection()
+            .execute(
+                "SELECT rows FROM results WHERE key = ? AND cached_at >= ?",
+                (repr(key), time.time() - result_cache_ttl),
+            )
+            .fetchone()
+        )
+    except sqlite3.Error as e:
+        print(f"Error al leer el caché de resultados: {e}", flush=True)
+        return None
+    return pickle.loads(row[0]) if row is not None else None
+
+
+def put_shared(key: tuple, rows: list, start: date = None, end: date = None):
+    """
+    Stores a dataset result in the shared cache, removing the expired ones.
+
+    Args:
+        key (tuple): The dataset name, database number, date filter and its bounds.
+        rows (list): The rows of the result.
+        start (date): The first date of the result (optional), None if unbounded.
+        end (date): The first date after the result (optional), None if unbounded.
+    """
+    name, db_number = key[0], key[1]
+    # The prefixes are delimited by commas to find them with instr()
+    tables = "," + ",".join(sorted(get_source_tables(name))) + ","
+    now = time.time()
+    try:
+        connection = get_store_connection()
+        connection.execute(
+            "DELETE FROM results WHERE cached_at < ?", (now - result_cache_ttl,)
+        )
+        connection.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                repr(key),
+                db_number,
+                tables,
+                start.isoformat() if start else None,
+                end.isoformat() if end else None,
+                now,
+                pickle.dumps(rows, protocol=pickle.HIGHEST_PROTOCOL),
+            ),
+        )
+        connection.commit()
+    except sqlite3.Error as e:
+        print(f"Error al guardar en el caché de resultados: {e}", flush=True)
+
+
+def invalidate_shared(db_number: int, table: str, since: date = None) -> int:
+    """
+    Removes the results of the shared cache that read from a changed table.
+
+    Args:
+        db_number (int): The database number.
+        table (str): The prefix of the changed table, e.g. FACTF.
+        since (date): The first date that changed (optional), None if unknown.
+
+    Returns:
+        int: The number of results removed.
+    """
+    query = "DELETE FROM results WHERE db_number = ? AND instr(tables, ?) > 0"
+    params = [db_number, f",{table},"]
+    if since is not None:
+        query += " AND (end_date IS NULL OR end_date > ?)"
+        params.append(since.isoformat())
+    try:
+        connection = get_store_connection()
+        removed = connection.execute(query, params).rowcount
+        connection.commit()
+    except sqlite3.Error as e:
+        print(f"Error al invalidar el caché de resultados: {e}", flush=True)
+        return 0
+    return removed
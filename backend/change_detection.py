@@ -0,0 +1,319 @@
+import hashlib
+import os
+import threading
+import time
+from datetime import date, datetime
+
+import anomalies
+import cache
+import cohorts
+import query_builder
+import sketches
+from datasets import DISTINCT_ENTITIES
+from db import acquire_connection, execute_cached, release_connection
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Seconds between checks of the source tables (0 disables the background polling,
+# the checks then run when the data version is requested)
+change_detection_interval = int(os.getenv("CHANGE_DETECTION_INTERVAL", "60"))
+# Recent months fingerprinted one by one to find the periods that changed
+change_detection_months = int(os.getenv("CHANGE_DETECTION_MONTHS", "3"))
+
+# Source tables with their date and document number columns, and whether their
+# documents are cancelled with STATUS = 'C'. The PAR_FACTF lines are written with
+# their FACTF invoice, so the invoice fingerprint covers them
+SOURCE_TABLES = {
+    "FACTF": {"date": "FECHA_DOC", "document": "CVE_DOC", "status": True},
+    "COMPC": {"date": "FECHA_DOC", "document": "CVE_DOC", "status": True},
+    "MINVE": {"date": "FECHA_DOCU", "document": "NUM_MOV", "status": False},
+}
+
+_lock = threading.Lock()
+_state = {}
+
+
+def fingerprint_queries(prefix: str, db_number: int) -> tuple:
+    """
+    Builds the fingerprint queries of a source table for the current DBMS.
+
+    Args:
+        prefix (str): The table prefix, e.g. FACTF.
+        db_number (int): The database number.
+
+    Returns:
+        tuple: The query of the whole table (count, max date, max document and
+        cancelled count) and the query of its months from a date onwards.
+    """
+    dialect = query_builder.DIALECTS[os.getenv("DBMS")]
+    source = SOURCE_TABLES[prefix]
+    table = query_builder.table_name(prefix, db_number)
+    date_column = source["date"]
+    cancelled = (
+        "SUM(CASE WHEN STATUS = 'C' THEN 1 ELSE 0 END)" if source["status"] else "0"
+    )
+    year = dialect["year"].format(date_column)
+    month = dialect["month"].format(date_column)
+
+    table_query = (
+        f"SELECT COUNT(*), MAX({date_column}), MAX({source['document']}), "
+        f"{cancelled} FROM {table}"
+    )
+    months_query = (
+        f"SELECT {year}, {month}, COUNT(*), {cancelled} FROM {table} "
+        f"WHERE {date_column} >= {dialect['placeholder']} GROUP BY {year}, {month}"
+    )
+    return table_query, months_query
+
+
+def get_fingerprints(db_number: int) -> dict:
+    """
+    Gets the fingerprints of the source tables of a company database.
+
+    Args:
+        db_number (int): The database number.
+
+    Returns:
+        dict: The fingerprint of every table, with its whole table values and the
+        count and cancelled count of each recent month, or None if the connection fails.
+    """
+    entry = acquire_connection(db_number)
+    if entry is None:
+        return None
+
+    since = query_builder.month_start(date.today(), change_detection_months - 1)
+    fingerprints = {}
+    reusable = False
+    try:
+        for prefix in SOURCE_TABLES:
+            table_query, months_query = fingerprint_queries(prefix, db_number)
+            execute_cached(entry, table_query)
+            count, max_date, max_document, cancelled = entry["cursor"].fetchone()
+            execute_cached(entry, months_query, (query_builder.date_param(since),))
+            months = {
+                (int(year), int(month)): (int(month_count), int(month_cancelled or 0))
+                for year, month, month_count, month_cancelled in entry[
+                    "cursor"
+                ].fetchall()
+            }
+            fingerprints[prefix] = {
+                "table": (count, str(max_date), str(max_document), cancelled or 0),
+                "months": months,
+                "since": since,
+            }
+        reusable = True
+    finally:
+        release_connection(db_number, entry, reusable)
+    return fingerprints
+
+
+def get_changed_since(previous: dict, current: dict) -> date:
+    """
+    Finds the first date that changed between two fingerprints of a table.
+
+    The changes are located in the recent months when the months that changed
+    explain the whole table change (same difference in count and cancelled count).
+    Otherwise, e.g. a document of an older period was cancelled or its date
+    edited, the changed date is unknown.
+
+    Args:
+        previous (dict): The previous fingerprint of the table.
+        current (dict): The current fingerprint of the table.
+
+    Returns:
+        date: The first day of the first month that changed, or None if unknown.
+    """
+    months = set(previous["months"]) | set(current["months"])
+    window_start = max(previous["since"], current["since"])
+    months = {month for month in months if date(month[0], month[1], 1) >= window_start}
+    changed = [
+        month
+        for month in months
+        if previous["months"].get(month) != current["months"].get(month)
+    ]
+    if not changed:
+        return None
+
+    count_delta = current["table"][0] - previous["table"][0]
+    cancelled_delta = current["table"][3] - previous["table"][3]
+    months_count_delta = sum(
+        current["months"].get(month, (0, 0))[0]
+        - previous["months"].get(month, (0, 0))[0]
+        for month in months
+    )
+    months_cancelled_delta = sum(
+        current["months"].get(month, (0, 0))[1]
+        - previous["months"].get(month, (0, 0))[1]
+        for month in months
+    )
+    if count_delta != months_count_delta or cancelled_delta != months_cancelled_delta:
+        return None
+
+    year, month = min(changed)
+    return date(year, month, 1)
+
+
+def get_version(fingerprints: dict) -> int:
+    """
+    Derives the data version of a database from the fingerprints of its source
+    tables.
+
+    The version isn't a counter of the changes seen by a process: the worker
+    processes of the API (see serve.py) check the tables on their own, and the
+    ones that saw the same fingerprints report the same version.
+
+    Args:
+        fingerprints (dict): The fingerprint of every source table.
+
+    Returns:
+        int: The version, 0 without fingerprints, a 52-bit hash otherwise so it
+        stays exact as a JavaScript number.
+    """
+    if not fingerprints:
+        return 0
+    text = "|".join(
+        f"{prefix}:{int(count)}:{max_date}:{max_document}:{int(cancelled)}"
+        for prefix, (count, max_date, max_document, cancelled) in sorted(
+            (prefix, fingerprint["table"])
+            for prefix, fingerprint in fingerprints.items()
+        )
+    )
+    return int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:13], 16)
+
+
+def check(db_number: int) -> list:
+    """
+    Checks the source tables of a company database for changes.
+
+    The cached results, distinct count sketches, atypical days and cohort counts
+    that read from a changed table are invalidated, only from
+    the first changed period onwards when it can be located, and the data version
+    of the database changes with the fingerprints (see get_version).
+
+    Args:
+        db_number (int): The database number.
+
+    Returns:
+        list: The changed tables and their first changed date (None if unknown).
+    """
+    fingerprints = get_fingerprints(db_number)
+    if fingerprints is None:
+        return []
+
+    now = time.time()
+    changes = []
+    with _lock:
+        state = _state.setdefault(
+            db_number, {"version": 0, "checked_at": None, "tables": {}}
+        )
+        for prefix, current in fingerprints.items():
+            previous = state["tables"].get(prefix)
+            current["changed_at"] = previous["changed_at"] if previous else now
+            if previous is not None and previous["table"] != current["table"]:
+                current["changed_at"] = now
+                changes.append((prefix, get_changed_since(previous, current)))
+            state["tables"][prefix] = current
+        state["version"] = get_version(state["tables"])
+        state["checked_at"] = now
+
+    for prefix, since in changes:
+        removed = cache.invalidate(db_number, prefix, since)
+        sketches.invalidate(
+            db_number,
+            [
+                entity
+                for entity in DISTINCT_ENTITIES
+                if prefix in cache.get_source_tables(f"{entity}-names")
+            ],
+            since,
+        )
+        if prefix in cache.get_source_tables(anomalies.SERIES_DATASET):
+            anomalies.invalidate(db_number, since)
+        if prefix in cache.get_source_tables(cohorts.COHORT_DATASET):
+            cohorts.invalidate(db_number, since)
+        print(
+            f"Cambios en {query_builder.table_name(prefix, db_number)} desde "
+            f"{since or 'fecha desconocida'}, {removed} resultados invalidados",
+            flush=True,
+        )
+    return changes
+
+
+def get_data_version(db_number: int) -> dict:
+    """
+    Gets the current data version of a company database.
+
+    A check runs first when the database was never checked or the background
+    polling is disabled.
+
+    Args:
+        db_number (int): The database number.
+
+    Returns:
+        dict: The version, the time of the last check and the fingerprint of
+        every source table.
+    """
+    with _lock:
+        state = _state.get(db_number)
+    if state is None or change_detection_interval <= 0:
+        check(db_number)
+
+    with _lock:
+        state = _state.get(db_number, {"version": 0, "checked_at": None, "tables": {}})
+        return {
+            "db_number": db_number,
+            "version": state["version"],
+            "checked_at": (
+                datetime.fromtimestamp(state["checked_at"]).isoformat(
+                    timespec="seconds"
+                )
+                if state["checked_at"]
+                else None
+            ),
+            "tables": {
+                prefix: {
+                    "count": fingerprint["table"][0],
+                    "max_date": fingerprint["table"][1],
+                    "max_document": fingerprint["table"][2],
+                    "cancelled": fingerprint["table"][3],
+                    "changed_at": datetime.fromtimestamp(
+                        fingerprint["changed_at"]
+                    ).isoformat(timespec="seconds"),
+                }
+                for prefix, fingerprint in state["tables"].items()
+            },
+        }
+
+
+def poll(stop: threading.Event):
+    """
+    Checks every company database until stopped.
+
+    Args:
+        stop (threading.Event): The event that stops the polling.
+    """
+    number_of_databases = int(os.getenv("NUMBER_OF_DATABASES", "1"))
+    while not stop.is_set():
+        for db_number in range(1, number_of_databases + 1):
+            try:
+                check(db_number)
+            except Exception as e:
+                print(
+                    f"Error al detectar cambios en la base {db_number}: {e}", flush=True
+                )
+        stop.wait(change_detection_interval)
+
+
+def start_polling() -> threading.Event:
+    """
+    Starts the background polling of the source tables, if enabled.
+
+    Returns:
+        threading.Event: The event that stops the polling, or None if disabled.
+    """
+    if change_detection_interval <= 0:
+        return None
+    stop = threading.Event()
+    threading.Thread(target=poll, args=(stop,), daemon=True).start()
+    return stop
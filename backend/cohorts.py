@@ -0,0 +1,239 @@
+"""
+Monthly cohort retention of the clients.
+
+A cohort is the clients whose first purchase is in a month, and its retention
+is the number of them that purchased again every month after it. The database
+returns the distinct months with purchases of every client (the client-months
+dataset), and the first month, cohort and offset of every row are computed in
+one vectorized pass with numpy.
+
+The counts by cohort and offset of every company are kept in memory up to the
+last closed month. When months close, only the rows of the new months are read
+and added to the counts, as the first month of the clients already counted
+can't change. Change detection removes the months from the first changed date
+onwards, and they are read again. The retention matrix is built from the counts
+and kept with the data version of the database.
+"""
+
+import threading
+from datetime import date
+
+# Dataset of the months with purchases of every client
+COHORT_DATASET = "client-months"
+
+# Counts of every company keyed by db_number: the last month added, the first
+# month of every client, the clients of every month, the counts by cohort and
+# offset, and the retention matrix with its data version
+_states = {}
+# Lock of every company keyed by db_number, held while its months are read so
+# the other companies aren't blocked by the query
+_locks = {}
+_lock = threading.Lock()
+
+
+def get_lock(db_number: int) -> threading.Lock:
+    """
+    Gets the lock of the counts of a company.
+
+    Args:
+        db_number (int): The database number.
+
+    Returns:
+        threading.Lock: The lock, created on the first call.
+    """
+    with _lock:
+        return _locks.setdefault(db_number, threading.Lock())
+
+
+def month_index(year: int, month: int) -> int:
+    """
+    Converts a month to the number of months since the year 0.
+
+    Args:
+        year (int): The year.
+        month (int): The month.
+
+    Returns:
+        int: The month index.
+    """
+    return year * 12 + month - 1
+
+
+def new_state() -> dict:
+    """
+    Creates the empty counts of a company.
+
+    Returns:
+        dict: The counts, without months.
+    """
+    return {
+        "last_month": None,
+        "first": {},
+        "clients": {},
+        "counts": {},
+        "version": None,
+        "matrix": None,
+    }
+
+
+def accumulate(state: dict, rows: list, last_month: int):
+    """
+    Adds the client months after the last month of the counts, up to the last
+    closed month.
+
+    Args:
+        state (dict): The counts of the company.
+        rows (list): The rows of the client-months dataset, with client,
+            month_concept and year_concept columns.
+        last_month (int): The index of the last closed month.
+    """
+    import numpy as np  # Only needed for the cohorts
+
+    start = -1 if state["last_month"] is None else state["last_month"]
+    pairs = []
+    for row in rows:
+        index = month_index(int(row["year_concept"]), int(row["month_concept"]))
+        if start < index <= last_month:
+            pairs.append((row["client"], index))
+    state["last_month"] = last_month
+    if not pairs:
+        return
+
+    clients = np.array([client for client, _ in pairs], dtype=object)
+    months = np.array([index for _, index in pairs], dtype=np.int64)
+    names, codes = np.unique(clients, return_inverse=True)
+
+    # First month of every client, the new months can't be before the first
+    # month of the clients already counted
+    first = np.array(
+        [state["first"].get(name, last_month + 1) for name in names], dtype=np.int64
+    )
+    np.minimum.at(first, codes, months)
+    state["first"].update(zip(names.tolist(), first.tolist()))
+
+    cohorts = first[codes]
+    keys, counts = np.unique(
+        np.stack([cohorts, months - cohorts]), axis=1, return_counts=True
+    )
+    for cohort, offset, count in zip(*keys.tolist(), counts.tolist()):
+        state["counts"][(cohort, offset)] = (
+            state["counts"].get((cohort, offset), 0) + count
+        )
+    for month in np.unique(months).tolist():
+        state["clients"].setdefault(month, set()).update(
+            clients[months == month].tolist()
+        )
+    state["matrix"] = None
+
+
+def remove_since(state: dict, since: int):
+    """
+    Removes the client months from a month onwards from the counts.
+
+    Args:
+        state (dict): The counts of the company.
+        since (int): The index of the first month to remove.
+    """
+    for month in [month for month in state["clients"] if month >= since]:
+        for client in state["clients"].pop(month):
+            key = (state["first"][client], month - state["first"][client])
+            state["counts"][key] -= 1
+            if not state["counts"][key]:
+                del state["counts"][key]
+    for client in [
+        client for client, first in state["first"].items() if first >= since
+    ]:
+        del state["first"][client]
+    if state["last_month"] is not None and state["last_month"] >= since:
+        state["last_month"] = since - 1
+    state["matrix"] = None
+
+
+def build_matrix(counts: dict, last_month: int) -> list:
+    """
+    Builds the retention matrix from the counts by cohort and offset.
+
+    Args:
+        counts (dict): The clients by (cohort, offset) month indexes.
+        last_month (int): The index of the last closed month.
+
+    Returns:
+        list: The cohorts from the oldest, with their year, month, clients and
+        the clients and share of every month from the first purchase to the last
+        closed month.
+    """
+    cohorts = []
+    for cohort in sorted({cohort for cohort, _ in counts}):
+        size = counts.get((cohort, 0), 0)
+        cohorts.append(
+            {
+                "year": cohort // 12,
+                "month": cohort % 12 + 1,
+                "clients": size,
+                "retention": [
+                    {
+                        "offset": offset,
+                        "clients": counts.get((cohort, offset), 0),
+                        "share": (
+                            counts.get((cohort, offset), 0) / size * 100
+                            if size
+                            else 0.0
+                        ),
+                    }
+                    for offset in range(last_month - cohort + 1)
+                ],
+            }
+        )
+    return cohorts
+
+
+def get_cohorts(db_number: int, version: int, last_month: tuple, load_rows) -> list:
+    """
+    Gets the retention matrix of a company up to the last closed month, adding
+    the months closed since the last request.
+
+    Args:
+        db_number (int): The database number.
+        version (int): The current data version of the database.
+        last_month (tuple): The year and month of the last closed month.
+        load_rows: A function that takes the first date to read (None for all)
+            and returns the rows of the client-months dataset, only called when
+            there are months to add.
+
+    Returns:
+        list: The cohorts and their retention (see build_matrix).
+    """
+    last = month_index(*last_month)
+    with get_lock(db_number):
+        state = _states.setdefault(db_number, new_state())
+        if state["last_month"] is not None and state["last_month"] > last:
+            remove_since(state, last + 1)
+        if state["last_month"] != last:
+            since = None
+            if state["last_month"] is not None:
+                next_month = state["last_month"] + 1
+                since = date(next_month // 12, next_month % 12 + 1, 1)
+            accumulate(state, load_rows(since), last)
+        if state["matrix"] is None or state["version"] != version:
+            state["matrix"] = build_matrix(state["counts"], last)
+            state["version"] = version
+        return state["matrix"]
+
+
+def invalidate(db_number: int, since: date = None):
+    """
+    Removes the client months of a company from a date onwards, so they are
+    read again on the next request.
+
+    Args:
+        db_number (int): The database number.
+        since (date): The first date that changed (optional), all the months if
+            None.
+    """
+    with get_lock(db_number):
+        if since is None:
+            _states.pop(db_number, None)
+            return
+        state = _states.get(db_number)
+        if state is not None:
+            remove_since(state, month_index(since.year, since.month))
@@ -0,0 +1,307 @@
+"""
+Declarative definitions of the datasets served by the API.
+
+Every dataset is defined once and compiled to the SQL of the current DBMS by
+query_builder.compile_dataset(). A dataset has:
+
+    table: The prefix and alias of the base table, e.g. ("FACTF", "a").
+    joins: The joined tables as (prefix, alias, join condition), optionally with
+        the join type (e.g. LEFT) as a fourth item, INNER by default.
+    dimensions: The grouped columns as (column name, expression).
+    period: The date column grouped by month and year (month_concept and
+        year_concept columns), or None to not group by period.
+    date_column: The date column used by the date range filter.
+    measures: The aggregated columns as (column name, expression), without
+        measures the query returns the distinct dimensions.
+    filters: The filters as (expression, operator, value), the values are
+        bound as parameters, and operators without value (IS NOT NULL) use None.
+
+The result columns are the dimensions, the period columns and the measures,
+in this order.
+"""
+
+
+def not_empty(column: str) -> list:
+    """
+    Builds the filters of a column that must not be NULL or empty.
+
+    Args:
+        column (str): The column expression.
+
+    Returns:
+        list: The filters of the column.
+    """
+    return [(column, "IS NOT NULL", None), (column, "<>", "")]
+
+
+INVOICE_SALES = "SUM(a.CAN_TOT*a.TIPCAMB)"
+SPLIT_SALES = "SUM(c.CANT*c.PREC*c.TIP_CAM)"
+SPLIT_PROFIT = "SUM((c.CANT*c.PREC*c.TIP_CAM)-(c.CANT*c.COST))"
+MOVEMENT_SALES = "SUM(a.CANT*a.PRECIO)"
+MOVEMENT_PROFIT = "SUM((a.CANT*a.PRECIO)-(a.CANT*a.COSTO))"
+# Aspel SAE numbers the inventory entry concepts below 51 and the exit ones
+# from 51 (51 is the sale)
+EXIT_MOVEMENT = "a.CVE_CPTO >= 51"
+
+DATASETS = {
+    "sales": {
+        "table": ("FACTF", "a"),
+        "joins": [("CLIE", "b", "a.CVE_CLPV = b.CLAVE")],
+        "dimensions": [("name", "b.NOMBRE")],
+        "period": "a.FECHA_DOC",
+        "measures": [("total_sales", INVOICE_SALES)],
+        "filters": [("a.STATUS", "<>", "C")] + not_empty("b.NOMBRE"),
+    },
+    "purchases": {
+        "table": ("COMPC", "a"),
+        "joins": [("PROV", "b", "a.CVE_CLPV = b.CLAVE")],
+        "dimensions": [("name", "b.NOMBRE")],
+        "period": "a.FECHA_DOC",
+        "measures": [("total_purchases", "SUM(a.CAN_TOT)")],
+        "filters": [("a.STATUS", "<>", "C")] + not_empty("b.NOMBRE"),
+    },
+    "sellers": {
+        "table": ("FACTF", "a"),
+        "joins": [("VEND", "b", "a.CVE_VEND = b.CVE_VEND")],
+        "dimensions": [("name", "b.NOMBRE")],
+        "period": "a.FECHA_DOC",
+        "measures": [("total_sales", INVOICE_SALES)],
+        "filters": [("a.STATUS", "<>", "C")] + not_empty("b.NOMBRE"),
+    },
+    "products": {
+        "table": ("MINVE", "a"),
+        "joins": [("INVE", "b", "a.CVE_ART = b.CVE_ART")],
+        "dimensions": [("name", "b.DESCR")],
+        "period": "a.FECHA_DOCU",
+        "measures": [("total_qty", "SUM(a.CANT)")],
+        "filters": [("a.TIPO_DOC", "=", "F"), ("a.CVE_CPTO", "=", 51)]
+        + not_empty("b.DESCR"),
+    },
+    "gross-profit-margin": {
+        "table": ("FACTF", "a"),
+        "joins": [("PAR_FACTF", "c", "a.CVE_DOC = c.CVE_DOC")],
+        "period": "a.FECHA_DOC",
+        "measures": [
+            ("total_gpm", "SUM(c.CANT*c.PREC*c.TIP_CAM) - SUM(c.CANT*c.COST)")
+        ],
+        "filters": [("a.STATUS", "<>", "C")],
+    },
+    "goods": {
+        "table": ("MINVE", "a"),
+        "joins": [("INVE", "b", "a.CVE_ART = b.CVE_ART")],
+        "dimensions": [("name", "b.DESCR")],
+        "period": "a.FECHA_DOCU",
+        "measures": [("total_qty", "SUM(a.CANT)")],
+        "filters": [("a.TIPO_DOC", "=", "c"), ("a.CVE_CPTO", "=", 1)]
+        + not_empty("b.DESCR"),
+    },
+    "sales-vs-profit": {
+        "table": ("FACTF", "a"),
+        "joins": [("PAR_FACTF", "c", "a.CVE_DOC = c.CVE_DOC")],
+        "dimensions": [("movement_date", "a.FECHA_DOC")],
+        "date_column": "a.FECHA_DOC",
+        "measures": [
+            ("sales", SPLIT_SALES),
+            ("profit", "SUM(c.CANT*c.PREC*c.TIP_CAM) - SUM(c.CANT*c.COST)"),
+        ],
+        "filters": [("a.STATUS", "=", "E")],
+    },
+    "sales-by-towns": {
+        "table": ("FACTF", "a"),
+        "joins": [("CLIE", "b", "a.CVE_CLPV = b.CLAVE")],
+        "dimensions": [("name", "UPPER(b.MUNICIPIO)")],
+        "period": "a.FECHA_DOC",
+        "measures": [("total_sales", INVOICE_SALES)],
+        "filters": [("a.STATUS", "<>", "C")] + not_empty("b.MUNICIPIO"),
+    },
+    "sales-by-lines": {
+        "table": ("MINVE", "a"),
+        "joins": [
+            ("INVE", "c", "a.CVE_ART = c.CVE_ART"),
+            ("CLIN", "b", "c.LIN_PROD = b.CVE_LIN"),
+        ],
+        "dimensions": [("name", "b.DESC_LIN")],
+        "period": "a.FECHA_DOCU",
+        "measures": [
+            ("sales", MOVEMENT_SALES),
+            ("profit", MOVEMENT_PROFIT),
+            ("qty", "COUNT(a.CVE_ART)"),
+        ],
+        "filters": [("a.CVE_CPTO", "=", 51), ("a.TIPO_DOC", "=", "F")],
+    },
+    "sales-by-products": {
+        "table": ("MINVE", "a"),
+        "joins": [("INVE", "b", "a.CVE_ART = b.CVE_ART")],
+        "dimensions": [("name", "b.DESCR")],
+        "period": "a.FECHA_DOCU",
+        "measures": [
+            ("sales", MOVEMENT_SALES),
+            ("profit", MOVEMENT_PROFIT),
+            ("qty", "COUNT(a.CVE_ART)"),
+        ],
+        "filters": [("a.CVE_CPTO", "=", 51), ("a.TIPO_DOC", "=", "F")]
+        + not_empty("b.DESCR"),
+    },
+    "sales-by-clients": {
+        "table": ("FACTF", "a"),
+        "joins": [
+            ("CLIE", "b", "a.CVE_CLPV = b.CLAVE"),
+            ("PAR_FACTF", "c", "a.CVE_DOC = c.CVE_DOC"),
+        ],
+        "dimensions": [("name", "b.NOMBRE")],
+        "period": "a.FECHA_DOC",
+        "measures": [
+            ("sales", SPLIT_SALES),
+            ("profit", SPLIT_PROFIT),
+            ("qty", "COUNT(b.CLAVE)"),
+        ],
+        "filters": [("a.STATUS", "<>", "C")] + not_empty("b.NOMBRE"),
+    },
+    "sales-and-profits-by-towns": {
+        "table": ("FACTF", "a"),
+        "joins": [
+            ("CLIE", "b", "a.CVE_CLPV = b.CLAVE"),
+            ("PAR_FACTF", "c", "a.CVE_DOC = c.CVE_DOC"),
+        ],
+        "dimensions": [("name", "UPPER(b.MUNICIPIO)")],
+        "period": "a.FECHA_DOC",
+        "measures": [
+            ("sales", SPLIT_SALES),
+            ("profit", SPLIT_PROFIT),
+            ("qty", "COUNT(b.CLAVE)"),
+        ],
+        "filters": [("a.STATUS", "<>", "C")]
+        + not_empty("b.NOMBRE")
+        + not_empty("b.MUNICIPIO"),
+    },
+    "sales-and-profits-by-sellers": {
+        "table": ("FACTF", "a"),
+        "joins": [
+            ("VEND", "b", "a.CVE_VEND = b.CVE_VEND"),
+            ("PAR_FACTF", "c", "a.CVE_DOC = c.CVE_DOC"),
+        ],
+        "dimensions": [("name", "UPPER(b.NOMBRE)")],
+        "period": "a.FECHA_DOC",
+        "measures": [
+            ("sales", SPLIT_SALES),
+            ("profit", SPLIT_PROFIT),
+            ("qty", "COUNT(b.CVE_VEND)"),
+        ],
+        "filters": [("a.STATUS", "<>", "C")] + not_empty("b.NOMBRE"),
+    },
+    # Months with purchases of every client, for the cohort retention
+    "client-months": {
+        "table": ("FACTF", "a"),
+        "joins": [("CLIE", "b", "a.CVE_CLPV = b.CLAVE")],
+        "dimensions": [("client", "a.CVE_CLPV")],
+        "period": "a.FECHA_DOC",
+        "filters": [("a.STATUS", "<>", "C")] + not_empty("b.NOMBRE"),
+    },
+    # Movements of every product by month over all the concepts, and the current
+    # stock of every product, for the inventory turnover
+    "inventory-movements": {
+        "table": ("MINVE", "a"),
+        "dimensions": [("product", "a.CVE_ART")],
+        "period": "a.FECHA_DOCU",
+        "measures": [
+            (
+                "net_qty",
+                f"SUM(CASE WHEN {EXIT_MOVEMENT} THEN -a.CANT ELSE a.CANT END)",
+            ),
+            ("exits_qty", f"SUM(CASE WHEN {EXIT_MOVEMENT} THEN a.CANT ELSE 0 END)"),
+            (
+                "exits_cost",
+                f"SUM(CASE WHEN {EXIT_MOVEMENT} THEN a.CANT*a.COSTO ELSE 0 END)",
+            ),
+        ],
+    },
+    # The products without a line are kept (LEFT JOIN), their stock counts too
+    "inventory-stock": {
+        "table": ("INVE", "c"),
+        "joins": [("CLIN", "b", "c.LIN_PROD = b.CVE_LIN", "LEFT")],
+        "dimensions": [
+            ("product", "c.CVE_ART"),
+            ("name", "c.DESCR"),
+            ("line", "b.DESC_LIN"),
+        ],
+        "measures": [("stock", "SUM(c.EXIST)"), ("cost", "MAX(c.COSTO_PROM)")],
+    },
+    # Catalogs of the ABC analysis, the names of every product and client with
+    # or without sales
+    "products-catalog": {
+        "table": ("INVE", "b"),
+        "measures": [("count", "COUNT(DISTINCT b.DESCR)")],
+        "filters": not_empty("b.DESCR"),
+    },
+    "clients-catalog": {
+        "table": ("CLIE", "b"),
+        "measures": [("count", "COUNT(DISTINCT b.NOMBRE)")],
+        "filters": not_empty("b.NOMBRE"),
+    },
+}
+
+# Datasets served by their own endpoints and by /sync/, the others are only read
+# by the cohorts, inventory, ABC and distinct count endpoints
+PUBLIC_DATASETS = [
+    "sales",
+    "purchases",
+    "sellers",
+    "products",
+    "gross-profit-margin",
+    "goods",
+    "sales-vs-profit",
+    "sales-by-towns",
+    "sales-by-lines",
+    "sales-by-products",
+    "sales-by-clients",
+    "sales-and-profits-by-towns",
+    "sales-and-profits-by-sellers",
+]
+
+# Entities counted by the distinct count cards, with the tables, filters and name
+# column of the dataset that each card counted
+DISTINCT_ENTITIES = {
+    "clients": {
+        "table": ("FACTF", "a"),
+        "joins": [
+            ("CLIE", "b", "a.CVE_CLPV = b.CLAVE"),
+            ("PAR_FACTF", "c", "a.CVE_DOC = c.CVE_DOC"),
+        ],
+        "name": "b.NOMBRE",
+        "date_column": "a.FECHA_DOC",
+        "filters": [("a.STATUS", "<>", "C")] + not_empty("b.NOMBRE"),
+    },
+    "sellers": {
+        "table": ("FACTF", "a"),
+        "joins": [("VEND", "b", "a.CVE_VEND = b.CVE_VEND")],
+        "name": "b.NOMBRE",
+        "date_column": "a.FECHA_DOC",
+        "filters": [("a.STATUS", "<>", "C")] + not_empty("b.NOMBRE"),
+    },
+    "providers": {
+        "table": ("COMPC", "a"),
+        "joins": [("PROV", "b", "a.CVE_CLPV = b.CLAVE")],
+        "name": "b.NOMBRE",
+        "date_column": "a.FECHA_DOC",
+        "filters": [("a.STATUS", "<>", "C")] + not_empty("b.NOMBRE"),
+    },
+}
+
+# Every entity has a COUNT(DISTINCT) dataset (<entity>-distinct) and a dataset of
+# its distinct names per month (<entity>-names) for unions and sketches
+for entity, definition in DISTINCT_ENTITIES.items():
+    base = {
+        "table": definition["table"],
+        "joins": definition["joins"],
+        "filters": definition["filters"],
+    }
+    DATASETS[f"{entity}-distinct"] = {
+        **base,
+        "date_column": definition["date_column"],
+        "measures": [("count", f"COUNT(DISTINCT {definition['name']})")],
+    }
+    DATASETS[f"{entity}-names"] = {
+        **base,
+        "dimensions": [("name", definition["name"])],
+        "period": definition["date_column"],
+    }
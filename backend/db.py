@@ -1,11 +1,26 @@
 import os
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
 
-import firebirdsql  # Driver for Firebird
-import pymssql  # Driver for SQL Server
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Worker processes of the API (see serve.py), the idle connections kept per
+# company database (0 disables the pool) are shared out among them, and prepared
+# statements kept per connection
+backend_workers = max(int(os.getenv("BACKEND_WORKERS", "1")), 1)
+db_pool_size = int(os.getenv("DB_POOL_SIZE", "4"))
+if db_pool_size > 0:
+    db_pool_size = max(db_pool_size // backend_workers, 1)
+statement_cache_size = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "64"))
+
+_pools = {}
+_pools_lock = threading.Lock()
+
 
 # SQL Server connection function
 def get_db_sqlserver(db_number: int):
@@ -19,6 +34,8 @@ def get_db_sqlserver(db_number: int):
     DB_SERVER, DB_USER, DB_PASSWORD and DB_NAME.
     """
 
+    import pymssql  # Driver for SQL Server, only needed for DBMS=SQLSERVER
+
     db_env_name = f"DB_NAME_{db_number}"
 
     try:
@@ -47,6 +64,8 @@ def connect_to_database(db_number: int):
     the environment variable PATHFB_{db_number}.
     """
 
+    import firebirdsql  # Driver for Firebird, only needed for DBMS=FIREBIRD
+
     host = os.getenv("HOST")
     username = os.getenv("DB_USER")
     password = os.getenv("DB_PASSWORD")
@@ -76,12 +95,42 @@ def connect_to_database(db_number: int):
         return None
 
 
+# SQLite connection function, used as a local stand-in for benchmarks
+def connect_to_sqlite(db_number: int):
+    """
+    Connects to a SQLite database using the sqlite3 module.
+
+    If the connection is successful, it returns a sqlite3.Connection object.
+    If the connection fails, it prints an error message and returns None.
+
+    The path to the database file is expected to be in the environment
+    variable SQLITE_{db_number}, e.g. a database built by
+    benchmarks/synthetic_sae.py.
+    """
+
+    db_path = os.getenv(f"SQLITE_{db_number}")
+
+    try:
+        # Pooled connections are used by one request at a time, but not always
+        # from the thread that opened them
+        return sqlite3.connect(
+            f"file:{db_path}?mode=ro",
+            uri=True,
+            check_same_thread=False,
+            cached_statements=statement_cache_size,
+        )
+    except sqlite3.OperationalError as e:
+        print(f"Error al conectar a la base de datos: {e}", flush=True)
+        return None
+
+
 def get_db_connection(db_number: int):
     """
     Connects to a database based on the value of the DBMS environment variable.
 
     If DBMS is SQLSERVER, it calls get_db_sqlserver().
     If DBMS is FIREBIRD, it calls connect_to_database().
+    If DBMS is SQLITE, it calls connect_to_sqlite().
 
     Returns a connection object if the connection is successful, or None if the connection fails.
     """
@@ -90,3 +139,254 @@ def get_db_connection(db_number: int):
         return get_db_sqlserver(db_number)
     elif os.getenv("DBMS") == "FIREBIRD":
         return connect_to_database(db_number)
+    elif os.getenv("DBMS") == "SQLITE":
+        return connect_to_sqlite(db_number)
+
+
+def get_dsn(db_number: int) -> tuple:
+    """
+    Gets the connection settings of a company database from the environment.
+
+    Args:
+        db_number (int): The database number.
+
+    Returns:
+        tuple: The DBMS and the settings that identify the database.
+    """
+    dbms = os.getenv("DBMS")
+    if dbms == "SQLSERVER":
+        return (
+            dbms,
+            os.getenv("DB_SERVER"),
+            os.getenv("DB_USER"),
+            os.getenv(f"DB_NAME_{db_number}"),
+        )
+    if dbms == "FIREBIRD":
+        return (
+            dbms,
+            os.getenv("HOST"),
+            os.getenv("DB_USER"),
+            os.getenv(f"PATHFB_{db_number}"),
+            os.getenv(f"FB_{db_number}"),
+        )
+    return (dbms, os.getenv(f"SQLITE_{db_number}"))
+
+
+def get_pool(db_number: int) -> queue.LifoQueue:
+    """
+    Gets the pool of idle connections of a company database.
+
+    The pool belongs to the connection settings of the database: when they
+    change (e.g. the benchmarks point SQLITE_1 at another file), the idle
+    connections to the previous database are closed and a new pool is started.
+
+    Args:
+        db_number (int): The database number.
+
+    Returns:
+        queue.LifoQueue: The idle connections, the most recently used first.
+    """
+    dsn = get_dsn(db_number)
+    with _pools_lock:
+        current = _pools.get(db_number)
+        if current is not None and current[0] == dsn:
+            return current[1]
+        _pools[db_number] = (dsn, queue.LifoQueue(maxsize=max(db_pool_size, 1)))
+
+    if current is not None:
+        while True:
+            try:
+                close_connection(current[1].get_nowait())
+            except queue.Empty:
+                break
+    return _pools[db_number][1]
+
+
+def acquire_connection(db_number: int):
+    """
+    Borrows a connection of a company database from the pool.
+
+    A new connection is opened when the pool is empty. Every connection must be
+    given back with release_connection().
+
+    Args:
+        db_number (int): The database number.
+
+    Returns:
+        dict: The connection ("conn"), its cursor ("cursor") and its statement
+        cache ("statements"), or None if the connection fails.
+    """
+    try:
+        return get_pool(db_number).get_nowait()
+    except queue.Empty:
+        pass
+
+    conn = get_db_connection(db_number)
+    if conn is None:
+        return None
+    # One cursor per connection, Firebird keeps a reference to every cursor
+    # opened in a transaction until the connection is closed
+    return {
+        "conn": conn,
+        "cursor": conn.cursor(),
+        "statements": OrderedDict(),
+        "dsn": get_dsn(db_number),
+    }
+
+
+def release_connection(db_number: int, entry: dict, reusable: bool = True):
+    """
+    Gives a borrowed connection back to the pool.
+
+    The read transaction is finished and the connection is kept with its
+    prepared statements, unless it's not reusable (the query raised an error),
+    the pool is disabled or full, or the connection settings of the database
+    changed while it was borrowed, in which case it is closed.
+
+    Args:
+        db_number (int): The database number.
+        entry (dict): The pooled connection.
+        reusable (bool): Whether the connection can be used again.
+    """
+    if not reusable or db_pool_size <= 0 or entry["dsn"] != get_dsn(db_number):
+        close_connection(entry)
+        return
+
+    try:
+        close_statements(entry, drop=False)
+        entry["conn"].commit()
+        get_pool(db_number).put_nowait(entry)
+    except queue.Full:
+        close_connection(entry)
+    except Exception as e:
+        print(f"Error al devolver la conexión al pool: {e}", flush=True)
+        close_connection(entry)
+
+
+def close_statements(entry: dict, drop: bool = True):
+    """
+    Closes the open result sets of the prepared statements of a connection.
+
+    Args:
+        entry (dict): The pooled connection.
+        drop (bool): Whether to also free the statements and empty the cache.
+    """
+    if os.getenv("DBMS") == "FIREBIRD":
+        for statement in entry["statements"].values():
+            if statement.stmt.is_opened:
+                statement.close()
+            if drop:
+                statement.stmt.drop()
+    if drop:
+        entry["statements"].clear()
+
+
+def close_connection(entry: dict):
+    """
+    Closes a pooled connection, errors are ignored since it's being discarded.
+
+    Args:
+        entry (dict): The pooled connection.
+    """
+    try:
+        close_statements(entry)
+        entry["cursor"].close()
+    except Exception:
+        pass
+    try:
+        entry["conn"].close()
+    except Exception:
+        pass
+
+
+def get_sqlserver_type(value) -> str:
+    """
+    Gets the SQL Server type of a parameter of sp_executesql.
+
+    Args:
+        value: The parameter value.
+
+    Returns:
+        str: The SQL Server type. Text is VARCHAR like the SAE columns, an
+        NVARCHAR parameter would convert the column and prevent index seeks.
+    """
+    if isinstance(value, bool) or isinstance(value, int):
+        return "INT"
+    if isinstance(value, float):
+        return "FLOAT"
+    if isinstance(value, datetime):
+        return "DATETIME"
+    if isinstance(value, date):
+        return "DATE"
+    return "VARCHAR(255)"
+
+
+def build_sqlserver_statement(query: str, params: tuple) -> str:
+    """
+    Wraps a query with %s placeholders in a call to sp_executesql.
+
+    pymssql interpolates the parameters in the SQL text, so every distinct value
+    would be a new statement for SQL Server. Passing them to sp_executesql as
+    typed parameters lets the server reuse one cached plan for all the values.
+
+    Args:
+        query (str): The query with a %s placeholder per parameter.
+        params (tuple): The parameters, used to declare their types.
+
+    Returns:
+        str: The EXEC sp_executesql statement, with a %s placeholder per parameter.
+    """
+    parts = query.replace("'", "''").split("%s")
+    statement = parts[0]
+    for number, part in enumerate(parts[1:], start=1):
+        statement += f"@P{number}{part}"
+    declarations = ", ".join(
+        f"@P{number} {get_sqlserver_type(value)}"
+        for number, value in enumerate(params, start=1)
+    )
+    values = ", ".join(f"@P{number} = %s" for number in range(1, len(params) + 1))
+    return f"EXEC sp_executesql N'{statement}', N'{declarations}', {values}"
+
+
+def execute_cached(entry: dict, query: str, params: tuple = None):
+    """
+    Executes a query with the prepared statement cache of a pooled connection.
+
+    The statements are cached by their SQL text, which is the same for the same
+    database, dataset and filter shape (see query_builder.compile_dataset), so
+    repeated requests skip parsing and optimizing the query:
+
+    - Firebird keeps the statements prepared with cursor.prep().
+    - SQL Server keeps the sp_executesql call, whose plan is cached by the server.
+    - SQLite keeps the statements in the cache of the connection (cached_statements).
+
+    Args:
+        entry (dict): The pooled connection, the query runs on its cursor.
+        query (str): The query.
+        params (tuple): The parameters of the query (optional).
+    """
+    dbms = os.getenv("DBMS")
+    cursor = entry["cursor"]
+    statements = entry["statements"]
+
+    if dbms == "SQLITE" or (dbms == "SQLSERVER" and not params):
+        cursor.execute(query, params or ())
+        return
+
+    statement = statements.get(query)
+    if statement is None:
+        if dbms == "FIREBIRD":
+            statement = cursor.prep(query)
+        else:
+            statement = build_sqlserver_statement(query, params)
+        statements[query] = statement
+        if len(statements) > statement_cache_size:
+            _, evicted = statements.popitem(last=False)
+            if dbms == "FIREBIRD":
+                evicted.stmt.drop()
+    else:
+        statements.move_to_end(query)
+
+    if dbms == "FIREBIRD" and statement.stmt.is_opened:
+        statement.close()
+    cursor.execute(statement, tuple(params or ()))
@@ -0,0 +1,154 @@
+"""
+Drill-down from the sales of a product line to its products, and from the sales
+of a product to its invoices.
+
+The pages use keyset pagination instead of OFFSET: every page is sorted by an
+indexed key and starts after the last key of the previous page (the cursor), so
+the database seeks to the start of the page instead of reading and skipping the
+rows of all the previous pages, and a deep page costs the same as the first one.
+
+    Products of a line: The sales by product of the line, sorted by the product
+        key (INVE.CVE_ART, its primary key), with the sales of every product
+        read from MINVE through its CVE_ART index.
+    Invoices of a product: The sales movements of the product, sorted by the
+        movement number (MINVE.NUM_MOV), with the invoice (REFER) and its client.
+
+The measures are the same as the sales-by-lines and sales-by-products datasets,
+so the products of a line add up to its slice of the donut chart. Every query
+fetches one row more than the page to know if there's a next page.
+"""
+
+import os
+from functools import lru_cache
+
+from datasets import MOVEMENT_PROFIT, MOVEMENT_SALES
+from dotenv import load_dotenv
+from query_builder import DIALECTS, table_name
+
+load_dotenv()
+
+# Rows of a drill-down page
+drill_down_page_size = int(os.getenv("DRILL_DOWN_PAGE_SIZE", "100"))
+
+# Filters of the sales movements, as in the sales-by-lines dataset
+SALES_FILTERS = "a.CVE_CPTO = 51 AND a.TIPO_DOC = 'F'"
+
+PRODUCT_COLUMNS = ("product", "name", "sales", "profit", "qty")
+INVOICE_COLUMNS = (
+    "movement",
+    "invoice",
+    "movement_date",
+    "client",
+    "qty",
+    "price",
+    "sales",
+    "profit",
+)
+
+
+@lru_cache(maxsize=None)
+def build_products_query(
+    dbms: str, db_number: int, page_size: int, after: bool = False
+) -> str:
+    """
+    Builds the query of a page of the sales by product of a line.
+
+    The parameters are the line name, the start and end of the period and, when
+    after is True, the key of the last product of the previous page.
+
+    Args:
+        dbms (str): The database manager system (FIREBIRD, SQLSERVER or SQLITE).
+        db_number (int): The database number.
+        page_size (int): The rows of the page.
+        after (bool): Whether the page starts after a product key.
+
+    Returns:
+        str: The query, with PRODUCT_COLUMNS columns.
+    """
+    dialect = DIALECTS[dbms]
+    placeholder = dialect["placeholder"]
+    conditions = [
+        f"b.DESC_LIN = {placeholder}",
+        SALES_FILTERS,
+        f"a.FECHA_DOCU >= {placeholder}",
+        f"a.FECHA_DOCU < {placeholder}",
+    ]
+    if after:
+        conditions.append(f"c.CVE_ART > {placeholder}")
+    return (
+        f"SELECT {dialect['first'].format(page_size + 1)}"
+        f"c.CVE_ART AS product, c.DESCR AS name, {MOVEMENT_SALES} AS sales, "
+        f"{MOVEMENT_PROFIT} AS profit, COUNT(a.CVE_ART) AS qty "
+        f"FROM {table_name('INVE', db_number)} c "
+        f"INNER JOIN {table_name('CLIN', db_number)} b ON c.LIN_PROD = b.CVE_LIN "
+        f"INNER JOIN {table_name('MINVE', db_number)} a ON a.CVE_ART = c.CVE_ART "
+        f"WHERE {' AND '.join(conditions)} "
+        f"GROUP BY c.CVE_ART, c.DESCR ORDER BY c.CVE_ART"
+        f"{dialect['limit'].format(page_size + 1)}"
+    )
+
+
+@lru_cache(maxsize=None)
+def build_invoices_query(
+    dbms: str, db_number: int, page_size: int, after: bool = False
+) -> str:
+    """
+    Builds the query of a page of the sales movements of a product.
+
+    The parameters are the product key, the start and end of the period and, when
+    after is True, the number of the last movement of the previous page. The
+    invoice of a movement is its reference, and its client is joined through the
+    invoice (LEFT JOIN, so a movement without invoice isn't lost).
+
+    Args:
+        dbms (str): The database manager system (FIREBIRD, SQLSERVER or SQLITE).
+        db_number (int): The database number.
+        page_size (int): The rows of the page.
+        after (bool): Whether the page starts after a movement number.
+
+    Returns:
+        str: The query, with INVOICE_COLUMNS columns.
+    """
+    dialect = DIALECTS[dbms]
+    placeholder = dialect["placeholder"]
+    conditions = [
+        f"a.CVE_ART = {placeholder}",
+        SALES_FILTERS,
+        f"a.FECHA_DOCU >= {placeholder}",
+        f"a.FECHA_DOCU < {placeholder}",
+    ]
+    if after:
+        conditions.append(f"a.NUM_MOV > {placeholder}")
+    return (
+        f"SELECT {dialect['first'].format(page_size + 1)}"
+        f"a.NUM_MOV AS movement, a.REFER AS invoice, "
+        f"a.FECHA_DOCU AS movement_date, d.NOMBRE AS client, a.CANT AS qty, "
+        f"a.PRECIO AS price, a.CANT*a.PRECIO AS sales, "
+        f"(a.CANT*a.PRECIO)-(a.CANT*a.COSTO) AS profit "
+        f"FROM {table_name('MINVE', db_number)} a "
+        f"LEFT JOIN {table_name('FACTF', db_number)} f ON f.CVE_DOC = a.REFER "
+        f"LEFT JOIN {table_name('CLIE', db_number)} d ON d.CLAVE = f.CVE_CLPV "
+        f"WHERE {' AND '.join(conditions)} "
+        f"ORDER BY a.NUM_MOV"
+        f"{dialect['limit'].format(page_size + 1)}"
+    )
+
+
+def paginate(rows: list, page_size: int, key: str) -> tuple:
+    """
+    Cuts the extra row of a page and gets the cursor of the next page.
+
+    Args:
+        rows (list): The rows of the page, one more than the page size if there's
+            a next page.
+        page_size (int): The rows of the page.
+        key (str): The column of the keyset.
+
+    Returns:
+        tuple: The rows of the page and the key of its last row, None if it's the
+        last page.
+    """
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, rows[-1][key]
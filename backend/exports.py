@@ -0,0 +1,202 @@
+import csv
+import io
+import os
+import tempfile
+
+from datasets import DATASETS, PUBLIC_DATASETS
+from db import release_connection
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Rows fetched from the cursor per batch while streaming an export
+export_batch_rows = int(os.getenv("EXPORT_BATCH_ROWS", "5000"))
+
+# Media type of every export format, keyed by its file extension
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# Headers of the exported columns, the column name is used for the others
+EXPORT_LABELS = {
+    "name": "Nombre",
+    "movement_date": "Fecha",
+    "month_concept": "Mes",
+    "year_concept": "Año",
+    "total_sales": "Venta",
+    "total_purchases": "Compra",
+    "total_gpm": "Ganancia bruta",
+    "total_qty": "Cantidad",
+    "sales": "Venta",
+    "profit": "Ganancia",
+    "purchases": "Compra",
+    "spent": "Gasto",
+    "qty": "Cantidad",
+}
+
+
+def is_exportable(name: str) -> bool:
+    """
+    Checks if a dataset can be exported, it needs to be public and to have
+    dimensions and measures.
+
+    Args:
+        name (str): The dataset name.
+
+    Returns:
+        bool: Whether the dataset exists and can be exported.
+    """
+    dataset = DATASETS.get(name)
+    return (
+        name in PUBLIC_DATASETS
+        and bool(dataset.get("dimensions"))
+        and bool(dataset.get("measures"))
+    )
+
+
+def build_export_query(
+    name: str, query: str, columns: tuple, grouped: bool = False
+) -> tuple:
+    """
+    Wraps the compiled query of a dataset to sort it, or to total it by its
+    dimensions over the whole period like the Top tables of the dashboard.
+
+    Args:
+        name (str): The dataset name.
+        query (str): The compiled query of the dataset.
+        columns (tuple): The result columns of the compiled query.
+        grouped (bool): Whether to total the measures by the dimensions, sorted by
+            the first measure from the highest.
+
+    Returns:
+        tuple: The query and its result columns.
+    """
+    dataset = DATASETS[name]
+    dimensions = [column for column, _ in dataset["dimensions"]]
+    measures = [column for column, _ in dataset["measures"]]
+
+    if not grouped:
+        periods = [c for c in ("year_concept", "month_concept") if c in columns]
+        order = ", ".join(periods + dimensions)
+        return f"SELECT * FROM ({query}) t ORDER BY {order}", columns
+
+    selects = dimensions + [f"SUM({measure}) AS {measure}" for measure in measures]
+    grouped_query = (
+        f"SELECT {', '.join(selects)} FROM ({query}) t "
+        f"GROUP BY {', '.join(dimensions)} "
+        f"ORDER BY SUM({measures[0]}) DESC, {', '.join(dimensions)}"
+    )
+    return grouped_query, tuple(dimensions + measures)
+
+
+def fetch_batches(entry: dict, limit: int = None):
+    """
+    Fetches the rows of the executed query of a pooled connection in batches.
+
+    Args:
+        entry (dict): The pooled connection, its query already executed.
+        limit (int): The maximum number of rows (optional), all if None.
+
+    Yields:
+        list: The rows of every batch.
+    """
+    fetched = 0
+    while limit is None or fetched < limit:
+        size = (
+            export_batch_rows
+            if limit is None
+            else min(export_batch_rows, limit - fetched)
+        )
+        rows = entry["cursor"].fetchmany(size)
+        if not rows:
+            return
+        fetched += len(rows)
+        yield rows
+
+
+def stream_csv(db_number: int, entry: dict, columns: tuple, limit: int = None):
+    """
+    Streams the rows of the executed query of a pooled connection as CSV.
+
+    Only one batch of rows is in memory at a time. The text starts with a BOM so
+    that Excel reads the accents, and the connection is given back to the pool
+    at the end.
+
+    Args:
+        db_number (int): The database number of the connection.
+        entry (dict): The pooled connection, its query already executed.
+        columns (tuple): The result columns.
+        limit (int): The maximum number of rows (optional), all if None.
+
+    Yields:
+        bytes: The CSV text of the header and of every batch.
+    """
+    reusable = False
+    try:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_LABELS.get(column, column) for column in columns)
+        yield ("\ufeff" + buffer.getvalue()).encode("utf-8")
+        for rows in fetch_batches(entry, limit):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(rows)
+            yield buffer.getvalue().encode("utf-8")
+        reusable = True
+    finally:
+        release_connection(db_number, entry, reusable)
+
+
+def stream_xlsx(
+    db_number: int, entry: dict, columns: tuple, sheet: str, limit: int = None
+):
+    """
+    Streams the rows of the executed query of a pooled connection as XLSX.
+
+    The workbook is written in the constant memory mode of xlsxwriter, which
+    flushes every row to a temporary file, and the file is streamed once it's
+    complete (an XLSX is a ZIP file, its index is written at the end).
+
+    Args:
+        db_number (int): The database number of the connection.
+        entry (dict): The pooled connection, its query already executed.
+        columns (tuple): The result columns.
+        sheet (str): The worksheet name.
+        limit (int): The maximum number of rows (optional), all if None.
+
+    Yields:
+        bytes: The chunks of the XLSX file.
+    """
+    import xlsxwriter  # Only needed for the XLSX exports
+
+    handle, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(handle)
+    try:
+        reusable = False
+        try:
+            workbook = xlsxwriter.Workbook(
+                path, {"constant_memory": True, "default_date_format": "dd/mm/yyyy"}
+            )
+            worksheet = workbook.add_worksheet(sheet[:31])
+            worksheet.write_row(
+                0,
+                0,
+                [EXPORT_LABELS.get(column, column) for column in columns],
+                workbook.add_format({"bold": True}),
+            )
+            row_number = 1
+            for rows in fetch_batches(entry, limit):
+                for row in rows:
+                    worksheet.write_row(row_number, 0, row)
+                    row_number += 1
+            workbook.close()
+            reusable = True
+        finally:
+            release_connection(db_number, entry, reusable)
+
+        with open(path, "rb") as file:
+            while chunk := file.read(65536):
+                yield chunk
+    finally:
+        os.remove(path)
@@ -0,0 +1,381 @@
+"""
+Forecasts of the monthly series of the KPIs (sales, gross profit, ...).
+
+A model is fitted per company, metric and model type over the closed months
+and kept in memory with the data version of the database. A request within the
+same data version and closed month answers from the fitted model. When new
+months close, the model is updated over them with the same parameters, and it's
+fitted again only when the months already fitted changed.
+
+Models:
+    holt-winters: Additive Holt-Winters with a yearly season, its smoothing
+        parameters are searched on a grid, needs two years of data.
+    seasonal-naive: The value of the same month of the previous year.
+    naive: The value of the last month.
+
+The intervals are approximate: the standard deviation of the one-step errors of
+the fit, widened with the square root of the steps ahead (seasons ahead for the
+seasonal naive).
+"""
+
+import itertools
+import math
+import os
+import statistics
+import threading
+from datetime import date
+
+import kpis
+from datasets import DATASETS
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Months forecasted by default and maximum months of a request
+forecast_horizon = int(os.getenv("FORECAST_HORIZON", "3"))
+forecast_max_horizon = int(os.getenv("FORECAST_MAX_HORIZON", "24"))
+
+SEASON_LENGTH = 12
+MODELS = ["auto", "holt-winters", "seasonal-naive", "naive"]
+# Grid of the smoothing parameters of Holt-Winters (level, trend and season)
+SMOOTHING_GRID = [0.05, 0.1, 0.2, 0.3, 0.5, 0.7, 0.9]
+
+# Fitted models keyed by (db_number, metric, model)
+_fits = {}
+_lock = threading.Lock()
+
+
+def last_closed_month(today: date = None) -> tuple:
+    """
+    Gets the last closed month, the one before the current month.
+
+    Args:
+        today (date): The current date (optional), today by default.
+
+    Returns:
+        tuple: The year and month.
+    """
+    today = today or date.today()
+    if today.month == 1:
+        return today.year - 1, 12
+    return today.year, today.month - 1
+
+
+def add_months(year: int, month: int, months: int) -> tuple:
+    """
+    Adds months to a month.
+
+    Args:
+        year (int): The year.
+        month (int): The month.
+        months (int): The months to add.
+
+    Returns:
+        tuple: The year and month.
+    """
+    index = year * 12 + month - 1 + months
+    return index // 12, index % 12 + 1
+
+
+def parse_metrics(metrics: str = None) -> list:
+    """
+    Parses the requested metrics, KPI names e.g. "sales,gross_profit".
+
+    A metric is forecasted over the monthly totals of its KPI, so only the KPIs
+    of datasets with a period have a series, and they take no aggregation.
+
+    Args:
+        metrics (str): The KPI names separated by commas, all the KPIs with a
+            series if it's None.
+
+    Returns:
+        list: The KPI name, dataset and column of every requested metric.
+
+    Raises:
+        ValueError: If a KPI is unknown, has no monthly series or has an
+            aggregation.
+    """
+    for item in (metrics or "").split(","):
+        if ":" in item:
+            raise ValueError(f"Agregación no admitida en el pronóstico: {item.strip()}")
+    parsed = []
+    for name, dataset, column, _ in kpis.parse_kpis(metrics):
+        if "period" not in DATASETS[dataset]:
+            if not metrics:
+                continue
+            raise ValueError(f"KPI sin serie mensual: {name}")
+        parsed.append((name, dataset, column))
+    return parsed
+
+
+def monthly_series(rows: list, column: str, last_month: tuple) -> tuple:
+    """
+    Totals the rollup rows of a dataset by month, up to the last closed month.
+
+    The months without rows between the first and the last month are 0.
+
+    Args:
+        rows (list): The rows, with year_concept and month_concept columns.
+        column (str): The measure column.
+        last_month (tuple): The year and month of the last month of the series.
+
+    Returns:
+        tuple: The year and month of the first month, and the monthly values.
+    """
+    totals = {}
+    for row in rows:
+        period = (int(row["year_concept"]), int(row["month_concept"]))
+        if period <= last_month and row[column] is not None:
+            totals[period] = totals.get(period, 0.0) + float(row[column])
+    if not totals:
+        return None, []
+
+    first = min(totals)
+    count = (last_month[0] * 12 + last_month[1]) - (first[0] * 12 + first[1]) + 1
+    values = [totals.get(add_months(*first, offset), 0.0) for offset in range(count)]
+    return first, values
+
+
+def choose_model(model: str, months: int) -> str:
+    """
+    Chooses the model of a series, the automatic one is the most complete model
+    that the months of the series allow.
+
+    Args:
+        model (str): The requested model, one of MODELS.
+        months (int): The number of months of the series.
+
+    Returns:
+        str: The model.
+
+    Raises:
+        ValueError: If the series is too short for the model.
+    """
+    required = {"holt-winters": 2 * SEASON_LENGTH, "seasonal-naive": SEASON_LENGTH}
+    if model == "auto":
+        for candidate in ("holt-winters", "seasonal-naive"):
+            if months >= required[candidate]:
+                return candidate
+        model = "naive"
+    if months < required.get(model, 1):
+        raise ValueError(
+            f"El modelo {model} necesita al menos {required.get(model, 1)} meses"
+        )
+    return model
+
+
+def smooth(state: dict, values: list, alpha: float, beta: float, gamma: float):
+    """
+    Runs the additive Holt-Winters recursion over new values, updating the state
+    and the sum of its squared one-step errors.
+
+    Args:
+        state (dict): The level, trend, seasonal components, position and errors.
+        values (list): The new monthly values.
+        alpha (float): The smoothing of the level.
+        beta (float): The smoothing of the trend.
+        gamma (float): The smoothing of the season.
+    """
+    level, trend, season = state["level"], state["trend"], state["season"]
+    position, squared_errors = state["position"], state["squared_errors"]
+    for value in values:
+        index = position % SEASON_LENGTH
+        error = value - (level + trend + season[index])
+        squared_errors += error * error
+        previous_level = level
+        level = alpha * (value - season[index]) + (1 - alpha) * (level + trend)
+        trend = beta * (level - previous_level) + (1 - beta) * trend
+        season[index] = gamma * (value - level) + (1 - gamma) * season[index]
+        position += 1
+    state.update(
+        level=level,
+        trend=trend,
+        position=position,
+        squared_errors=squared_errors,
+        errors=state["errors"] + len(values),
+    )
+
+
+def initial_state(values: list) -> dict:
+    """
+    Initializes the Holt-Winters components from the first two seasons.
+
+    Args:
+        values (list): The monthly values, at least two seasons.
+
+    Returns:
+        dict: The state after the first season, whose values fit the components.
+    """
+    first = statistics.fmean(values[:SEASON_LENGTH])
+    second = statistics.fmean(values[SEASON_LENGTH : 2 * SEASON_LENGTH])
+    return {
+        "level": first,
+        "trend": (second - first) / SEASON_LENGTH,
+        "season": [value - first for value in values[:SEASON_LENGTH]],
+        "position": SEASON_LENGTH,
+        "squared_errors": 0.0,
+        "errors": 0,
+    }
+
+
+def fit(model: str, values: list) -> dict:
+    """
+    Fits a model to a monthly series.
+
+    Args:
+        model (str): The model, one of MODELS but auto.
+        values (list): The monthly values.
+
+    Returns:
+        dict: The fitted model, its parameters and state.
+    """
+    fitted = {"model": model, "values": list(values)}
+    if model != "holt-winters":
+        return fitted
+
+    start = initial_state(values)
+    best = None
+    for alpha, beta, gamma in itertools.product(SMOOTHING_GRID, repeat=3):
+        state = {**start, "season": list(start["season"])}
+        smooth(state, values[SEASON_LENGTH:], alpha, beta, gamma)
+        if best is None or state["squared_errors"] < best[1]["squared_errors"]:
+            best = ((alpha, beta, gamma), state)
+    fitted.update(parameters=best[0], state=best[1])
+    return fitted
+
+
+def update(fitted: dict, values: list) -> dict:
+    """
+    Updates a fitted model with the values of the months closed since its fit,
+    keeping its parameters. The model is fitted again if the months it already
+    fitted changed.
+
+    Args:
+        fitted (dict): The fitted model.
+        values (list): The monthly values, from the same first month.
+
+    Returns:
+        dict: The updated model.
+    """
+    previous = fitted["values"]
+    if values[: len(previous)] != previous:
+        return fit(fitted["model"], values)
+    new_values = values[len(previous) :]
+    if not new_values:
+        return fitted
+
+    updated = {**fitted, "values": list(values)}
+    if fitted["model"] == "holt-winters":
+        state = {**fitted["state"], "season": list(fitted["state"]["season"])}
+        smooth(state, new_values, *fitted["parameters"])
+        updated["state"] = state
+    return updated
+
+
+def error_deviation(fitted: dict) -> float:
+    """
+    Gets the standard deviation of the one-step errors of a fitted model.
+
+    Args:
+        fitted (dict): The fitted model.
+
+    Returns:
+        float: The standard deviation, 0 without errors.
+    """
+    values = fitted["values"]
+    if fitted["model"] == "holt-winters":
+        state = fitted["state"]
+        return math.sqrt(state["squared_errors"] / state["errors"])
+    lag = SEASON_LENGTH if fitted["model"] == "seasonal-naive" else 1
+    errors = [values[i] - values[i - lag] for i in range(lag, len(values))]
+    if not errors:
+        return 0.0
+    return math.sqrt(sum(error * error for error in errors) / len(errors))
+
+
+def forecast(fitted: dict, horizon: int, confidence: float) -> list:
+    """
+    Forecasts the next months of a fitted model.
+
+    Args:
+        fitted (dict): The fitted model.
+        horizon (int): The number of months.
+        confidence (float): The confidence of the intervals, e.g. 0.95.
+
+    Returns:
+        list: The value, lower and upper bounds of every month ahead.
+    """
+    values = fitted["values"]
+    z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+    deviation = error_deviation(fitted)
+    points = []
+    for step in range(1, horizon + 1):
+        if fitted["model"] == "holt-winters":
+            state = fitted["state"]
+            index = (state["position"] + step - 1) % SEASON_LENGTH
+            value = state["level"] + step * state["trend"] + state["season"][index]
+            width = z * deviation * math.sqrt(step)
+        elif fitted["model"] == "seasonal-naive":
+            value = values[len(values) - SEASON_LENGTH + (step - 1) % SEASON_LENGTH]
+            width = z * deviation * math.sqrt((step - 1) // SEASON_LENGTH + 1)
+        else:
+            value = values[-1]
+            width = z * deviation * math.sqrt(step)
+        points.append((value, value - width, value + width))
+    return points
+
+
+def get_fit(
+    db_number: int,
+    metric: str,
+    model: str,
+    version: int,
+    last_month: tuple,
+    load_series,
+) -> dict:
+    """
+    Gets the fitted model of a company metric, fitting or updating it when the
+    data version or the last closed month changed.
+
+    Args:
+        db_number (int): The database number.
+        metric (str): The metric, a KPI name.
+        model (str): The requested model, one of MODELS.
+        version (int): The current data version of the database.
+        last_month (tuple): The year and month of the last closed month.
+        load_series: A function without arguments that returns the first month
+            and the values of the series, only called when the model is refreshed.
+
+    Returns:
+        dict: The fitted model with its first month, or None without data.
+
+    Raises:
+        ValueError: If the series is too short for the model.
+    """
+    key = (db_number, metric, model)
+    with _lock:
+        fitted = _fits.get(key)
+    if (
+        fitted is not None
+        and fitted["version"] == version
+        and fitted["last_month"] == last_month
+    ):
+        return fitted
+
+    first, values = load_series()
+    if not values:
+        return None
+    chosen = choose_model(model, len(values))
+    if (
+        fitted is not None
+        and fitted["first"] == first
+        and fitted["model"] == chosen
+        and len(values) >= len(fitted["values"])
+    ):
+        fitted = update(fitted, values)
+    else:
+        fitted = fit(chosen, values)
+    fitted = {**fitted, "first": first, "version": version, "last_month": last_month}
+    with _lock:
+        _fits[key] = fitted
+    return fitted
@@ -0,0 +1,497 @@
+"""
+Index advisor for the Aspel SAE tables used by the API.
+
+Inspects the indexes of every company database and compares them against the
+access paths of the endpoints in main.py (filters and joins), proposes the
+missing composite or covering indexes, and optionally creates them and
+benchmarks the endpoints before and after.
+
+Usage:
+    python index_advisor.py --db-number 1
+    python index_advisor.py --all --apply --benchmark
+"""
+
+import argparse
+import inspect
+import os
+import sqlite3
+import time
+
+from db import get_db_connection
+from dotenv import load_dotenv
+from pydantic.fields import FieldInfo
+from query_builder import table_name
+
+load_dotenv()
+
+# Access paths of the endpoints: table prefix, equality columns, range column,
+# columns read by the query (for covering indexes) and the endpoints using it
+ACCESS_PATHS = [
+    {
+        "table": "FACTF",
+        "equality": ["CVE_DOC"],
+        "range": None,
+        "include": ["STATUS", "FECHA_DOC", "CVE_CLPV", "CVE_VEND"],
+        "endpoints": [
+            "/gross-profit-margin/",
+            "/sales-vs-profit/",
+            "/sales-by-*/",
+            "/drill-down/product-invoices/",
+        ],
+    },
+    {
+        "table": "FACTF",
+        "equality": ["STATUS"],
+        "range": "FECHA_DOC",
+        "include": ["CVE_DOC", "CVE_CLPV", "CVE_VEND", "CAN_TOT", "TIPCAMB"],
+        "endpoints": ["/sales/", "/sellers/", "/sales-vs-profit/", "/sales-by-*/"],
+    },
+    {
+        "table": "FACTF",
+        "equality": ["CVE_CLPV"],
+        "range": None,
+        "include": [],
+        "endpoints": ["/sales/", "/sales-by-towns/", "/sales-by-clients/"],
+    },
+    {
+        "table": "FACTF",
+        "equality": ["CVE_VEND"],
+        "range": None,
+        "include": [],
+        "endpoints": ["/sellers/", "/sales-and-profits-by-sellers/"],
+    },
+    {
+        "table": "PAR_FACTF",
+        "equality": ["CVE_DOC"],
+        "range": None,
+        "include": ["CANT", "PREC", "TIP_CAM", "COST"],
+        "endpoints": ["/gross-profit-margin/", "/sales-vs-profit/", "/sales-by-*/"],
+    },
+    {
+        "table": "COMPC",
+        "equality": ["STATUS"],
+        "range": "FECHA_DOC",
+        "include": ["CVE_CLPV", "CAN_TOT"],
+        "endpoints": ["/purchases/"],
+    },
+    {
+        "table": "MINVE",
+        "equality": ["CVE_CPTO", "TIPO_DOC"],
+        "range": "FECHA_DOCU",
+        "include": ["CVE_ART", "CANT", "PRECIO", "COSTO"],
+        "endpoints": [
+            "/products/",
+            "/goods/",
+            "/sales-by-lines/",
+            "/sales-by-products/",
+        ],
+    },
+    {
+        "table": "MINVE",
+        "equality": [],
+        "range": "FECHA_DOCU",
+        "include": ["CVE_ART", "CVE_CPTO", "CANT", "COSTO"],
+        "endpoints": ["/inventory/{level}/"],
+    },
+    {
+        "table": "MINVE",
+        "equality": ["CVE_ART"],
+        "range": "NUM_MOV",
+        "include": [
+            "CVE_CPTO",
+            "TIPO_DOC",
+            "FECHA_DOCU",
+            "REFER",
+            "CANT",
+            "PRECIO",
+            "COSTO",
+        ],
+        "endpoints": ["/drill-down/product-invoices/"],
+    },
+    {
+        "table": "MINVE",
+        "equality": ["CVE_ART"],
+        "range": None,
+        "include": [],
+        "endpoints": [
+            "/products/",
+            "/goods/",
+            "/sales-by-lines/",
+            "/sales-by-products/",
+            "/drill-down/line-products/",
+        ],
+    },
+    {
+        "table": "CLIE",
+        "equality": ["CLAVE"],
+        "range": None,
+        "include": [],
+        "endpoints": ["/sales/", "/sales-by-towns/", "/sales-by-clients/"],
+    },
+    {
+        "table": "VEND",
+        "equality": ["CVE_VEND"],
+        "range": None,
+        "include": [],
+        "endpoints": ["/sellers/", "/sales-and-profits-by-sellers/"],
+    },
+    {
+        "table": "PROV",
+        "equality": ["CLAVE"],
+        "range": None,
+        "include": [],
+        "endpoints": ["/purchases/"],
+    },
+    {
+        "table": "INVE",
+        "equality": ["CVE_ART"],
+        "range": None,
+        "include": [],
+        "endpoints": [
+            "/products/",
+            "/goods/",
+            "/sales-by-lines/",
+            "/sales-by-products/",
+            "/drill-down/line-products/",
+        ],
+    },
+    {
+        "table": "INVE",
+        "equality": ["LIN_PROD"],
+        "range": None,
+        "include": ["CVE_ART", "DESCR"],
+        "endpoints": ["/drill-down/line-products/"],
+    },
+    {
+        "table": "CLIN",
+        "equality": ["CVE_LIN"],
+        "range": None,
+        "include": [],
+        "endpoints": ["/sales-by-lines/"],
+    },
+]
+
+
+def get_connection(db_number: int):
+    """
+    Opens a connection that can create indexes.
+
+    Args:
+        db_number (int): The database number.
+
+    Returns:
+        A DB-API connection, or None if the connection fails.
+    """
+    if os.getenv("DBMS") == "SQLITE":
+        # The API opens SQLite read-only, the advisor needs to write
+        return sqlite3.connect(os.getenv(f"SQLITE_{db_number}"))
+    return get_db_connection(db_number)
+
+
+def get_indexes(conn, table: str) -> list:
+    """
+    Gets the indexes of a table with their key columns in order.
+
+    Args:
+        conn: An open connection.
+        table (str): The table name.
+
+    Returns:
+        list: A list of dictionaries with the name, key columns and included columns.
+    """
+    dbms = os.getenv("DBMS")
+    cursor = conn.cursor()
+    indexes = {}
+    try:
+        if dbms == "FIREBIRD":
+            cursor.execute(
+                """
+                SELECT i.RDB$INDEX_NAME, s.RDB$FIELD_NAME
+                FROM RDB$INDICES i INNER JOIN RDB$INDEX_SEGMENTS s
+                ON i.RDB$INDEX_NAME = s.RDB$INDEX_NAME
+                WHERE i.RDB$RELATION_NAME = ?
+                AND (i.RDB$INDEX_INACTIVE IS NULL OR i.RDB$INDEX_INACTIVE = 0)
+                ORDER BY i.RDB$INDEX_NAME, s.RDB$FIELD_POSITION
+                """,
+                (table,),
+            )
+            for name, column in cursor.fetchall():
+                index = indexes.setdefault(name.strip(), {"columns": [], "include": []})
+                index["columns"].append(column.strip())
+        elif dbms == "SQLSERVER":
+            cursor.execute(
+                """
+                SELECT i.name, c.name, ic.is_included_column
+                FROM sys.indexes i
+                INNER JOIN sys.index_columns ic
+                ON i.object_id = ic.object_id AND i.index_id = ic.index_id
+                INNER JOIN sys.columns c
+                ON ic.object_id = c.object_id AND ic.column_id = c.column_id
+                WHERE i.object_id = OBJECT_ID(%s) AND i.is_disabled = 0
+                ORDER BY i.name, ic.key_ordinal
+                """,
+                (table,),
+            )
+            for name, column, is_included in cursor.fetchall():
+                index = indexes.setdefault(name, {"columns": [], "include": []})
+                index["include" if is_included else "columns"].append(column.upper())
+        elif dbms == "SQLITE":
+            cursor.execute(f"PRAGMA index_list({table})")
+            for row in cursor.fetchall():
+                name = row[1]
+                info = conn.execute(f"PRAGMA index_info({name})").fetchall()
+                indexes[name] = {
+                    "columns": [column[2].upper() for column in info],
+                    "include": [],
+                }
+            # INTEGER PRIMARY KEY columns are the rowid, not a listed index
+            cursor.execute(f"PRAGMA table_info({table})")
+            for row in cursor.fetchall():
+                if row[5] == 1 and row[2].upper() == "INTEGER":
+                    indexes["rowid"] = {"columns": [row[1].upper()], "include": []}
+    finally:
+        cursor.close()
+
+    return [{"name": name, **index} for name, index in indexes.items()]
+
+
+def covers(index: dict, path: dict) -> bool:
+    """
+    Checks if an index supports an access path.
+
+    The equality columns must be the leading key columns (in any order), and
+    the range column, if any, the next one.
+
+    Args:
+        index (dict): The index with its key columns.
+        path (dict): The access path.
+
+    Returns:
+        bool: True if the index supports the access path.
+    """
+    equality = set(path["equality"])
+    leading = index["columns"][: len(equality)]
+    if set(leading) != equality:
+        return False
+    if path["range"] is None:
+        return True
+    return index["columns"][len(equality) : len(equality) + 1] == [path["range"]]
+
+
+def propose_index(table: str, path: dict, number: int) -> str:
+    """
+    Builds the CREATE INDEX statement of an access path.
+
+    SQL Server gets a covering index with INCLUDE columns, Firebird and SQLite
+    get a composite index on the key columns.
+
+    Args:
+        table (str): The table name.
+        path (dict): The access path.
+        number (int): The number of the proposed index of the table.
+
+    Returns:
+        str: The CREATE INDEX statement.
+    """
+    columns = path["equality"] + ([path["range"]] if path["range"] else [])
+    # Firebird 2.5 index names are limited to 31 characters
+    name = f"IDX_DASH_{table}_{number}"[:31]
+    statement = f"CREATE INDEX {name} ON {table} ({', '.join(columns)})"
+    if os.getenv("DBMS") == "SQLSERVER" and path["include"]:
+        statement += f" INCLUDE ({', '.join(path['include'])})"
+    return statement
+
+
+def advise(db_number: int) -> list:
+    """
+    Compares the indexes of a company database against the access paths.
+
+    Args:
+        db_number (int): The database number.
+
+    Returns:
+        list: A list of dictionaries with the table, the access path, the index
+        that supports it (or None) and the proposed statement.
+    """
+    conn = get_connection(db_number)
+    if conn is None:
+        return []
+
+    advice = []
+    proposed_per_table = {}
+    try:
+        indexes_by_table = {}
+        for path in ACCESS_PATHS:
+            table = table_name(path["table"], db_number)
+            if table not in indexes_by_table:
+                indexes_by_table[table] = get_indexes(conn, table)
+
+            supporting = next(
+                (
+                    index["name"]
+                    for index in indexes_by_table[table]
+                    if covers(index, path)
+                ),
+                None,
+            )
+            statement = None
+            if supporting is None:
+                proposed_per_table[table] = proposed_per_table.get(table, 0) + 1
+                statement = propose_index(table, path, proposed_per_table[table])
+                # The proposed index can support the next paths of the table
+                indexes_by_table[table].append(
+                    {
+                        "name": statement.split()[2],
+                        "columns": path["equality"]
+                        + ([path["range"]] if path["range"] else []),
+                    }
+                )
+            advice.append(
+                {
+                    "table": table,
+                    "path": path,
+                    "index": supporting,
+                    "statement": statement,
+                }
+            )
+    finally:
+        conn.close()
+    return advice
+
+
+def apply(db_number: int, statements: list):
+    """
+    Creates the proposed indexes.
+
+    Args:
+        db_number (int): The database number.
+        statements (list): The CREATE INDEX statements.
+    """
+    conn = get_connection(db_number)
+    cursor = conn.cursor()
+    try:
+        for statement in statements:
+            print(f"  {statement}", flush=True)
+            cursor.execute(statement)
+            conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def get_default_arguments(endpoint) -> dict:
+    """
+    Gets the default arguments of an endpoint function, called outside of a
+    request, with the defaults of its Query parameters unwrapped.
+
+    Args:
+        endpoint: The endpoint function.
+
+    Returns:
+        dict: The default of every parameter but db_number, None if the endpoint
+        has other required parameters.
+    """
+    arguments = {}
+    for parameter in inspect.signature(endpoint).parameters.values():
+        if parameter.name == "db_number":
+            continue
+        default = parameter.default
+        if isinstance(default, FieldInfo):
+            if default.is_required():
+                return None
+            default = default.default
+        if default is inspect.Parameter.empty:
+            return None
+        arguments[parameter.name] = default
+    return arguments
+
+
+def benchmark(db_number: int, repeat: int = 3) -> dict:
+    """
+    Times every endpoint of the API for a company database.
+
+    Args:
+        db_number (int): The database number.
+        repeat (int): The number of runs, the best time is kept.
+
+    Returns:
+        dict: The best time in seconds of every endpoint.
+    """
+    import cache
+    import main
+
+    timings = {}
+    for route in main.app.routes:
+        path = getattr(route, "path", "")
+        if not path.endswith("/") or path.startswith(("/debug", "/sync", "/data")):
+            continue
+        # Endpoints with required parameters (drill-downs, exports, ...) need a
+        # parent key or period, they aren't timed
+        arguments = get_default_arguments(route.endpoint)
+        if arguments is None:
+            continue
+        arguments["db_number"] = db_number
+        best = float("inf")
+        for _ in range(repeat):
+            cache.clear()
+            start = time.perf_counter()
+            route.endpoint(**arguments)
+            best = min(best, time.perf_counter() - start)
+        timings[path] = best
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index advisor for Aspel SAE tables")
+    parser.add_argument("--db-number", type=int, default=1)
+    parser.add_argument("--all", action="store_true", help="Every company database")
+    parser.add_argument("--apply", action="store_true", help="Create the indexes")
+    parser.add_argument(
+        "--benchmark", action="store_true", help="Time the endpoints before and after"
+    )
+    args = parser.parse_args()
+
+    db_numbers = (
+        range(1, int(os.getenv("NUMBER_OF_DATABASES", "1")) + 1)
+        if args.all
+        else [args.db_number]
+    )
+
+    for db_number in db_numbers:
+        print(f"\nBase de datos {db_number} ({os.getenv('DBMS')})")
+        advice = advise(db_number)
+        if not advice:
+            print("  No se pudo conectar a la base de datos")
+            continue
+
+        for item in advice:
+            path = item["path"]
+            columns = ", ".join(
+                path["equality"] + ([path["range"]] if path["range"] else [])
+            )
+            status = f"OK ({item['index']})" if item["index"] else "FALTA"
+            print(f"  {item['table']:<14} ({columns:<30}) {status}")
+
+        statements = [item["statement"] for item in advice if item["statement"]]
+        if statements:
+            print("\n  Índices propuestos:")
+            for statement in statements:
+                print(f"    {statement};")
+
+        if not args.apply or not statements:
+            continue
+
+        before = benchmark(db_number) if args.benchmark else None
+        print("\n  Creando índices:")
+        apply(db_number, statements)
+        if before is not None:
+            after = benchmark(db_number)
+            print("\n  Endpoint                               Antes    Después")
+            for path, seconds in before.items():
+                print(
+                    f"  {path:<36} {seconds * 1000:>7.1f}ms {after[path] * 1000:>7.1f}ms"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Inventory turnover, days of stock and slow movers by product and line.
+
+The stock of a product at a date is its current stock (INVE.EXIST) minus the
+net quantity of its movements (entries minus exits, over all the concepts)
+from that date onwards. The database totals the movements of every product by
+month from the start of the period (the inventory-movements dataset), so one
+pass over those rows gives the stock at the start and end of the period and
+the exits within it:
+
+    turnover: The exits over the average of the stock at the start and end,
+        valued at the average cost for the lines.
+    days_of_stock: The stock at the end over the average daily exits of the
+        period, None without exits.
+    slow: Whether the product (or line) has stock at the end and no exits, or
+        more than SLOW_MOVER_DAYS days of stock.
+
+The negative stocks (movements posted without stock) count as 0 in the averages.
+"""
+
+import os
+from datetime import date
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Days of stock over which a product or line is a slow mover
+slow_mover_days = int(os.getenv("SLOW_MOVER_DAYS", "180"))
+
+INVENTORY_LEVELS = ["products", "lines"]
+
+# Line of the products without a line in the catalog
+NO_LINE = "Sin línea"
+
+
+def period_days(start: date, end: date, today: date = None) -> int:
+    """
+    Counts the days of a period that already passed.
+
+    Args:
+        start (date): The first date of the period.
+        end (date): The first date after the period.
+        today (date): The current date (optional), today by default.
+
+    Returns:
+        int: The days from the start to the end of the period or to today, at
+        least 1.
+    """
+    today = today or date.today()
+    return max((min(end, today) - start).days, 1)
+
+
+def measure(stock_start: float, stock_end: float, exits: float, days: int) -> dict:
+    """
+    Calculates the turnover, days of stock and slow mover flag of a stock.
+
+    Args:
+        stock_start (float): The stock at the start of the period.
+        stock_end (float): The stock at the end of the period.
+        exits (float): The exits of the period.
+        days (int): The days of the period.
+
+    Returns:
+        dict: The turnover (None without stock), the days of stock (None without
+        exits) and the slow mover flag.
+    """
+    average = (max(stock_start, 0) + max(stock_end, 0)) / 2
+    days_of_stock = max(stock_end, 0) / (exits / days) if exits > 0 else None
+    return {
+        "turnover": exits / average if average > 0 else None,
+        "days_of_stock": days_of_stock,
+        "slow": stock_end > 0
+        and (days_of_stock is None or days_of_stock > slow_mover_days),
+    }
+
+
+def sort_key(item: dict) -> tuple:
+    """
+    Sorts the slow movers first, by their days of stock from the highest (the
+    ones without exits first), and then by the value of their stock.
+
+    Args:
+        item (dict): The product or line.
+
+    Returns:
+        tuple: The sort key.
+    """
+    days_of_stock = item["days_of_stock"]
+    return (
+        not item["slow"],
+        -(float("inf") if days_of_stock is None else days_of_stock),
+        -item["stock_value"],
+    )
+
+
+def analyze(stock_rows: list, movement_rows: list, end: date, days: int) -> dict:
+    """
+    Calculates the turnover and days of stock of every product and line.
+
+    Args:
+        stock_rows (list): The rows of the inventory-stock dataset, the current
+            stock and average cost of every product.
+        movement_rows (list): The rows of the inventory-movements dataset from
+            the start of the period, with the net quantity, exits and their cost
+            of every product and month.
+        end (date): The first date after the period.
+        days (int): The days of the period (see period_days).
+
+    Returns:
+        dict: The products and lines sorted by sort_key, the number of days and
+        the value of the stock at the end.
+    """
+    end_month = (end.year, end.month)
+    movements = {}
+    for row in movement_rows:
+        totals = movements.setdefault(row["product"], [0.0, 0.0, 0.0, 0.0])
+        net = float(row["net_qty"] or 0)
+        # Net quantity since the start, since the end, and exits of the period
+        totals[0] += net
+        if (int(row["year_concept"]), int(row["month_concept"])) >= end_month:
+            totals[1] += net
+        else:
+            totals[2] += float(row["exits_qty"] or 0)
+            totals[3] += float(row["exits_cost"] or 0)
+
+    products, lines = [], {}
+    for row in stock_rows:
+        since_start, since_end, exits, exits_cost = movements.get(
+            row["product"], (0.0, 0.0, 0.0, 0.0)
+        )
+        stock = float(row["stock"] or 0)
+        cost = float(row["cost"] or 0)
+        line_name = row["line"] or NO_LINE
+        stock_start, stock_end = stock - since_start, stock - since_end
+        products.append(
+            {
+                "product": row["product"],
+                "name": row["name"],
+                "line": line_name,
+                "stock_start": stock_start,
+                "stock_end": stock_end,
+                "stock_value": max(stock_end, 0) * cost,
+                "exits": exits,
+                "exits_cost": exits_cost,
+                **measure(stock_start, stock_end, exits, days),
+            }
+        )
+
+        # The lines add up the stocks at their value, the products of a line
+        # are measured in different units
+        line = lines.setdefault(
+            line_name,
+            {
+                "name": line_name,
+                "products": 0,
+                "start_value": 0.0,
+                "end_value": 0.0,
+                "exits_cost": 0.0,
+            },
+        )
+        line["products"] += 1
+        line["start_value"] += max(stock_start, 0) * cost
+        line["end_value"] += max(stock_end, 0) * cost
+        line["exits_cost"] += exits_cost
+
+    line_items = [
+        {
+            "product": None,
+            "name": line["name"],
+            "line": line["name"],
+            "products": line["products"],
+            "stock_start": line["start_value"],
+            "stock_end": line["end_value"],
+            "stock_value": line["end_value"],
+            "exits": line["exits_cost"],
+            "exits_cost": line["exits_cost"],
+            **measure(line["start_value"], line["end_value"], line["exits_cost"], days),
+        }
+        for line in lines.values()
+    ]
+    return {
+        "days": days,
+        "stock_value": sum(item["stock_value"] for item in products),
+        "products": sorted(products, key=sort_key),
+        "lines": sorted(line_items, key=sort_key),
+    }
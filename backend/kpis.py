@@ -0,0 +1,115 @@
+import statistics
+
+# KPIs of the dashboard: the dataset, the column and the default aggregation.
+# The distinct counts come from the COUNT(DISTINCT) datasets, one row per period
+KPIS = {
+    "sales": ("sales", "total_sales", "sum"),
+    "gross_profit": ("gross-profit-margin", "total_gpm", "sum"),
+    "products_sold": ("products", "total_qty", "sum"),
+    "clients": ("clients-distinct", "count", "sum"),
+    "sellers": ("sellers-distinct", "count", "sum"),
+    "purchases": ("purchases", "total_purchases", "sum"),
+    "goods": ("goods", "total_qty", "sum"),
+    "providers": ("providers-distinct", "count", "sum"),
+}
+
+AGGREGATIONS = ["sum", "mean", "median", "max", "min", "count", "nunique"]
+
+
+def parse_kpis(kpis: str = None) -> list:
+    """
+    Parses the requested KPIs, e.g. "sales,clients,sales:median".
+
+    Args:
+        kpis (str): The KPI names separated by commas, each one optionally with an
+            aggregation after a colon. All the KPIs with their default aggregation
+            if it's None.
+
+    Returns:
+        list: The KPI name, dataset, column and aggregation of every requested KPI.
+
+    Raises:
+        ValueError: If a KPI or an aggregation is unknown.
+    """
+    requested = kpis.split(",") if kpis else list(KPIS)
+    parsed = []
+    for item in requested:
+        name, _, aggregation = item.strip().partition(":")
+        if name not in KPIS:
+            raise ValueError(f"KPI desconocido: {name}")
+        dataset, column, default_aggregation = KPIS[name]
+        aggregation = aggregation or default_aggregation
+        if aggregation not in AGGREGATIONS:
+            raise ValueError(f"Agregación desconocida: {aggregation}")
+        parsed.append((name, dataset, column, aggregation))
+    return parsed
+
+
+def previous_period(year: int, month: int = None) -> tuple:
+    """
+    Gets the period before a month or a year.
+
+    Args:
+        year (int): The year.
+        month (int): The month (optional), the period is the whole year if it's None.
+
+    Returns:
+        tuple: The year and month of the previous period (month None for a year).
+    """
+    if month is None:
+        return year - 1, None
+    if month == 1:
+        return year - 1, 12
+    return year, month - 1
+
+
+def aggregate(rows: list, column: str, aggregation: str):
+    """
+    Aggregates a column of the rollup rows of a period.
+
+    The aggregations work like the pandas ones over the same rows: sum, count
+    and nunique are 0 without rows, the others are None.
+
+    Args:
+        rows (list): The rows of the period.
+        column (str): The column to aggregate.
+        aggregation (str): The aggregation, one of AGGREGATIONS.
+
+    Returns:
+        The aggregated value.
+    """
+    values = [row[column] for row in rows if row[column] is not None]
+    if aggregation == "sum":
+        return sum(values)
+    if aggregation == "count":
+        return len(values)
+    if aggregation == "nunique":
+        return len(set(values))
+    if not values:
+        return None
+    if aggregation == "mean":
+        return statistics.fmean(values)
+    if aggregation == "median":
+        return statistics.median(values)
+    if aggregation == "max":
+        return max(values)
+    return min(values)
+
+
+def percent_delta(previous, current) -> float:
+    """
+    Calculates the percentage difference between the previous and current values.
+
+    Args:
+        previous: The value of the previous period.
+        current: The value of the current period.
+
+    Returns:
+        float: The percentage difference rounded to 2 decimals, 0 when the previous
+        value is 0 like the dashboard deltas, or None if a value is missing.
+    """
+    if previous is None or current is None:
+        return None
+    if previous == 0:
+        return 0
+    return round((current - previous) / previous * 100, 2)
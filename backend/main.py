@@ -1,12 +1,42 @@
 import os
-from typing import List
-
-from db import get_db_connection
+import time
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from typing import List, Optional
+
+import anomalies
+import cache
+import change_detection
+import cohorts
+import drill_down
+import exports
+import forecasting
+import inventory
+import kpis
+import metrics
+import pareto
+import query_builder
+import sketches
+import slow_queries
+import snapshots
+from datasets import DISTINCT_ENTITIES, PUBLIC_DATASETS
+from db import acquire_connection, execute_cached, release_connection
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from schemas import (
+    AbcResponse,
+    AnomaliesResponse,
+    CohortsResponse,
+    DataVersion,
+    DistinctCountsResponse,
+    DrillDownInvoices,
+    DrillDownProducts,
+    ForecastResponse,
     GoodsVector,
     GrossProftMarginVector,
+    InventoryResponse,
+    KpisResponse,
     LinesVector,
     ProductsVector,
     PurchasesVector,
@@ -15,894 +45,1237 @@ from schemas import (
     SalesVector,
     SalesVsProfitVector,
     SellersVector,
+    SlowQuery,
+    SyncResponse,
 )
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Starts the change detection of the source tables, the snapshot exporter and
+    the detection of atypical days with the API, and stops them on shutdown.
+    """
+    stop = change_detection.start_polling()
+    stop_snapshots = snapshots.start_exporting()
+    stop_anomalies = anomalies.start_detecting()
+    yield
+    if stop is not None:
+        stop.set()
+    if stop_snapshots is not None:
+        stop_snapshots.set()
+    if stop_anomalies is not None:
+        stop_anomalies.set()
+    metrics.mark_process_dead()
+
+
+app = FastAPI(lifespan=lifespan)
 
 load_dotenv()
 
-if os.getenv("DBMS") == "SQLSERVER":
-    year_instruction = ["YEAR(a.FECHA_DOC)", "YEAR(a.FECHA_DOCU)"]
-    month_instruction = ["MONTH(a.FECHA_DOC)", "MONTH(a.FECHA_DOCU)"]
-    top_instruction = "TOP 5"
-elif os.getenv("DBMS") == "FIREBIRD":
-    year_instruction = [
-        "EXTRACT(YEAR FROM a.FECHA_DOC)",
-        "EXTRACT(YEAR FROM a.FECHA_DOCU)",
-    ]
-    month_instruction = [
-        "EXTRACT(MONTH FROM a.FECHA_DOC)",
-        "EXTRACT(MONTH FROM a.FECHA_DOCU)",
-    ]
-    top_instruction = "FIRST 5"
+# Months before the last sync that are sent again, documents can be posted or
+# cancelled with a date of a previous month
+sync_lookback_months = int(os.getenv("SYNC_LOOKBACK_MONTHS", "1"))
 
 
-def get_table_name(
-    db_number: int, concept_prefix: str, subject_prefix: str, other_prefix: str = None
-) -> str:
+def fetch_rows(
+    endpoint: str, db_number: int, query: str, columns: List[str], params=None
+) -> list:
     """
-    Constructs table names based on the given database number and prefixes.
+    Runs a query on a company database and converts the rows to dictionaries.
+
+    The connection is borrowed from the pool of the database and the query runs
+    as a cached prepared statement (see db.execute_cached).
+
+    The connect, execute, fetch and row-to-dict times, the number of rows and
+    the errors are recorded in the metrics of the endpoint, and queries over
+    the slow query threshold are recorded in the slow query log.
 
     Args:
-        db_number (int): The database number to include in the table name.
-        concept_prefix (str): The prefix for the concept table name.
-        subject_prefix (str): The prefix for the subject table name.
-        other_prefix (str): Other prefix for a third table
+        endpoint (str): The endpoint path, used as the metrics label.
+        db_number (int): The database number to run the query on.
+        query (str): The query to run.
+        columns (List[str]): The names of the columns of the result rows.
+        params: The parameters bound to the query (optional).
 
     Returns:
-        tuple: A tuple containing the concept table name and the subject table name.
+        list: A list of dictionaries, one per row.
     """
 
-    if len(str(db_number)) >= 1 and len(str(db_number)) <= 9:
-        concept_table = f"{concept_prefix}0{db_number}"
-        subject_table = f"{subject_prefix}0{db_number}"
+    with metrics.observe(metrics.CONNECT_SECONDS, endpoint, db_number):
+        entry = acquire_connection(db_number)
+    if entry is None:
+        metrics.ERRORS.labels(endpoint, str(db_number), "connect").inc()
+        raise HTTPException(
+            status_code=503, detail="No se pudo conectar a la base de datos"
+        )
 
-        if other_prefix is not None:
-            other_table = f"{other_prefix}0{db_number}"
-    else:
-        concept_table = f"{concept_prefix}{db_number}"
-        subject_table = f"{concept_prefix}{db_number}"
+    plan = None
+    reusable = False
+    try:
+        start = time.perf_counter()
+        with metrics.observe(metrics.QUERY_SECONDS, endpoint, db_number):
+            execute_cached(entry, query, params)
+        with metrics.observe(metrics.FETCH_SECONDS, endpoint, db_number):
+            results = entry["cursor"].fetchall()
+        duration_ms = (time.perf_counter() - start) * 1000
+
+        if slow_queries.is_slow(duration_ms) and slow_queries.capture_plan_enabled:
+            plan = slow_queries.capture_plan(entry["conn"], query, params)
+        reusable = True
+    except Exception:
+        metrics.ERRORS.labels(endpoint, str(db_number), "query").inc()
+        raise
+    finally:
+        release_connection(db_number, entry, reusable)
+
+    if slow_queries.is_slow(duration_ms):
+        slow_queries.record(
+            endpoint,
+            db_number,
+            query,
+            duration_ms,
+            len(results),
+            params=list(params) if params else None,
+            plan=plan,
+        )
+
+    # We convert each tuple to a dictionary
+    with metrics.observe(metrics.CONVERT_SECONDS, endpoint, db_number):
+        formatted_results = [dict(zip(columns, row)) for row in results]
+
+    metrics.ROWS.labels(endpoint, str(db_number)).observe(len(formatted_results))
+    metrics.mark_handler_end()
+    return formatted_results
+
+
+def run_dataset(
+    endpoint: str,
+    name: str,
+    db_number: int,
+    year: int = None,
+    month: int = None,
+    since: date = None,
+) -> list:
+    """
+    Runs a dataset of datasets.py on a company database.
 
-        if other_prefix is not None:
-            other_table = f"{other_prefix}{db_number}"
+    The results are cached (see cache.py) until they expire or change detection
+    invalidates them. The query is compiled for the current DBMS by
+    query_builder.compile_dataset(), which caches the compiled statements, and the
+    filter values are bound as parameters.
+    When a year (and optionally a month) is given, the filter is pushed down to the
+    database as a range on the date column, and when a since date is given, as a
+    lower bound of the date column.
 
-    if other_prefix is not None:
-        return concept_table, subject_table, other_table
-    else:
-        return concept_table, subject_table
+    Args:
+        endpoint (str): The endpoint path, used as the metrics label.
+        name (str): The dataset name.
+        db_number (int): The database number to run the query on.
+        year (int): The year to filter by (optional).
+        month (int): The month of the year to filter by (optional).
+        since (date): The first date to return (optional), ignored with a year.
+
+    Returns:
+        list: A list of dictionaries, one per row.
+    """
+    if month is not None and (year is None or not 1 <= month <= 12):
+        raise HTTPException(status_code=422, detail="Mes inválido o sin año")
+
+    date_filter, start, end = None, None, None
+    if year is not None:
+        date_filter = "range"
+        start, end = query_builder.period_range(year, month)
+    elif since is not None:
+        date_filter, start = "since", since
+
+    key = (name, db_number, date_filter, start, end)
+    rows = cache.get(key)
+    if rows is not None:
+        metrics.CACHE_REQUESTS.labels(endpoint, str(db_number), "hit").inc()
+        metrics.mark_handler_end()
+        return rows
+    metrics.CACHE_REQUESTS.labels(endpoint, str(db_number), "miss").inc()
+
+    query, params, columns = query_builder.compile_dataset(
+        name, os.getenv("DBMS"), db_number, date_filter
+    )
+    bounds = [bound for bound in (start, end) if bound is not None]
+    params += tuple(query_builder.date_param(bound) for bound in bounds)
+
+    rows = fetch_rows(endpoint, db_number, query, list(columns), params)
+    cache.put(key, rows, start, end)
+    return rows
 
 
 # Endpoint for sales vector
 @app.get("/sales/", response_model=List[SalesVector])
-def get_sales(db_number: int = 1):
+def get_sales(
+    db_number: int = 1,
+    year: Optional[int] = Query(
+        None, ge=query_builder.MIN_YEAR, le=query_builder.MAX_YEAR
+    ),
+    month: Optional[int] = None,
+):
     """
     Endpoint to get sales data from the database.
 
     Returns a list of SalesVector objects containing the name of the client,
     the month and year of the sale, and the total sales amount.
 
-    The query is constructed using the instructions for the current database manager system (DBMS).
-
-    If the DBMS is SQLSERVER, the results are returned as a list of dictionaries.
-
-    If the DBMS is FIREBIRD, the results are returned as a list of tuples,
-    which are then converted to a list of dictionaries.
+    The query is compiled from the sales dataset for the current database manager system (DBMS),
+    optionally filtered by year and month, and run by run_dataset().
     """
-
-    final_query = ""
-
-    invoices_table, clients_table = get_table_name(db_number, "FACTF", "CLIE")
-    query = f"""
-    SELECT  b.NOMBRE AS name, 
-    {month_instruction[0]} AS month_concept, 
-    {year_instruction[0]} AS year_concept,  
-    SUM(a.CAN_TOT*a.TIPCAMB) AS total_sales 
-    FROM {invoices_table} AS a INNER JOIN {clients_table} AS b 
-    ON a.CVE_CLPV = b.CLAVE 
-    WHERE (a.STATUS <> 'C') 
-    AND (b.NOMBRE IS NOT NULL AND b.NOMBRE <> '')
-    """
-
-    final_query = f" GROUP BY b.NOMBRE, {month_instruction[0]}, {year_instruction[0]}"
-
-    query += final_query
-
-    conn = get_db_connection(db_number)
-    cursor = (
-        conn.cursor(as_dict=True) if os.getenv("DBMS") == "SQLSERVER" else conn.cursor()
-    )
-    try:
-        cursor.execute(query)
-        results = cursor.fetchall()
-    finally:
-        cursor.close()
-        conn.close()
-
-    if os.getenv("DBMS") == "SQLSERVER":
-        return results
-    else:
-        # We convert each tuple to a dictionary
-        formatted_results = [
-            {
-                "name": row[0],
-                "month_concept": row[1],
-                "year_concept": row[2],
-                "total_sales": row[3],
-            }
-            for row in results
-        ]
-        return formatted_results
+    return run_dataset("/sales/", "sales", db_number, year, month)
 
 
 # Endpoint for shopping vector
 @app.get("/purchases/", response_model=List[PurchasesVector])
-def get_purchases(db_number: int = 1):
+def get_purchases(
+    db_number: int = 1,
+    year: Optional[int] = Query(
+        None, ge=query_builder.MIN_YEAR, le=query_builder.MAX_YEAR
+    ),
+    month: Optional[int] = None,
+):
     """
     Endpoint to get purchase data from the database.
 
     Returns a list of PurchasesVector objects containing the name of the supplier,
     the month and year of the purchase, and the total purchase amount.
 
-    The query is constructed using the instructions for the current database manager system (DBMS).
-
-    If the DBMS is SQLSERVER, the results are returned as a list of dictionaries.
-
-    If the DBMS is FIREBIRD, the results are returned as a list of tuples,
-    which are then converted to a list of dictionaries.
-    """
-
-    final_query = ""
-    purchases_table, providers_table = get_table_name(db_number, "COMPC", "PROV")
-    query = f"""
-    SELECT  b.NOMBRE AS name, 
-    {month_instruction[0]} AS month_concept, 
-    {year_instruction[0]} AS year_concept,  
-    SUM(a.CAN_TOT) AS total_purchases 
-    FROM {purchases_table} AS a INNER JOIN {providers_table} AS b 
-    ON a.CVE_CLPV = b.CLAVE 
-    WHERE (a.STATUS <> 'C') AND (b.NOMBRE IS NOT NULL AND b.NOMBRE <> '')
+    The query is compiled from the purchases dataset for the current database manager system (DBMS),
+    optionally filtered by year and month, and run by run_dataset().
     """
-
-    final_query = f" GROUP BY b.NOMBRE, {month_instruction[0]}, {year_instruction[0]}"
-
-    query += final_query
-
-    conn = get_db_connection(db_number)
-    cursor = (
-        conn.cursor(as_dict=True) if os.getenv("DBMS") == "SQLSERVER" else conn.cursor()
-    )
-    try:
-        cursor.execute(query)
-        results = cursor.fetchall()
-    finally:
-        cursor.close()
-        conn.close()
-
-    if os.getenv("DBMS") == "SQLSERVER":
-        return results
-    else:
-        # We convert each tuple to a dictionary
-        formatted_results = [
-            {
-                "name": row[0],
-                "month_concept": row[1],
-                "year_concept": row[2],
-                "total_purchases": row[3],
-            }
-            for row in results
-        ]
-        return formatted_results
+    return run_dataset("/purchases/", "purchases", db_number, year, month)
 
 
 # Endpoint for sales vector by salesperson
 @app.get("/sellers/", response_model=List[SellersVector])
-def get_sales_of_seller(db_number: int = 1):
+def get_sales_of_seller(
+    db_number: int = 1,
+    year: Optional[int] = Query(
+        None, ge=query_builder.MIN_YEAR, le=query_builder.MAX_YEAR
+    ),
+    month: Optional[int] = None,
+):
     """
     Endpoint to get sales data by salesperson from the database.
 
     Returns a list of SellersVector objects containing the name of the salesperson,
     the month and year of the sale, and the total sales amount.
 
-    The query is constructed using the instructions for the current database manager system (DBMS).
-
-    If the DBMS is SQLSERVER, the results are returned as a list of dictionaries.
-
-    If the DBMS is FIREBIRD, the results are returned as a list of tuples,
-    which are then converted to a list of dictionaries.
+    The query is compiled from the sellers dataset for the current database manager system (DBMS),
+    optionally filtered by year and month, and run by run_dataset().
     """
-
-    final_query = ""
-    invoices_table, sellers_table = get_table_name(db_number, "FACTF", "VEND")
-    query = f"""
-    SELECT  b.NOMBRE AS name, 
-    {month_instruction[0]} AS month_concept, 
-    {year_instruction[0]} AS year_concept,  
-    SUM(a.CAN_TOT*a.TIPCAMB) AS total_sales 
-    FROM {invoices_table} AS a INNER JOIN {sellers_table} AS b 
-    ON a.CVE_VEND = b.CVE_VEND 
-    WHERE (a.STATUS <> 'C') AND (b.NOMBRE IS NOT NULL AND b.NOMBRE <> '')
-    """
-
-    final_query = f" GROUP BY b.NOMBRE, {month_instruction[0]}, {year_instruction[0]}"
-
-    query += final_query
-
-    conn = get_db_connection(db_number)
-    cursor = (
-        conn.cursor(as_dict=True) if os.getenv("DBMS") == "SQLSERVER" else conn.cursor()
-    )
-    try:
-        cursor.execute(query)
-        results = cursor.fetchall()
-    finally:
-        cursor.close()
-        conn.close()
-
-    if os.getenv("DBMS") == "SQLSERVER":
-        return results
-    else:
-        # We convert each tuple to a dictionary
-        formatted_results = [
-            {
-                "name": row[0],
-                "month_concept": row[1],
-                "year_concept": row[2],
-                "total_sales": row[3],
-            }
-            for row in results
-        ]
-        return formatted_results
+    return run_dataset("/sellers/", "sellers", db_number, year, month)
 
 
 # Endpoint for sales vector by products
 @app.get("/products/", response_model=List[ProductsVector])
-def get_sales_of_products(db_number: int = 1):
+def get_sales_of_products(
+    db_number: int = 1,
+    year: Optional[int] = Query(
+        None, ge=query_builder.MIN_YEAR, le=query_builder.MAX_YEAR
+    ),
+    month: Optional[int] = None,
+):
     """
     Endpoint to get sales data by product from the database.
 
     Returns a list of ProductsVector objects containing the name of the product,
     the month and year of the sale, and the total quantity sold.
 
-    The query is constructed using the instructions for the current database manager system (DBMS).
-
-    If the DBMS is SQLSERVER, the results are returned as a list of dictionaries.
-
-    If the DBMS is FIREBIRD, the results are returned as a list of tuples,
-    which are then converted to a list of dictionaries.
-    """
-
-    final_query = ""
-    movs_table, inventory_table = get_table_name(db_number, "MINVE", "INVE")
-    query = f"""
-    SELECT  b.DESCR AS name, 
-    {month_instruction[1]} AS month_concept, 
-    {year_instruction[1]} AS year_concept,  
-    SUM(a.CANT) AS total_qty 
-    FROM {movs_table} AS a INNER JOIN {inventory_table} AS b 
-    ON a.CVE_ART = b.CVE_ART 
-    WHERE (a.TIPO_DOC = 'F' AND a.CVE_CPTO=51) 
-    AND (b.DESCR IS NOT NULL AND b.DESCR <> '')
+    The query is compiled from the products dataset for the current database manager system (DBMS),
+    optionally filtered by year and month, and run by run_dataset().
     """
-
-    final_query = f" GROUP BY b.DESCR, {month_instruction[1]}, {year_instruction[1]}"
-
-    query += final_query
-
-    conn = get_db_connection(db_number)
-    cursor = (
-        conn.cursor(as_dict=True) if os.getenv("DBMS") == "SQLSERVER" else conn.cursor()
-    )
-    try:
-        cursor.execute(query)
-        results = cursor.fetchall()
-    finally:
-        cursor.close()
-        conn.close()
-
-    if os.getenv("DBMS") == "SQLSERVER":
-        return results
-    else:
-        # We convert each tuple to a dictionary
-        formatted_results = [
-            {
-                "name": row[0],
-                "month_concept": row[1],
-                "year_concept": row[2],
-                "total_qty": row[3],
-            }
-            for row in results
-        ]
-        return formatted_results
+    return run_dataset("/products/", "products", db_number, year, month)
 
 
 # Endpoint for gross profit margin
 @app.get("/gross-profit-margin/", response_model=List[GrossProftMarginVector])
-def get_gross_profit_margin(db_number: int = 1):
+def get_gross_profit_margin(
+    db_number: int = 1,
+    year: Optional[int] = Query(
+        None, ge=query_builder.MIN_YEAR, le=query_builder.MAX_YEAR
+    ),
+    month: Optional[int] = None,
+):
     """
     Endpoint to get gross profit margin data from the database.
 
     Returns a list of GrossProftMarginVector objects containing the month and year of the sale,
     and the total gross profit margin.
 
-    The query is constructed using the instructions for the current database manager system (DBMS).
-
-    If the DBMS is SQLSERVER, the results are returned as a list of dictionaries.
-
-    If the DBMS is FIREBIRD, the results are returned as a list of tuples,
-    which are then converted to a list of dictionaries.
-    """
-
-    final_query = ""
-    invoices_table, splits_table = get_table_name(db_number, "FACTF", "PAR_FACTF")
-    query = f"""
-    SELECT {month_instruction[0]} AS month_concept, 
-    {year_instruction[0]} AS year_concept,  
-    SUM(b.CANT * b.PREC*b.TIP_CAM) - SUM(b.CANT*b.COST) AS total_gpm 
-    FROM {invoices_table} AS a INNER JOIN {splits_table} AS b 
-    ON a.CVE_DOC = b.CVE_DOC 
-    WHERE (a.STATUS <> 'C')
+    The query is compiled from the gross-profit-margin dataset for the current database manager system (DBMS),
+    optionally filtered by year and month, and run by run_dataset().
     """
-
-    final_query = f" GROUP BY {month_instruction[0]}, {year_instruction[0]}"
-
-    query += final_query
-
-    conn = get_db_connection(db_number)
-    cursor = (
-        conn.cursor(as_dict=True) if os.getenv("DBMS") == "SQLSERVER" else conn.cursor()
+    return run_dataset(
+        "/gross-profit-margin/", "gross-profit-margin", db_number, year, month
     )
-    try:
-        cursor.execute(query)
-        results = cursor.fetchall()
-    finally:
-        cursor.close()
-        conn.close()
-
-    if os.getenv("DBMS") == "SQLSERVER":
-        return results
-    else:
-        # We convert each tuple to a dictionary
-        formatted_results = [
-            {
-                "month_concept": row[0],
-                "year_concept": row[1],
-                "total_gpm": row[2],
-            }
-            for row in results
-        ]
-        return formatted_results
 
 
 # Endpoint for sales vector by products
 @app.get("/goods/", response_model=List[GoodsVector])
-def get_purchases_of_goods(db_number: int = 1):
+def get_purchases_of_goods(
+    db_number: int = 1,
+    year: Optional[int] = Query(
+        None, ge=query_builder.MIN_YEAR, le=query_builder.MAX_YEAR
+    ),
+    month: Optional[int] = None,
+):
     """
     Endpoint to get purchases data by product from the database.
 
     Returns a list of GoodsVector objects containing the name of the product,
     the month and year of the purchase, and the total quantity shopped.
 
-    The query is constructed using the instructions for the current database manager system (DBMS).
-
-    If the DBMS is SQLSERVER, the results are returned as a list of dictionaries.
-
-    If the DBMS is FIREBIRD, the results are returned as a list of tuples,
-    which are then converted to a list of dictionaries.
+    The query is compiled from the goods dataset for the current database manager system (DBMS),
+    optionally filtered by year and month, and run by run_dataset().
     """
-
-    final_query = ""
-    movs_table, inventory_table = get_table_name(db_number, "MINVE", "INVE")
-    query = f"""
-    SELECT  b.DESCR AS name, 
-    {month_instruction[1]} AS month_concept, 
-    {year_instruction[1]} AS year_concept,  
-    SUM(a.CANT) AS total_qty 
-    FROM {movs_table} AS a INNER JOIN {inventory_table} AS b 
-    ON a.CVE_ART = b.CVE_ART 
-    WHERE (a.TIPO_DOC = 'c' AND a.CVE_CPTO=1) 
-    AND (b.DESCR IS NOT NULL AND b.DESCR <> '')
-    """
-
-    final_query = f" GROUP BY b.DESCR, {month_instruction[1]}, {year_instruction[1]}"
-
-    query += final_query
-
-    conn = get_db_connection(db_number)
-    cursor = (
-        conn.cursor(as_dict=True) if os.getenv("DBMS") == "SQLSERVER" else conn.cursor()
-    )
-    try:
-        cursor.execute(query)
-        results = cursor.fetchall()
-    finally:
-        cursor.close()
-        conn.close()
-
-    if os.getenv("DBMS") == "SQLSERVER":
-        return results
-    else:
-        # We convert each tuple to a dictionary
-        formatted_results = [
-            {
-                "name": row[0],
-                "month_concept": row[1],
-                "year_concept": row[2],
-                "total_qty": row[3],
-            }
-            for row in results
-        ]
-        return formatted_results
+    return run_dataset("/goods/", "goods", db_number, year, month)
 
 
 # Endpoint for sales vs profit
 @app.get("/sales-vs-profit/", response_model=List[SalesVsProfitVector])
-def get_sales_vs_profit(db_number: int = 1):
+def get_sales_vs_profit(
+    db_number: int = 1,
+    year: Optional[int] = Query(
+        None, ge=query_builder.MIN_YEAR, le=query_builder.MAX_YEAR
+    ),
+    month: Optional[int] = None,
+):
     """
     Endpoint to get sales and profit data from the database.
 
     Returns a list of SalesVsProfitVector objects containing the date of the sale, and the profit margin.
 
-    The query is constructed using the instructions for the current database manager system (DBMS).
-
-    If the DBMS is SQLSERVER, the results are returned as a list of dictionaries.
-
-    If the DBMS is FIREBIRD, the results are returned as a list of tuples,
-    which are then converted to a list of dictionaries.
-    """
-
-    final_query = ""
-    invoices_table, splits_table = get_table_name(db_number, "FACTF", "PAR_FACTF")
-    query = f"""
-    SELECT a.FECHA_DOC AS movement_date, 
-    SUM(b.CANT * b.PREC*b.TIP_CAM) AS sales,  
-    SUM(b.CANT * b.PREC*b.TIP_CAM) - SUM(b.CANT*b.COST) AS profit 
-    FROM {invoices_table} AS a INNER JOIN {splits_table} AS b 
-    ON a.CVE_DOC = b.CVE_DOC 
-    WHERE (a.STATUS = 'E')
+    The query is compiled from the sales-vs-profit dataset for the current database manager system (DBMS),
+    optionally filtered by year and month, and run by run_dataset().
     """
-
-    final_query = " GROUP BY a.FECHA_DOC"
-
-    query += final_query
-
-    conn = get_db_connection(db_number)
-    cursor = (
-        conn.cursor(as_dict=True) if os.getenv("DBMS") == "SQLSERVER" else conn.cursor()
-    )
-    try:
-        cursor.execute(query)
-        results = cursor.fetchall()
-    finally:
-        cursor.close()
-        conn.close()
-
-    if os.getenv("DBMS") == "SQLSERVER":
-        return results
-    else:
-        # We convert each tuple to a dictionary
-        formatted_results = [
-            {
-                "movement_date": row[0],
-                "sales": row[1],
-                "profit": row[2],
-            }
-            for row in results
-        ]
-        return formatted_results
+    return run_dataset("/sales-vs-profit/", "sales-vs-profit", db_number, year, month)
 
 
 # Endpoint for sales vector for obtain sales by towns
 @app.get("/sales-by-towns/", response_model=List[SalesVector])
-def get_sales_by_town(db_number: int = 1):
+def get_sales_by_town(
+    db_number: int = 1,
+    year: Optional[int] = Query(
+        None, ge=query_builder.MIN_YEAR, le=query_builder.MAX_YEAR
+    ),
+    month: Optional[int] = None,
+):
     """
     Endpoint to get sales by towns data from the database.
 
     Returns a list of SalesVector objects containing the name of the town,
     the month and year of the sale, and the total sales amount.
 
-    The query is constructed using the instructions for the current database manager system (DBMS).
+    The query is compiled from the sales-by-towns dataset for the current database manager system (DBMS),
+    optionally filtered by year and month, and run by run_dataset().
+    """
+    return run_dataset("/sales-by-towns/", "sales-by-towns", db_number, year, month)
 
-    If the DBMS is SQLSERVER, the results are returned as a list of dictionaries.
 
-    If the DBMS is FIREBIRD, the results are returned as a list of tuples,
-    which are then converted to a list of dictionaries.
+# Endpoint for lines vector for obtain sales and profit by lines
+@app.get("/sales-by-lines/", response_model=List[LinesVector])
+def get_sales_by_line(
+    db_number: int = 1,
+    year: Optional[int] = Query(
+        None, ge=query_builder.MIN_YEAR, le=query_builder.MAX_YEAR
+    ),
+    month: Optional[int] = None,
+):
     """
+    Endpoint to get sales, profit and product quantity by lines data from the database.
 
-    final_query = ""
+    Returns a list of LinesVector objects containing the name of the line,
+    the month and year of the sale, the sales amount,
+    the profit amount and qty for products with this line.
 
-    invoices_table, clients_table = get_table_name(db_number, "FACTF", "CLIE")
-    query = f"""
-    SELECT  upper(b.MUNICIPIO) AS name,
-    {month_instruction[0]} AS month_concept,
-    {year_instruction[0]} AS year_concept,
-    SUM(a.CAN_TOT*a.TIPCAMB) AS total_sales
-    FROM {invoices_table} AS a INNER JOIN {clients_table} AS b
-    ON a.CVE_CLPV = b.CLAVE
-    WHERE (a.STATUS <> 'C')
-    AND (b.MUNICIPIO IS NOT NULL AND b.MUNICIPIO <> '')
+    The query is compiled from the sales-by-lines dataset for the current database manager system (DBMS),
+    optionally filtered by year and month, and run by run_dataset().
     """
+    return run_dataset("/sales-by-lines/", "sales-by-lines", db_number, year, month)
 
-    final_query = (
-        f" GROUP BY upper(b.MUNICIPIO), {month_instruction[0]}, {year_instruction[0]}"
-    )
 
-    query += final_query
+# Endpoint for SalesByProduct vector for obtain sales and profit by products
+@app.get("/sales-by-products/", response_model=List[SalesByProductVector])
+def get_sales_by_products(
+    db_number: int = 1,
+    year: Optional[int] = Query(
+        None, ge=query_builder.MIN_YEAR, le=query_builder.MAX_YEAR
+    ),
+    month: Optional[int] = None,
+):
+    """
+    Endpoint to get sales, profit and product quantity by products data from the database.
 
-    conn = get_db_connection(db_number)
-    cursor = (
-        conn.cursor(as_dict=True) if os.getenv("DBMS") == "SQLSERVER" else conn.cursor()
-    )
-    try:
-        cursor.execute(query)
-        results = cursor.fetchall()
-    finally:
-        cursor.close()
-        conn.close()
+    Returns a list of SalesByProductVector objects containing the name of the product,
+    the month and year of the sale, the sales amount,
+    the profit amount and qty for products with this product.
 
-    if os.getenv("DBMS") == "SQLSERVER":
-        return results
-    else:
-        # We convert each tuple to a dictionary
-        formatted_results = [
-            {
-                "name": row[0],
-                "month_concept": row[1],
-                "year_concept": row[2],
-                "total_sales": row[3],
-            }
-            for row in results
-        ]
-        return formatted_results
+    The query is compiled from the sales-by-products dataset for the current database manager system (DBMS),
+    optionally filtered by year and month, and run by run_dataset().
+    """
+    return run_dataset(
+        "/sales-by-products/", "sales-by-products", db_number, year, month
+    )
 
 
-# Endpoint for lines vector for obtain sales and profit by lines
-@app.get("/sales-by-lines/", response_model=List[LinesVector])
-def get_sales_by_line(db_number: int = 1):
+# Endpoint for SalesByClient vector for obtain sales and profit by clients
+@app.get("/sales-by-clients/", response_model=List[SalesByClientVector])
+def get_sales_by_client(
+    db_number: int = 1,
+    year: Optional[int] = Query(
+        None, ge=query_builder.MIN_YEAR, le=query_builder.MAX_YEAR
+    ),
+    month: Optional[int] = None,
+):
     """
-    Endpoint to get sales, profit and product quantity by lines data from the database.
+    Endpoint to get sales, profit and clients quantity by client data from the database.
 
-    Returns a list of LinesVector objects containing the name of the line,
+    Returns a list of SalesByClientVector objects containing the name of the client,
     the month and year of the sale, the sales amount,
-    the profit amount and qty for products with this line.
+    the profit amount and qty for clients with this client.
 
-    The query is constructed using the instructions for the current database manager system (DBMS).
+    The query is compiled from the sales-by-clients dataset for the current database manager system (DBMS),
+    optionally filtered by year and month, and run by run_dataset().
+    """
+    return run_dataset("/sales-by-clients/", "sales-by-clients", db_number, year, month)
 
-    If the DBMS is SQLSERVER, the results are returned as a list of dictionaries.
 
-    If the DBMS is FIREBIRD, the results are returned as a list of tuples,
-    which are then converted to a list of dictionaries.
+# Endpoint for SalesByTown vector for obtain sales and profit by towns
+@app.get("/sales-and-profits-by-towns/", response_model=List[SalesByClientVector])
+def get_sales_and_profits_by_town(
+    db_number: int = 1,
+    year: Optional[int] = Query(
+        None, ge=query_builder.MIN_YEAR, le=query_builder.MAX_YEAR
+    ),
+    month: Optional[int] = None,
+):
     """
+    Endpoint to get sales, profit and towns quantity by town data from the database.
 
-    final_query = ""
+    Returns a list of SalesByClientVector objects containing the name of the town,
+    the month and year of the sale, the sales amount,
+    the profit amount and qty for towns with this town.
 
-    movs_table, lines_table, inven_table = get_table_name(
-        db_number, "MINVE", "CLIN", "INVE"
-    )
-    query = f"""
-    SELECT b.DESC_LIN as name,
-    {month_instruction[1]} AS month_concept, 
-    {year_instruction[1]} AS year_concept,
-    SUM((a.CANT*a.PRECIO)) as sales, 
-    SUM((a.CANT*a.PRECIO)-(a.CANT*a.COSTO)) as profit, 
-    COUNT(a.CVE_ART) AS qty
-    FROM {movs_table} a, {lines_table} b, {inven_table} c
-    WHERE c.LIN_PROD=b.CVE_LIN
-    AND a.CVE_CPTO=51
-    AND a.TIPO_DOC='F'
-    AND a.CVE_ART=c.CVE_ART
-    """
-
-    final_query = f" GROUP BY b.DESC_LIN, {month_instruction[1]}, {year_instruction[1]}"
-
-    query += final_query
-
-    conn = get_db_connection(db_number)
-    cursor = (
-        conn.cursor(as_dict=True) if os.getenv("DBMS") == "SQLSERVER" else conn.cursor()
+    The query is compiled from the sales-and-profits-by-towns dataset for the current database manager system (DBMS),
+    optionally filtered by year and month, and run by run_dataset().
+    """
+    return run_dataset(
+        "/sales-and-profits-by-towns/",
+        "sales-and-profits-by-towns",
+        db_number,
+        year,
+        month,
     )
-    try:
-        cursor.execute(query)
-        results = cursor.fetchall()
-    finally:
-        cursor.close()
-        conn.close()
-
-    if os.getenv("DBMS") == "SQLSERVER":
-        return results
-    else:
-        # We convert each tuple to a dictionary
-        formatted_results = [
-            {
-                "name": row[0],
-                "month_concept": row[1],
-                "year_concept": row[2],
-                "sales": row[3],
-                "profit": row[4],
-                "qty": row[5],
-            }
-            for row in results
-        ]
-        return formatted_results
 
 
-# Endpoint for SalesByProduct vector for obtain sales and profit by products
-@app.get("/sales-by-products/", response_model=List[SalesByProductVector])
-def get_sales_by_products(db_number: int = 1):
+# Endpoint for SalesByTown vector for obtain sales and profit by towns
+@app.get("/sales-and-profits-by-sellers/", response_model=List[SalesByClientVector])
+def get_sales_and_profits_by_seller(
+    db_number: int = 1,
+    year: Optional[int] = Query(
+        None, ge=query_builder.MIN_YEAR, le=query_builder.MAX_YEAR
+    ),
+    month: Optional[int] = None,
+):
     """
-    Endpoint to get sales, profit and product quantity by products data from the database.
+    Endpoint to get sales, profit and sellers quantity by seller data from the database.
 
-    Returns a list of SalesByProductVector objects containing the name of the product,
+    Returns a list of SalesByClientVector objects containing the name of the seller,
     the month and year of the sale, the sales amount,
-    the profit amount and qty for products with this product.
+    the profit amount and qty for sellers with this seller.
 
-    The query is constructed using the instructions for the current database manager system (DBMS).
+    The query is compiled from the sales-and-profits-by-sellers dataset for the current database manager system (DBMS),
+    optionally filtered by year and month, and run by run_dataset().
+    """
+    return run_dataset(
+        "/sales-and-profits-by-sellers/",
+        "sales-and-profits-by-sellers",
+        db_number,
+        year,
+        month,
+    )
 
-    If the DBMS is SQLSERVER, the results are returned as a list of dictionaries.
 
-    If the DBMS is FIREBIRD, the results are returned as a list of tuples,
-    which are then converted to a list of dictionaries.
+# Endpoint for the incremental sync of a dataset
+@app.get("/sync/{dataset}/", response_model=SyncResponse)
+def sync_dataset(
+    dataset: str,
+    db_number: int = 1,
+    since_version: Optional[str] = None,
+    since_period: Optional[str] = None,
+):
     """
+    Endpoint to get the rows of a dataset that changed since a previous sync.
 
-    final_query = ""
+    Returns a SyncResponse with a new version token, the first period (YYYY-MM) of
+    the rows sent and the rows of that period onwards. The client replaces its rows
+    of that period onwards with them. Without since_version or since_period the
+    whole dataset is sent and since_period is null. Only the datasets served by
+    their own endpoints (PUBLIC_DATASETS) can be synced.
 
-    movs_table, inven_table = get_table_name(db_number, "MINVE", "INVE")
-    query = f"""
-    SELECT b.DESCR,
-    {month_instruction[1]} AS month_concept, 
-    {year_instruction[1]} AS year_concept,
-    SUM((a.CANT*a.PRECIO)) as sales, 
-    SUM((a.CANT*a.PRECIO)-(a.CANT*a.COSTO)) as profit, 
-    COUNT(a.CVE_ART) AS qty
-    FROM {movs_table} a, {inven_table} b
-    WHERE a.CVE_ART=b.CVE_ART
-    AND a.CVE_CPTO=51
-    AND a.TIPO_DOC='F'
-    AND (b.DESCR IS NOT NULL AND b.DESCR <> '')
+    The version token is the time of the sync. Rows are sent again from the month
+    of since_version minus SYNC_LOOKBACK_MONTHS, since_period (YYYY-MM) can be
+    given instead to choose the first period.
     """
+    if dataset not in PUBLIC_DATASETS:
+        raise HTTPException(status_code=404, detail="Conjunto de datos no encontrado")
 
-    final_query = f" GROUP BY b.DESCR, {month_instruction[1]}, {year_instruction[1]}"
+    now = datetime.now()
+    since = None
+    try:
+        if since_period is not None:
+            since = datetime.strptime(since_period, "%Y-%m").date()
+        elif since_version is not None:
+            since = query_builder.month_start(
+                datetime.strptime(since_version, "%Y%m%d%H%M%S").date(),
+                sync_lookback_months,
+            )
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Versión o periodo inválido")
+
+    rows = run_dataset("/sync/{dataset}/", dataset, db_number, since=since)
+    return {
+        "version": now.strftime("%Y%m%d%H%M%S"),
+        "since_period": since.strftime("%Y-%m") if since is not None else None,
+        "rows": rows,
+    }
+
+
+# Endpoint for the CSV and XLSX exports of a dataset
+@app.get("/export/{dataset}/")
+def export_dataset(
+    dataset: str,
+    db_number: int = 1,
+    year: Optional[int] = Query(
+        None, ge=query_builder.MIN_YEAR, le=query_builder.MAX_YEAR
+    ),
+    month: Optional[int] = None,
+    file_type: str = "csv",
+    grouped: bool = False,
+    top: Optional[int] = Query(None, ge=1),
+):
+    """
+    Endpoint to download a dataset as a CSV or XLSX file.
 
-    query += final_query
+    Returns the monthly rows of the dataset sorted by period, or with grouped (or
+    top) its measures totaled by name over the period, sorted from the highest
+    like the Top tables of the dashboard, limited to the first top rows.
 
-    conn = get_db_connection(db_number)
-    cursor = (
-        conn.cursor(as_dict=True) if os.getenv("DBMS") == "SQLSERVER" else conn.cursor()
+    The rows are streamed from the cursor in batches of EXPORT_BATCH_ROWS, the CSV
+    as they are fetched and the XLSX written in constant memory mode to a
+    temporary file, so large exports are never held in memory.
+    """
+    if not exports.is_exportable(dataset):
+        raise HTTPException(status_code=404, detail="Conjunto de datos no encontrado")
+    if file_type not in exports.EXPORT_FORMATS:
+        raise HTTPException(status_code=422, detail="Formato de exportación inválido")
+    if month is not None and (year is None or not 1 <= month <= 12):
+        raise HTTPException(status_code=422, detail="Mes inválido o sin año")
+
+    date_filter, params = None, ()
+    if year is not None:
+        date_filter = "range"
+        params = tuple(
+            query_builder.date_param(bound)
+            for bound in query_builder.period_range(year, month)
+        )
+    query, filter_params, columns = query_builder.compile_dataset(
+        dataset, os.getenv("DBMS"), db_number, date_filter
+    )
+    query, columns = exports.build_export_query(
+        dataset, query, columns, grouped or top is not None
     )
-    try:
-        cursor.execute(query)
-        results = cursor.fetchall()
-    finally:
-        cursor.close()
-        conn.close()
 
-    if os.getenv("DBMS") == "SQLSERVER":
-        return results
+    endpoint = "/export/{dataset}/"
+    with metrics.observe(metrics.CONNECT_SECONDS, endpoint, db_number):
+        entry = acquire_connection(db_number)
+    if entry is None:
+        metrics.ERRORS.labels(endpoint, str(db_number), "connect").inc()
+        raise HTTPException(
+            status_code=503, detail="No se pudo conectar a la base de datos"
+        )
+    try:
+        with metrics.observe(metrics.QUERY_SECONDS, endpoint, db_number):
+            execute_cached(entry, query, filter_params + params)
+    except Exception:
+        metrics.ERRORS.labels(endpoint, str(db_number), "query").inc()
+        release_connection(db_number, entry, False)
+        raise
+
+    period = "historico" if year is None else str(year)
+    if month is not None:
+        period += f"-{month:02d}"
+    filename = f"{dataset}_{db_number:02d}_{period}.{file_type}"
+    if file_type == "csv":
+        content = exports.stream_csv(db_number, entry, columns, top)
     else:
-        # We convert each tuple to a dictionary
-        formatted_results = [
-            {
-                "name": row[0],
-                "month_concept": row[1],
-                "year_concept": row[2],
-                "sales": row[3],
-                "profit": row[4],
-                "qty": row[5],
-            }
-            for row in results
-        ]
-        return formatted_results
+        content = exports.stream_xlsx(db_number, entry, columns, dataset, top)
+    return StreamingResponse(
+        content,
+        media_type=exports.EXPORT_FORMATS[file_type],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 
-# Endpoint for SalesByClient vector for obtain sales and profit by clients
-@app.get("/sales-by-clients/", response_model=List[SalesByClientVector])
-def get_sales_by_client(db_number: int = 1):
+# Endpoint for the KPIs with their period over period deltas
+@app.get("/kpis/", response_model=KpisResponse)
+def get_kpis(
+    year: int = Query(ge=query_builder.MIN_YEAR, le=query_builder.MAX_YEAR),
+    db_number: int = 1,
+    month: Optional[int] = None,
+    names: Optional[str] = None,
+):
     """
-    Endpoint to get sales, profit and clients quantity by client data from the database.
+    Endpoint to get the KPIs of a period with the values of the previous period.
 
-    Returns a list of SalesByClientVector objects containing the name of the client,
-    the month and year of the sale, the sales amount,
-    the profit amount and qty for clients with this client.
+    Returns a KpisResponse object with the current value, the previous value and the
+    percentage delta of every requested KPI (names, e.g. "sales,clients,sales:median",
+    all of them by default). The previous period of a month is the month before,
+    and of a year the year before.
+
+    The KPIs are aggregated from the rollup rows of their datasets, run by
+    run_dataset() with the period pushed down to the database, so only the two
+    periods are read and their results are cached.
+    """
+    try:
+        requested = kpis.parse_kpis(names)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    previous_year, previous_month = kpis.previous_period(year, month)
+    periods = {}
+    results = []
+    for name, dataset, column, aggregation in requested:
+        if dataset not in periods:
+            periods[dataset] = (
+                run_dataset("/kpis/", dataset, db_number, year, month),
+                run_dataset(
+                    "/kpis/", dataset, db_number, previous_year, previous_month
+                ),
+            )
+        current_rows, previous_rows = periods[dataset]
+        current = kpis.aggregate(current_rows, column, aggregation)
+        previous = kpis.aggregate(previous_rows, column, aggregation)
+        results.append(
+            {
+                "name": name,
+                "aggregation": aggregation,
+                "current": current,
+                "previous": previous,
+                "delta": kpis.percent_delta(previous, current),
+            }
+        )
 
-    The query is constructed using the instructions for the current database manager system (DBMS).
+    return {
+        "db_number": db_number,
+        "year": year,
+        "month": month,
+        "previous_year": previous_year,
+        "previous_month": previous_month,
+        "kpis": results,
+    }
 
-    If the DBMS is SQLSERVER, the results are returned as a list of dictionaries.
 
-    If the DBMS is FIREBIRD, the results are returned as a list of tuples,
-    which are then converted to a list of dictionaries.
+def get_month_sketches(
+    db_number: int, entity: str, year: int, month: int = None
+) -> list:
     """
+    Gets the HyperLogLog sketches of the distinct names of an entity per month.
 
-    final_query = ""
+    The sketches of the closed months are read from the sketch store, the missing
+    ones are built from the distinct names per month of the period, and those of
+    closed months are stored for the next requests.
 
-    invoice_table, clients_table, part_table = get_table_name(
-        db_number, "FACTF", "CLIE", "PAR_FACTF"
-    )
-    query = f"""
-    SELECT b.NOMBRE AS name,
-    {month_instruction[0]} AS month_concept, 
-    {year_instruction[0]} AS year_concept,
-    SUM((c.CANT*c.PREC*c.TIP_CAM)) as sales, 
-    SUM((c.CANT*c.PREC*c.TIP_CAM)-(c.CANT*c.COST)) as profit, 
-    COUNT(b.CLAVE) AS qty
-    FROM {invoice_table} a, {clients_table} b, {part_table} c
-    WHERE a.CVE_CLPV=b.CLAVE
-    AND a.CVE_DOC=c.CVE_DOC
-    AND a.STATUS <> 'C'
-    AND (b.NOMBRE IS NOT NULL AND b.NOMBRE <> '')
-    """
-
-    final_query = f" GROUP BY b.NOMBRE, {month_instruction[0]}, {year_instruction[0]}"
-
-    query += final_query
-
-    conn = get_db_connection(db_number)
-    cursor = (
-        conn.cursor(as_dict=True) if os.getenv("DBMS") == "SQLSERVER" else conn.cursor()
+    Args:
+        db_number (int): The database number.
+        entity (str): The entity, e.g. clients.
+        year (int): The year.
+        month (int): The month (optional), all the months of the year if it's None.
+
+    Returns:
+        list: The sketch of every month of the period.
+    """
+    months = [(year, month)] if month is not None else [(year, m) for m in range(1, 13)]
+    stored = sketches.load(db_number, entity, months)
+    if len(stored) == len(months):
+        return list(stored.values())
+
+    rows = run_dataset("/distinct-counts/", f"{entity}-names", db_number, year, month)
+    built = {
+        period: sketches.create_sketch() for period in months if period not in stored
+    }
+    for row in rows:
+        period = (row["year_concept"], row["month_concept"])
+        if period in built:
+            sketches.add(built[period], row["name"])
+
+    current_month = (date.today().year, date.today().month)
+    sketches.save(
+        db_number,
+        entity,
+        {period: sketch for period, sketch in built.items() if period < current_month},
     )
+    return list(stored.values()) + list(built.values())
+
+
+# Endpoint for the distinct counts of clients, sellers and providers
+@app.get("/distinct-counts/", response_model=DistinctCountsResponse)
+def get_distinct_counts(
+    year: int = Query(ge=query_builder.MIN_YEAR, le=query_builder.MAX_YEAR),
+    month: Optional[int] = None,
+    db_number: int = 1,
+    db_numbers: Optional[str] = None,
+    entities: Optional[str] = None,
+    mode: str = "exact",
+):
+    """
+    Endpoint to get the distinct count of clients, sellers and providers of a period.
+
+    Returns a DistinctCountsResponse object with the count of every requested entity
+    (entities, e.g. "clients,sellers", all of them by default) in a company database,
+    or in the union of several (db_numbers, e.g. "1,2,3"), where an entity with
+    the same name in two companies is counted once.
+
+    In exact mode a single database is counted with COUNT(DISTINCT) and a union with
+    the distinct names of every database. In approximate mode the monthly
+    HyperLogLog sketches of the rollup are merged, so closed months are not read again.
+    """
+    if mode not in ("exact", "approximate"):
+        raise HTTPException(status_code=422, detail="Modo inválido")
     try:
-        cursor.execute(query)
-        results = cursor.fetchall()
-    finally:
-        cursor.close()
-        conn.close()
+        numbers = (
+            [int(number) for number in db_numbers.split(",")]
+            if db_numbers
+            else [db_number]
+        )
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Bases de datos inválidas")
+    requested = entities.split(",") if entities else list(DISTINCT_ENTITIES)
+    unknown = [entity for entity in requested if entity not in DISTINCT_ENTITIES]
+    if unknown:
+        raise HTTPException(
+            status_code=422, detail=f"Entidad desconocida: {', '.join(unknown)}"
+        )
+
+    counts = {}
+    for entity in requested:
+        if mode == "approximate":
+            counts[entity] = sketches.estimate(
+                sketches.merge(
+                    [
+                        sketch
+                        for number in numbers
+                        for sketch in get_month_sketches(number, entity, year, month)
+                    ]
+                )
+            )
+        elif len(numbers) == 1:
+            rows = run_dataset(
+                "/distinct-counts/", f"{entity}-distinct", numbers[0], year, month
+            )
+            counts[entity] = int(rows[0]["count"]) if rows else 0
+        else:
+            names = set()
+            for number in numbers:
+                names.update(
+                    row["name"]
+                    for row in run_dataset(
+                        "/distinct-counts/", f"{entity}-names", number, year, month
+                    )
+                )
+            counts[entity] = len(names)
+
+    return {
+        "year": year,
+        "month": month,
+        "db_numbers": numbers,
+        "mode": mode,
+        "counts": counts,
+    }
+
+
+# Endpoint for the forecasts of the monthly KPIs
+@app.get("/forecast/", response_model=ForecastResponse)
+def get_forecast(
+    db_number: int = 1,
+    metric_names: str = Query("sales,gross_profit", alias="metrics"),
+    months: int = forecasting.forecast_horizon,
+    model: str = "auto",
+    confidence: float = 0.95,
+):
+    """
+    Endpoint to get the forecasts of the next months of the monthly KPIs.
 
-    if os.getenv("DBMS") == "SQLSERVER":
-        return results
-    else:
-        # We convert each tuple to a dictionary
-        formatted_results = [
+    Returns a ForecastResponse object with the forecast and its interval of every
+    month after the last closed month, for every requested metric (metrics, names
+    of the KPIs with a monthly series, e.g. "sales,gross_profit"), fitted over the
+    closed months. The KPIs take no aggregation.
+
+    The fitted models are kept with the data version of the database (see
+    forecasting.py), so a request answers from them until the data changes or
+    a month closes. The series are the monthly totals of the rollup rows of the
+    KPI datasets, run by run_dataset() and cached.
+    """
+    if model not in forecasting.MODELS:
+        raise HTTPException(status_code=422, detail="Modelo inválido")
+    if not 1 <= months <= forecasting.forecast_max_horizon:
+        raise HTTPException(status_code=422, detail="Número de meses inválido")
+    if not 0.5 <= confidence < 1:
+        raise HTTPException(status_code=422, detail="Confianza inválida")
+    try:
+        requested = forecasting.parse_metrics(metric_names)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    version = change_detection.get_data_version(db_number)["version"]
+    last_month = forecasting.last_closed_month()
+    results = []
+    for name, dataset, column in requested:
+        try:
+            fitted = forecasting.get_fit(
+                db_number,
+                name,
+                model,
+                version,
+                last_month,
+                lambda: forecasting.monthly_series(
+                    run_dataset("/forecast/", dataset, db_number), column, last_month
+                ),
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        if fitted is None:
+            continue
+
+        points = forecasting.forecast(fitted, months, confidence)
+        results.append(
             {
-                "name": row[0],
-                "month_concept": row[1],
-                "year_concept": row[2],
-                "sales": row[3],
-                "profit": row[4],
-                "qty": row[5],
+                "metric": name,
+                "model": fitted["model"],
+                "fitted_months": len(fitted["values"]),
+                "last_year": last_month[0],
+                "last_month": last_month[1],
+                "points": [
+                    {
+                        "year": year,
+                        "month": month,
+                        "value": value,
+                        "lower": lower,
+                        "upper": upper,
+                    }
+                    for (year, month), (value, lower, upper) in zip(
+                        (
+                            forecasting.add_months(*last_month, step)
+                            for step in range(1, months + 1)
+                        ),
+                        points,
+                    )
+                ],
             }
-            for row in results
-        ]
-        return formatted_results
+        )
+
+    return {
+        "db_number": db_number,
+        "version": version,
+        "confidence": confidence,
+        "forecasts": results,
+    }
+
+
+# Endpoint for the atypical days of the daily sales and profits
+@app.get("/anomalies/", response_model=AnomaliesResponse)
+def get_anomalies(
+    db_number: int = 1,
+    year: Optional[int] = Query(
+        None, ge=query_builder.MIN_YEAR, le=query_builder.MAX_YEAR
+    ),
+    month: Optional[int] = None,
+    kinds: Optional[str] = None,
+    limit: int = Query(100, ge=1),
+):
+    """
+    Endpoint to get the atypical days of the daily sales and profits.
 
+    Returns an AnomaliesResponse object with the atypical days of a company, the
+    most recent first, optionally of a period and of some kinds (kinds, e.g.
+    "sales_spike,negative_margin"), and the last day checked.
 
-# Endpoint for SalesByTown vector for obtain sales and profit by towns
-@app.get("/sales-and-profits-by-towns/", response_model=List[SalesByClientVector])
-def get_sales_and_profits_by_town(db_number: int = 1):
+    The days are flagged by anomalies.py with the rolling median and MAD of the
+    previous days and stored. Without the background detection, the days closed
+    since the last detection are checked before answering.
     """
-    Endpoint to get sales, profit and towns quantity by town data from the database.
+    if month is not None and (year is None or not 1 <= month <= 12):
+        raise HTTPException(status_code=422, detail="Mes inválido o sin año")
+    requested = kinds.split(",") if kinds else None
+    unknown = [kind for kind in requested or [] if kind not in anomalies.ANOMALY_KINDS]
+    if unknown:
+        raise HTTPException(
+            status_code=422, detail=f"Tipo desconocido: {', '.join(unknown)}"
+        )
+
+    if anomalies.anomaly_interval <= 0:
+        anomalies.detect(db_number)
+    start, end = (
+        query_builder.period_range(year, month) if year is not None else (None, None)
+    )
+    return {
+        "db_number": db_number,
+        "last_date": anomalies.get_last_date(db_number),
+        "anomalies": anomalies.get_anomalies(db_number, start, end, requested, limit),
+    }
+
+
+# Endpoint for the ABC classification of the products and clients
+@app.get("/abc/{entity}/", response_model=AbcResponse)
+def get_abc(
+    entity: str,
+    year: int = Query(ge=query_builder.MIN_YEAR, le=query_builder.MAX_YEAR),
+    db_number: int = 1,
+    month: Optional[int] = None,
+    by: str = "sales",
+    limit: int = Query(100, ge=1),
+    offset: int = Query(0, ge=0),
+    points: int = Query(pareto.pareto_points, ge=2),
+):
+    """
+    Endpoint to get the ABC (Pareto) classification of the products or clients.
 
-    Returns a list of SalesByClientVector objects containing the name of the town,
-    the month and year of the sale, the sales amount,
-    the profit amount and qty for towns with this town.
+    Returns an AbcResponse object with the count, totals and shares of the A, B
+    and C classes, the Pareto curve sampled at points ranks, and a page (limit and
+    offset) of the items ranked by sales or profit (by) with their cumulative
+    shares and class. The catalog is the number of products or clients with or
+    without sales.
 
-    The query is constructed using the instructions for the current database manager system (DBMS).
+    The totals by name are computed and sorted by the database over the period,
+    classified by pareto.classify() in one pass and cached like the datasets.
+    """
+    if entity not in pareto.ABC_ENTITIES:
+        raise HTTPException(status_code=404, detail="Entidad no encontrada")
+    if by not in pareto.ABC_MEASURES:
+        raise HTTPException(status_code=422, detail="Medida inválida")
+    if month is not None and not 1 <= month <= 12:
+        raise HTTPException(status_code=422, detail="Mes inválido")
+
+    endpoint = "/abc/{entity}/"
+    dataset, catalog = pareto.ABC_ENTITIES[entity]
+    start, end = query_builder.period_range(year, month)
+    key = (dataset, db_number, f"abc-{by}", start, end)
+    analysis = cache.get(key)
+    if analysis is None:
+        query, params, _ = query_builder.compile_dataset(
+            dataset, os.getenv("DBMS"), db_number, "range"
+        )
+        params += (query_builder.date_param(start), query_builder.date_param(end))
+        rows = fetch_rows(
+            endpoint,
+            db_number,
+            pareto.build_query(query, by),
+            ["name", "sales", "profit"],
+            params,
+        )
+        analysis = pareto.classify(rows, by)
+        cache.put(key, analysis, start, end)
+
+    catalog_rows = run_dataset(endpoint, catalog, db_number)
+    items = analysis["items"]
+    return {
+        "db_number": db_number,
+        "entity": entity,
+        "year": year,
+        "month": month,
+        "by": by,
+        "ranked": len(items),
+        "catalog": catalog_rows[0]["count"] if catalog_rows else 0,
+        "total_sales": analysis["total_sales"],
+        "total_profit": analysis["total_profit"],
+        "classes": analysis["classes"],
+        "curve": pareto.sample_curve(items, points),
+        "items": items[offset : offset + limit],
+    }
+
+
+def fetch_page(
+    endpoint: str,
+    db_number: int,
+    query: str,
+    columns: tuple,
+    params: tuple,
+    page_size: int,
+    key: str,
+) -> tuple:
+    """
+    Runs the query of a drill-down page and gets the cursor of the next page.
 
-    If the DBMS is SQLSERVER, the results are returned as a list of dictionaries.
+    Args:
+        endpoint (str): The endpoint path, used as the metrics label.
+        db_number (int): The database number to run the query on.
+        query (str): The query of the page, with one row more than the page.
+        columns (tuple): The names of the columns of the result rows.
+        params (tuple): The parameters bound to the query.
+        page_size (int): The rows of the page.
+        key (str): The column of the keyset.
 
-    If the DBMS is FIREBIRD, the results are returned as a list of tuples,
-    which are then converted to a list of dictionaries.
+    Returns:
+        tuple: The rows of the page and the cursor of the next page, or None.
+    """
+    rows = fetch_rows(endpoint, db_number, query, list(columns), params)
+    return drill_down.paginate(rows, page_size, key)
+
+
+# Endpoint for the drill-down from a line to the sales of its products
+@app.get("/drill-down/line-products/", response_model=DrillDownProducts)
+def get_line_products(
+    line: str,
+    year: int = Query(ge=query_builder.MIN_YEAR, le=query_builder.MAX_YEAR),
+    db_number: int = 1,
+    month: Optional[int] = None,
+    after: Optional[str] = None,
+):
     """
+    Endpoint to get a page of the sales, profit and quantity by product of a line.
 
-    final_query = ""
+    Returns a DrillDownProducts object with up to DRILL_DOWN_PAGE_SIZE products of
+    the line (by its name, as in /sales-by-lines/) sorted by their key, and the
+    key to pass as after to get the next page (next), null on the last page.
 
-    invoice_table, clients_table, part_table = get_table_name(
-        db_number, "FACTF", "CLIE", "PAR_FACTF"
+    The pages use keyset pagination (see drill_down.py), so a page starts at the
+    cursor instead of skipping the products of the previous pages.
+    """
+    if month is not None and not 1 <= month <= 12:
+        raise HTTPException(status_code=422, detail="Mes inválido")
+
+    page_size = drill_down.drill_down_page_size
+    query = drill_down.build_products_query(
+        os.getenv("DBMS"), db_number, page_size, after is not None
     )
-    query = f"""
-    SELECT upper(b.MUNICIPIO) AS name,
-    {month_instruction[0]} AS month_concept, 
-    {year_instruction[0]} AS year_concept,
-    SUM((c.CANT*c.PREC*c.TIP_CAM)) as sales, 
-    SUM((c.CANT*c.PREC*c.TIP_CAM)-(c.CANT*c.COST)) as profit, 
-    COUNT(b.CLAVE) AS qty
-    FROM {invoice_table} a, {clients_table} b, {part_table} c
-    WHERE a.CVE_CLPV=b.CLAVE
-    AND a.CVE_DOC=c.CVE_DOC
-    AND a.STATUS <> 'C'
-    AND (b.NOMBRE IS NOT NULL AND b.NOMBRE <> '')
-    AND (b.MUNICIPIO IS NOT NULL AND b.MUNICIPIO <> '')
-    """
-
-    final_query = (
-        f" GROUP BY upper(b.MUNICIPIO), {month_instruction[0]}, {year_instruction[0]}"
+    start, end = query_builder.period_range(year, month)
+    params = (line, query_builder.date_param(start), query_builder.date_param(end))
+    if after is not None:
+        params += (after,)
+    rows, cursor = fetch_page(
+        "/drill-down/line-products/",
+        db_number,
+        query,
+        drill_down.PRODUCT_COLUMNS,
+        params,
+        page_size,
+        "product",
     )
+    return {"line": line, "products": rows, "next": cursor}
+
+
+# Endpoint for the drill-down from a product to its invoices
+@app.get("/drill-down/product-invoices/", response_model=DrillDownInvoices)
+def get_product_invoices(
+    product: str,
+    year: int = Query(ge=query_builder.MIN_YEAR, le=query_builder.MAX_YEAR),
+    db_number: int = 1,
+    month: Optional[int] = None,
+    after: Optional[int] = None,
+):
+    """
+    Endpoint to get a page of the sales movements of a product with their invoice.
 
-    query += final_query
+    Returns a DrillDownInvoices object with up to DRILL_DOWN_PAGE_SIZE sales
+    movements of the product (by its key, see /drill-down/line-products/) sorted
+    by their movement number, with the invoice, date, client, quantity, price,
+    sales and profit, and the movement number to pass as after to get the next
+    page (next), null on the last page.
 
-    conn = get_db_connection(db_number)
-    cursor = (
-        conn.cursor(as_dict=True) if os.getenv("DBMS") == "SQLSERVER" else conn.cursor()
-    )
-    try:
-        cursor.execute(query)
-        results = cursor.fetchall()
-    finally:
-        cursor.close()
-        conn.close()
+    The pages use keyset pagination (see drill_down.py), so a page starts at the
+    cursor instead of skipping the movements of the previous pages.
+    """
+    if month is not None and not 1 <= month <= 12:
+        raise HTTPException(status_code=422, detail="Mes inválido")
 
-    if os.getenv("DBMS") == "SQLSERVER":
-        return results
-    else:
-        # We convert each tuple to a dictionary
-        formatted_results = [
-            {
-                "name": row[0],
-                "month_concept": row[1],
-                "year_concept": row[2],
-                "sales": row[3],
-                "profit": row[4],
-                "qty": row[5],
-            }
-            for row in results
-        ]
-        return formatted_results
+    page_size = drill_down.drill_down_page_size
+    query = drill_down.build_invoices_query(
+        os.getenv("DBMS"), db_number, page_size, after is not None
+    )
+    start, end = query_builder.period_range(year, month)
+    params = (product, query_builder.date_param(start), query_builder.date_param(end))
+    if after is not None:
+        params += (after,)
+    rows, cursor = fetch_page(
+        "/drill-down/product-invoices/",
+        db_number,
+        query,
+        drill_down.INVOICE_COLUMNS,
+        params,
+        page_size,
+        "movement",
+    )
+    return {"product": product, "invoices": rows, "next": cursor}
 
 
-# Endpoint for SalesByTown vector for obtain sales and profit by towns
-@app.get("/sales-and-profits-by-sellers/", response_model=List[SalesByClientVector])
-def get_sales_and_profits_by_seller(db_number: int = 1):
+# Endpoint for the monthly cohort retention of the clients
+@app.get("/cohorts/", response_model=CohortsResponse)
+def get_cohorts(
+    db_number: int = 1,
+    year: Optional[int] = Query(
+        None, ge=query_builder.MIN_YEAR, le=query_builder.MAX_YEAR
+    ),
+):
     """
-    Endpoint to get sales, profit and sellers quantity by seller data from the database.
+    Endpoint to get the monthly cohort retention of the clients.
 
-    Returns a list of SalesByClientVector objects containing the name of the seller,
-    the month and year of the sale, the sales amount,
-    the profit amount and qty for sellers with this seller.
+    Returns a CohortsResponse object with the cohorts of clients by the month of
+    their first purchase (optionally only the cohorts of a year), each with its
+    number of clients and the clients that purchased, and their share of the
+    cohort, every month from the first purchase to the last closed month.
+
+    The counts are kept in memory up to the last closed month (see cohorts.py),
+    so a request only reads the months closed since the previous one, and the
+    retention matrix is kept with the data version of the database.
+    """
+    version = change_detection.get_data_version(db_number)["version"]
+    last_month = forecasting.last_closed_month()
+    matrix = cohorts.get_cohorts(
+        db_number,
+        version,
+        last_month,
+        lambda since: run_dataset(
+            "/cohorts/", cohorts.COHORT_DATASET, db_number, since=since
+        ),
+    )
+    if year is not None:
+        matrix = [cohort for cohort in matrix if cohort["year"] == year]
+    return {
+        "db_number": db_number,
+        "version": version,
+        "last_year": last_month[0],
+        "last_month": last_month[1],
+        "cohorts": matrix,
+    }
+
+
+# Endpoint for the inventory turnover, days of stock and slow movers
+@app.get("/inventory/{level}/", response_model=InventoryResponse)
+def get_inventory(
+    level: str,
+    year: int = Query(ge=query_builder.MIN_YEAR, le=query_builder.MAX_YEAR),
+    db_number: int = 1,
+    month: Optional[int] = None,
+    slow: bool = False,
+    limit: int = Query(100, ge=1),
+    offset: int = Query(0, ge=0),
+):
+    """
+    Endpoint to get the inventory turnover and days of stock of the products or
+    lines of a period.
+
+    Returns an InventoryResponse object with the number of products or lines, how
+    many are slow movers, the value of the stock at the end of the period, and a
+    page (limit and offset) of the products or lines, only the slow movers if
+    slow is true, sorted with the slow movers first. Every item has its stock at
+    the start and end of the period and its exits (valued at the average cost
+    for the lines), turnover, days of stock and slow mover flag.
+
+    The movements of every product by month from the start of the period and the
+    current stock are read in one query each and combined by
+    inventory.analyze(), the analysis of both levels is cached until the
+    movements change.
+    """
+    if level not in inventory.INVENTORY_LEVELS:
+        raise HTTPException(status_code=404, detail="Nivel no encontrado")
+    if month is not None and not 1 <= month <= 12:
+        raise HTTPException(status_code=422, detail="Mes inválido")
+
+    endpoint = "/inventory/{level}/"
+    dbms = os.getenv("DBMS")
+    start, end = query_builder.period_range(year, month)
+    # The stock of a future period can't be rolled back from the current stock
+    if start > date.today():
+        raise HTTPException(status_code=422, detail="Periodo futuro")
+    key = ("inventory-movements", db_number, "inventory", start, end)
+    analysis = cache.get(key)
+    if analysis is None:
+        query, params, columns = query_builder.compile_dataset(
+            "inventory-movements", dbms, db_number, "since"
+        )
+        movement_rows = fetch_rows(
+            endpoint,
+            db_number,
+            query,
+            list(columns),
+            params + (query_builder.date_param(start),),
+        )
+        query, params, columns = query_builder.compile_dataset(
+            "inventory-stock", dbms, db_number
+        )
+        stock_rows = fetch_rows(endpoint, db_number, query, list(columns), params)
+        analysis = inventory.analyze(
+            stock_rows, movement_rows, end, inventory.period_days(start, end)
+        )
+        # The stock at the end of the period is rolled back from the current
+        # stock, so any later movement changes it
+        cache.put(key, analysis, start, None)
+
+    items = analysis[level]
+    slow_items = [item for item in items if item["slow"]]
+    selected = slow_items if slow else items
+    return {
+        "db_number": db_number,
+        "level": level,
+        "year": year,
+        "month": month,
+        "days": analysis["days"],
+        "slow_mover_days": inventory.slow_mover_days,
+        "count": len(items),
+        "slow_count": len(slow_items),
+        "stock_value": analysis["stock_value"],
+        "items": selected[offset : offset + limit],
+    }
+
+
+# Endpoint for the data version of a company database
+@app.get("/data-version/", response_model=DataVersion)
+def get_data_version(db_number: int = 1):
+    """
+    Endpoint to get the current data version of a company database.
+
+    Returns a DataVersion object with the version number, a hash of the
+    fingerprints of the source tables (FACTF, COMPC and MINVE) that changes every
+    time the change detection finds changes, the time of the last check and the
+    fingerprint of every source table. Every worker process reports the same
+    version once it checked the same data, so clients can keep their caches until
+    the version changes.
+    """
+    return change_detection.get_data_version(db_number)
 
-    The query is constructed using the instructions for the current database manager system (DBMS).
 
-    If the DBMS is SQLSERVER, the results are returned as a list of dictionaries.
+# Endpoint for the Prometheus metrics
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """
+    Endpoint to get the metrics of the API in the Prometheus text format.
 
-    If the DBMS is FIREBIRD, the results are returned as a list of tuples,
-    which are then converted to a list of dictionaries.
+    Reports histograms of connect, query execute, fetch, row-to-dict conversion and
+    serialization times, row counts and payload bytes labeled by endpoint and db_number,
+    plus the requests in flight and the error counters.
     """
+    return metrics.metrics_response()
 
-    final_query = ""
 
-    invoice_table, sellers_table, part_table = get_table_name(
-        db_number, "FACTF", "VEND", "PAR_FACTF"
-    )
-    query = f"""
-    SELECT upper(b.NOMBRE) AS name,
-    {month_instruction[0]} AS month_concept, 
-    {year_instruction[0]} AS year_concept,
-    SUM((c.CANT*c.PREC*c.TIP_CAM)) as sales, 
-    SUM((c.CANT*c.PREC*c.TIP_CAM)-(c.CANT*c.COST)) as profit, 
-    COUNT(b.CVE_VEND) AS qty
-    FROM {invoice_table} a, {sellers_table} b, {part_table} c
-    WHERE a.CVE_VEND=b.CVE_VEND
-    AND a.CVE_DOC=c.CVE_DOC
-    AND a.STATUS <> 'C'
-    AND (b.NOMBRE IS NOT NULL AND b.NOMBRE <> '')
-    """
-
-    final_query = (
-        f" GROUP BY upper(b.NOMBRE), {month_instruction[0]}, {year_instruction[0]}"
-    )
+# Endpoint for the slow query log
+@app.get("/debug/slow-queries", response_model=List[SlowQuery])
+def get_slow_queries(
+    limit: int = Query(20, ge=1, le=slow_queries.slow_query_max_entries),
+    db_number: Optional[int] = None,
+):
+    """
+    Endpoint to get the slowest queries recorded in the slow query log.
 
-    query += final_query
+    Returns a list of SlowQuery objects with the final SQL text, parameters,
+    database number, DBMS, duration, row count and, if captured, the execution plan,
+    from the slowest query, at most SLOW_QUERY_MAX_ENTRIES, the size of the log.
+    """
+    return slow_queries.get_worst(limit, db_number)
 
-    conn = get_db_connection(db_number)
-    cursor = (
-        conn.cursor(as_dict=True) if os.getenv("DBMS") == "SQLSERVER" else conn.cursor()
-    )
-    try:
-        cursor.execute(query)
-        results = cursor.fetchall()
-    finally:
-        cursor.close()
-        conn.close()
 
-    if os.getenv("DBMS") == "SQLSERVER":
-        return results
-    else:
-        # We convert each tuple to a dictionary
-        formatted_results = [
-            {
-                "name": row[0],
-                "month_concept": row[1],
-                "year_concept": row[2],
-                "sales": row[3],
-                "profit": row[4],
-                "qty": row[5],
-            }
-            for row in results
-        ]
-        return formatted_results
+app.middleware("http")(metrics.create_middleware(app.routes))
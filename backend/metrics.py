@@ -0,0 +1,225 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from fastapi import Request, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from starlette.routing import Match
+
+# Directory where every worker process writes its metrics (see serve.py), None
+# with a single process
+multiprocess_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+LABELS = ["endpoint", "db_number"]
+
+# Buckets in seconds, from a cached lookup to a full history scan
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+ROW_BUCKETS = (0, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+BYTE_BUCKETS = (1_024, 10_240, 102_400, 1_048_576, 10_485_760, 104_857_600)
+
+CONNECT_SECONDS = Histogram(
+    "dashboard_db_connect_seconds",
+    "Time to open a database connection",
+    LABELS,
+    buckets=TIME_BUCKETS,
+)
+QUERY_SECONDS = Histogram(
+    "dashboard_db_query_seconds",
+    "Time to execute a query",
+    LABELS,
+    buckets=TIME_BUCKETS,
+)
+FETCH_SECONDS = Histogram(
+    "dashboard_db_fetch_seconds",
+    "Time to fetch the rows of a query",
+    LABELS,
+    buckets=TIME_BUCKETS,
+)
+CONVERT_SECONDS = Histogram(
+    "dashboard_row_conversion_seconds",
+    "Time to convert the rows of a query to dictionaries",
+    LABELS,
+    buckets=TIME_BUCKETS,
+)
+SERIALIZE_SECONDS = Histogram(
+    "dashboard_serialization_seconds",
+    "Time to validate and serialize a response",
+    LABELS,
+    buckets=TIME_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "dashboard_request_seconds",
+    "Total time of a request",
+    LABELS,
+    buckets=TIME_BUCKETS,
+)
+ROWS = Histogram(
+    "dashboard_rows",
+    "Number of rows returned by a query",
+    LABELS,
+    buckets=ROW_BUCKETS,
+)
+PAYLOAD_BYTES = Histogram(
+    "dashboard_payload_bytes",
+    "Size of a response body",
+    LABELS,
+    buckets=BYTE_BUCKETS,
+)
+IN_FLIGHT = Gauge(
+    "dashboard_requests_in_flight",
+    "Requests being processed",
+    ["endpoint"],
+    multiprocess_mode="livesum",
+)
+ERRORS = Counter(
+    "dashboard_errors_total",
+    "Errors by stage (connect, query, request)",
+    LABELS + ["stage"],
+)
+CACHE_REQUESTS = Counter(
+    "dashboard_result_cache_requests_total",
+    "Dataset result cache lookups by result (hit, miss)",
+    LABELS + ["result"],
+)
+
+# Timings of the current request, shared between the middleware and the endpoint
+request_timings: ContextVar = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def observe(histogram: Histogram, endpoint: str, db_number: int):
+    """
+    Measures the time of a block of code and records it in a histogram.
+
+    Args:
+        histogram (Histogram): The histogram to record the time in.
+        endpoint (str): The endpoint label.
+        db_number (int): The database number label.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(endpoint, str(db_number)).observe(time.perf_counter() - start)
+
+
+def mark_handler_end():
+    """
+    Marks the end of the endpoint function, the rest of the request is serialization.
+    """
+    timings = request_timings.get()
+    if timings is not None:
+        timings["handler_end"] = time.perf_counter()
+
+
+def get_endpoint_label(request: Request, routes: list) -> str:
+    """
+    Gets the endpoint label of a request, the path template of its route, e.g.
+    /sync/{dataset}/, so every dataset shares one label. Unknown paths share one
+    label too.
+
+    Args:
+        request (Request): The request.
+        routes (list): The routes of the API.
+
+    Returns:
+        str: The endpoint label.
+    """
+    for route in routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "other"
+
+
+def get_db_number_label(request: Request) -> str:
+    """
+    Gets the database number label of a request.
+
+    Args:
+        request (Request): The request.
+
+    Returns:
+        str: The database number, "1" by default like the endpoints.
+    """
+    db_number = request.query_params.get("db_number", "1")
+    return db_number if db_number.isdigit() else "invalid"
+
+
+def create_middleware(routes: list):
+    """
+    Creates the HTTP middleware that records the request metrics.
+
+    Args:
+        routes (list): The routes of the API.
+
+    Returns:
+        Callable: The middleware function.
+    """
+
+    async def metrics_middleware(request: Request, call_next):
+        endpoint = get_endpoint_label(request, routes)
+        db_number = get_db_number_label(request)
+        timings = {}
+        request_timings.set(timings)
+
+        IN_FLIGHT.labels(endpoint).inc()
+        start = time.perf_counter()
+        try:
+            response = await call_next(request)
+        except Exception:
+            ERRORS.labels(endpoint, db_number, "request").inc()
+            raise
+        finally:
+            IN_FLIGHT.labels(endpoint).dec()
+
+        end = time.perf_counter()
+        REQUEST_SECONDS.labels(endpoint, db_number).observe(end - start)
+        if "handler_end" in timings:
+            SERIALIZE_SECONDS.labels(endpoint, db_number).observe(
+                end - timings["handler_end"]
+            )
+        if "content-length" in response.headers:
+            PAYLOAD_BYTES.labels(endpoint, db_number).observe(
+                int(response.headers["content-length"])
+            )
+        if response.status_code >= 500:
+            ERRORS.labels(endpoint, db_number, "request").inc()
+        return response
+
+    return metrics_middleware
+
+
+def metrics_response() -> Response:
+    """
+    Renders the metrics in the Prometheus text format.
+
+    With several worker processes, the metrics of all of them are aggregated.
+
+    Returns:
+        Response: The response with the metrics.
+    """
+    registry = REGISTRY
+    if multiprocess_dir:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+def mark_process_dead():
+    """
+    Removes the live metrics (the requests in flight) of the current worker
+    process when it stops.
+    """
+    if multiprocess_dir:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,165 @@
+"""
+ABC (Pareto) classification of the products and clients by sales or profit.
+
+The database totals every product or client over the period and sorts them
+from the highest (see build_query), and a single pass over the sorted rows
+accumulates the shares and assigns the classes: A up to the first threshold of
+the cumulative share, B up to the second and C the rest. The item that crosses
+a threshold belongs to the class it completes.
+
+A response has the summary of every class, the Pareto curve sampled at a fixed
+number of points and one page of the ranked items, so it stays small for tens
+of thousands of products.
+"""
+
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Cumulative shares (%) that close the A and B classes
+abc_thresholds = tuple(
+    float(value) for value in os.getenv("ABC_THRESHOLDS", "80,95").split(",")
+)
+# Points of the Pareto curve of a response
+pareto_points = int(os.getenv("PARETO_POINTS", "200"))
+
+# Entities of the analysis: the dataset of their sales and of their catalog
+ABC_ENTITIES = {
+    "products": ("sales-by-products", "products-catalog"),
+    "clients": ("sales-by-clients", "clients-catalog"),
+}
+ABC_MEASURES = ["sales", "profit"]
+ABC_CLASSES = ["A", "B", "C"]
+
+
+def build_query(query: str, by: str) -> str:
+    """
+    Wraps the compiled query of a dataset to total its sales and profit by name
+    over the whole period, sorted from the highest.
+
+    Args:
+        query (str): The compiled query, with name, sales and profit columns.
+        by (str): The measure of the ranking, one of ABC_MEASURES.
+
+    Returns:
+        str: The query, with name, sales and profit columns.
+    """
+    return (
+        f"SELECT name, SUM(sales) AS sales, SUM(profit) AS profit FROM ({query}) t "
+        f"GROUP BY name ORDER BY SUM({by}) DESC, name"
+    )
+
+
+def share(value: float, total: float) -> float:
+    """
+    Calculates the percentage of a value over a total.
+
+    Args:
+        value (float): The value.
+        total (float): The total.
+
+    Returns:
+        float: The percentage, 0 if the total is 0.
+    """
+    return value / total * 100 if total else 0.0
+
+
+def classify(rows: list, by: str, thresholds: tuple = None) -> dict:
+    """
+    Ranks and classifies the totals of the products or clients.
+
+    The profit of an item can be negative, so the cumulative profit share is
+    not monotonic and can go over 100%.
+
+    Args:
+        rows (list): The totals by name sorted by the measure from the highest,
+            as dictionaries with name, sales and profit.
+        by (str): The measure of the ranking, one of ABC_MEASURES.
+        thresholds (tuple): The cumulative shares that close the A and B classes
+            (optional), ABC_THRESHOLDS by default.
+
+    Returns:
+        dict: The ranked items with their cumulative shares and class, the totals
+        and the summary of every class.
+    """
+    thresholds = thresholds or abc_thresholds
+    total_sales = sum(float(row["sales"] or 0) for row in rows)
+    total_profit = sum(float(row["profit"] or 0) for row in rows)
+    total = total_sales if by == "sales" else total_profit
+
+    classes = {
+        name: {"name": name, "count": 0, "sales": 0.0, "profit": 0.0}
+        for name in ABC_CLASSES
+    }
+    items = []
+    cumulative_sales = cumulative_profit = 0.0
+    for rank, row in enumerate(rows, start=1):
+        sales, profit = float(row["sales"] or 0), float(row["profit"] or 0)
+        # The share before the item, so the item that crosses a threshold
+        # completes its class
+        before = share(cumulative_sales if by == "sales" else cumulative_profit, total)
+        if before < thresholds[0]:
+            abc_class = "A"
+        elif before < thresholds[1]:
+            abc_class = "B"
+        else:
+            abc_class = "C"
+        cumulative_sales += sales
+        cumulative_profit += profit
+        items.append(
+            {
+                "rank": rank,
+                "name": row["name"],
+                "sales": sales,
+                "profit": profit,
+                "sales_share": share(cumulative_sales, total_sales),
+                "profit_share": share(cumulative_profit, total_profit),
+                "abc_class": abc_class,
+            }
+        )
+        summary = classes[abc_class]
+        summary["count"] += 1
+        summary["sales"] += sales
+        summary["profit"] += profit
+
+    for summary in classes.values():
+        summary["sales_share"] = share(summary["sales"], total_sales)
+        summary["profit_share"] = share(summary["profit"], total_profit)
+    return {
+        "items": items,
+        "total_sales": total_sales,
+        "total_profit": total_profit,
+        "classes": list(classes.values()),
+    }
+
+
+def sample_curve(items: list, points: int) -> list:
+    """
+    Samples the Pareto curve of the ranked items at evenly spaced ranks.
+
+    Args:
+        items (list): The ranked items with their cumulative shares.
+        points (int): The maximum number of points, the first and last items are
+            always included.
+
+    Returns:
+        list: The share of the ranked items and their cumulative sales and
+        profit shares at every point.
+    """
+    if not items:
+        return []
+    count = len(items)
+    if count <= points:
+        indexes = range(count)
+    else:
+        indexes = sorted({round(i * (count - 1) / (points - 1)) for i in range(points)})
+    return [
+        {
+            "rank_share": share(items[index]["rank"], count),
+            "sales_share": items[index]["sales_share"],
+            "profit_share": items[index]["profit_share"],
+        }
+        for index in indexes
+    ]
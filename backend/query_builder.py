@@ -0,0 +1,175 @@
+import os
+from datetime import date
+from functools import lru_cache
+
+from datasets import DATASETS
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# SQL differences between the database manager systems: the year and month of a
+# date column, the parameter placeholder of the driver, and the row limit of a
+# query, after SELECT (first) or at the end of the query (limit)
+DIALECTS = {
+    "FIREBIRD": {
+        "year": "EXTRACT(YEAR FROM {})",
+        "month": "EXTRACT(MONTH FROM {})",
+        "placeholder": "?",
+        "first": "FIRST {} ",
+        "limit": "",
+    },
+    "SQLSERVER": {
+        "year": "YEAR({})",
+        "month": "MONTH({})",
+        "placeholder": "%s",
+        "first": "TOP {} ",
+        "limit": "",
+    },
+    "SQLITE": {
+        "year": "CAST(strftime('%Y', {}) AS INTEGER)",
+        "month": "CAST(strftime('%m', {}) AS INTEGER)",
+        "placeholder": "?",
+        "first": "",
+        "limit": " LIMIT {}",
+    },
+}
+
+# Years whose period and previous period are valid dates, the period of a year
+# ends on January 1st of the next one
+MIN_YEAR = 2
+MAX_YEAR = 9998
+
+
+def table_name(prefix: str, db_number: int) -> str:
+    """
+    Builds the table name of a company, Aspel SAE adds the two digit company number.
+
+    Args:
+        prefix (str): The table prefix, e.g. FACTF.
+        db_number (int): The database number.
+
+    Returns:
+        str: The table name, e.g. FACTF01.
+    """
+    return f"{prefix}{db_number:02d}"
+
+
+@lru_cache(maxsize=None)
+def compile_dataset(
+    name: str, dbms: str, db_number: int, date_filter: str = None
+) -> tuple:
+    """
+    Compiles a dataset to the SQL of a database manager system.
+
+    The compiled statements are cached by dataset, DBMS, database number and
+    filter shape, so the SQL text of a request is built only once.
+
+    Args:
+        name (str): The dataset name, a key of datasets.DATASETS.
+        dbms (str): The database manager system (FIREBIRD, SQLSERVER or SQLITE).
+        db_number (int): The database number.
+        date_filter (str): The filter of the date column (optional): "range"
+            binds its start and end as the last two parameters, and "since"
+            binds its start as the last parameter.
+
+    Returns:
+        tuple: The query, the parameters of the filters and the result columns.
+
+    Raises:
+        ValueError: If a date filter is given and the dataset has no date column.
+    """
+    dataset = DATASETS[name]
+    dialect = DIALECTS[dbms]
+    placeholder = dialect["placeholder"]
+
+    prefix, alias = dataset["table"]
+    from_clause = f"{table_name(prefix, db_number)} {alias}"
+    for prefix, alias, condition, *join_type in dataset.get("joins", []):
+        from_clause += (
+            f" {join_type[0] if join_type else 'INNER'} JOIN "
+            f"{table_name(prefix, db_number)} {alias} ON {condition}"
+        )
+
+    groups = list(dataset.get("dimensions", []))
+    period = dataset.get("period")
+    if period is not None:
+        groups += [
+            ("month_concept", dialect["month"].format(period)),
+            ("year_concept", dialect["year"].format(period)),
+        ]
+    selects = groups + dataset.get("measures", [])
+
+    conditions, params = [], []
+    for expression, operator, value in dataset.get("filters", []):
+        if value is None:
+            conditions.append(f"{expression} {operator}")
+        else:
+            conditions.append(f"{expression} {operator} {placeholder}")
+            params.append(value)
+    if date_filter is not None:
+        date_column = dataset.get("date_column", period)
+        if date_column is None:
+            raise ValueError(f"El conjunto de datos {name} no tiene columna de fecha")
+        conditions.append(f"{date_column} >= {placeholder}")
+        if date_filter == "range":
+            conditions.append(f"{date_column} < {placeholder}")
+
+    query = "SELECT " + ", ".join(
+        f"{expression} AS {column}" for column, expression in selects
+    )
+    query += f" FROM {from_clause}"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    if groups:
+        query += " GROUP BY " + ", ".join(expression for _, expression in groups)
+
+    return query, tuple(params), tuple(column for column, _ in selects)
+
+
+def period_range(year: int, month: int = None) -> tuple:
+    """
+    Converts a year, or a month of a year, to a date range.
+
+    A range on the date column can use its index, unlike filtering by the
+    year and month of the date.
+
+    Args:
+        year (int): The year.
+        month (int): The month (optional), the whole year if it's None.
+
+    Returns:
+        tuple: The first date of the period and the first date after it.
+    """
+    if month is None:
+        return date(year, 1, 1), date(year + 1, 1, 1)
+    if month == 12:
+        return date(year, 12, 1), date(year + 1, 1, 1)
+    return date(year, month, 1), date(year, month + 1, 1)
+
+
+def month_start(value: date, months_back: int = 0) -> date:
+    """
+    Gets the first day of the month of a date, optionally some months before.
+
+    Args:
+        value (date): The date.
+        months_back (int): The number of months to go back.
+
+    Returns:
+        date: The first day of the month.
+    """
+    months = value.year * 12 + value.month - 1 - months_back
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def date_param(value: date):
+    """
+    Converts a date to a parameter of the current DBMS driver.
+
+    Args:
+        value (date): The date.
+
+    Returns:
+        The date, or its ISO text for SQLite, which stores dates as text.
+    """
+    return value.isoformat() if os.getenv("DBMS") == "SQLITE" else value
@@ -1,4 +1,5 @@
 from datetime import date
+from typing import Any, Dict, List, Optional, Union
 
 from pydantic import BaseModel
 
@@ -84,3 +85,222 @@ class PurchasesByProviderVector(BaseModel):
     purchases: float
     spent: float
     qty: float
+
+
+class SlowQuery(BaseModel):
+    id: int
+    recorded_at: str
+    endpoint: str
+    db_number: int
+    dbms: Optional[str] = None
+    sql: str
+    params: Optional[str] = None
+    duration_ms: float
+    row_count: Optional[int] = None
+    plan: Optional[str] = None
+
+
+class SyncResponse(BaseModel):
+    version: str
+    since_period: Optional[str] = None
+    rows: List[Dict[str, Any]]
+
+
+class TableFingerprint(BaseModel):
+    count: int
+    max_date: Optional[str] = None
+    max_document: Optional[str] = None
+    cancelled: int
+    changed_at: str
+
+
+class DataVersion(BaseModel):
+    db_number: int
+    version: int
+    checked_at: Optional[str] = None
+    tables: Dict[str, TableFingerprint]
+
+
+class Kpi(BaseModel):
+    name: str
+    aggregation: str
+    current: Optional[float] = None
+    previous: Optional[float] = None
+    delta: Optional[float] = None
+
+
+class KpisResponse(BaseModel):
+    db_number: int
+    year: int
+    month: Optional[int] = None
+    previous_year: int
+    previous_month: Optional[int] = None
+    kpis: List[Kpi]
+
+
+class DistinctCountsResponse(BaseModel):
+    year: int
+    month: Optional[int] = None
+    db_numbers: List[int]
+    mode: str
+    # Exact counts are integers, approximate ones the HyperLogLog estimate
+    counts: Dict[str, Union[int, float]]
+
+
+class ForecastPoint(BaseModel):
+    year: int
+    month: int
+    value: float
+    lower: float
+    upper: float
+
+
+class Forecast(BaseModel):
+    metric: str
+    model: str
+    fitted_months: int
+    last_year: int
+    last_month: int
+    points: List[ForecastPoint]
+
+
+class ForecastResponse(BaseModel):
+    db_number: int
+    version: int
+    confidence: float
+    forecasts: List[Forecast]
+
+
+class Anomaly(BaseModel):
+    movement_date: date
+    kind: str
+    label: str
+    value: float
+    expected: Optional[float] = None
+    score: Optional[float] = None
+
+
+class AnomaliesResponse(BaseModel):
+    db_number: int
+    last_date: Optional[date] = None
+    anomalies: List[Anomaly]
+
+
+class AbcClass(BaseModel):
+    name: str
+    count: int
+    sales: float
+    profit: float
+    sales_share: float
+    profit_share: float
+
+
+class ParetoPoint(BaseModel):
+    rank_share: float
+    sales_share: float
+    profit_share: float
+
+
+class AbcItem(BaseModel):
+    rank: int
+    name: str
+    sales: float
+    profit: float
+    sales_share: float
+    profit_share: float
+    abc_class: str
+
+
+class AbcResponse(BaseModel):
+    db_number: int
+    entity: str
+    year: int
+    month: Optional[int] = None
+    by: str
+    ranked: int
+    catalog: int
+    total_sales: float
+    total_profit: float
+    classes: List[AbcClass]
+    curve: List[ParetoPoint]
+    items: List[AbcItem]
+
+
+class DrillDownProduct(BaseModel):
+    product: str
+    name: Optional[str] = None
+    sales: float
+    profit: float
+    qty: int
+
+
+class DrillDownProducts(BaseModel):
+    line: str
+    products: List[DrillDownProduct]
+    next: Optional[str] = None
+
+
+class DrillDownInvoice(BaseModel):
+    movement: int
+    invoice: Optional[str] = None
+    movement_date: date
+    client: Optional[str] = None
+    qty: float
+    price: float
+    sales: float
+    profit: float
+
+
+class DrillDownInvoices(BaseModel):
+    product: str
+    invoices: List[DrillDownInvoice]
+    next: Optional[int] = None
+
+
+class CohortPeriod(BaseModel):
+    offset: int
+    clients: int
+    share: float
+
+
+class Cohort(BaseModel):
+    year: int
+    month: int
+    clients: int
+    retention: List[CohortPeriod]
+
+
+class CohortsResponse(BaseModel):
+    db_number: int
+    version: int
+    last_year: int
+    last_month: int
+    cohorts: List[Cohort]
+
+
+class InventoryItem(BaseModel):
+    product: Optional[str] = None
+    name: Optional[str] = None
+    line: Optional[str] = None
+    products: Optional[int] = None
+    stock_start: float
+    stock_end: float
+    stock_value: float
+    exits: float
+    exits_cost: float
+    turnover: Optional[float] = None
+    days_of_stock: Optional[float] = None
+    slow: bool
+
+
+class InventoryResponse(BaseModel):
+    db_number: int
+    level: str
+    year: int
+    month: Optional[int] = None
+    days: int
+    slow_mover_days: int
+    count: int
+    slow_count: int
+    stock_value: float
+    items: List[InventoryItem]
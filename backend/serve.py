@@ -0,0 +1,86 @@
+"""
+Launcher of the API with one or several uvicorn worker processes.
+
+Every worker has its own interpreter, so the JSON serialization of the
+responses runs in parallel instead of sharing one GIL. The workers share:
+
+- The result cache, in a SQLite WAL file (RESULT_CACHE_FILE, see cache.py).
+- The connection pool size, DB_POOL_SIZE is divided among them (see db.py).
+- The Prometheus metrics, written to PROMETHEUS_MULTIPROC_DIR and aggregated
+  by the /metrics endpoint of any worker (see metrics.py).
+
+Usage:
+    python serve.py
+    python serve.py --workers 4 --port 8000
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+
+import uvicorn
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Address of the API and number of worker processes
+backend_host = os.getenv("BACKEND_HOST", "127.0.0.1")
+backend_port = int(os.getenv("BACKEND_PORT", "8000"))
+backend_workers = int(os.getenv("BACKEND_WORKERS", "1"))
+
+
+def prepare_workers(workers: int):
+    """
+    Sets the environment shared by the worker processes, before they start.
+
+    The shared result cache and the metrics of a previous run are removed: the
+    change detection of the new workers doesn't know what changed meanwhile.
+
+    Args:
+        workers (int): The number of worker processes.
+    """
+    os.environ["BACKEND_WORKERS"] = str(workers)
+    if workers > 1:
+        os.environ.setdefault("RESULT_CACHE_FILE", "result_cache.db")
+
+    cache_file = os.getenv("RESULT_CACHE_FILE")
+    if cache_file:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(cache_file + suffix):
+                os.remove(cache_file + suffix)
+
+    metrics_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir)
+    elif workers > 1:
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(
+            prefix="dashboard_metrics_"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SAE dashboard API launcher")
+    parser.add_argument("--host", default=backend_host)
+    parser.add_argument("--port", type=int, default=backend_port)
+    parser.add_argument("--workers", type=int, default=backend_workers)
+    args = parser.parse_args()
+
+    workers = max(args.workers, 1)
+    prepare_workers(workers)
+    print(
+        f"Iniciando la API en {args.host}:{args.port} con {workers} proceso(s)",
+        flush=True,
+    )
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+    )
+
+
+if __name__ == "__main__":
+    main()
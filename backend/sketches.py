@@ -0,0 +1,213 @@
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# HyperLogLog precision, 2**p registers per sketch with a standard error of
+# 1.04 / sqrt(2**p), 1.6% with the default of 12 (4 KB per sketch)
+sketch_precision = int(os.getenv("SKETCH_PRECISION", "12"))
+# SQLite file of the monthly sketches of the closed periods
+sketch_store = os.getenv("SKETCH_STORE", "sketches.db")
+
+_initialized = False
+_lock = threading.Lock()
+
+
+def create_sketch(precision: int = None) -> bytearray:
+    """
+    Creates an empty HyperLogLog sketch.
+
+    Args:
+        precision (int): The number of index bits (optional), SKETCH_PRECISION by default.
+
+    Returns:
+        bytearray: The registers of the sketch, all zero.
+    """
+    return bytearray(2 ** (precision or sketch_precision))
+
+
+def add(sketch: bytearray, value: str):
+    """
+    Adds a value to a HyperLogLog sketch.
+
+    Args:
+        sketch (bytearray): The registers of the sketch.
+        value (str): The value to add.
+    """
+    precision = int(math.log2(len(sketch)))
+    hashed = int.from_bytes(
+        hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big"
+    )
+    index = hashed >> (64 - precision)
+    rest = hashed & ((1 << (64 - precision)) - 1)
+    # Position of the first 1 bit of the rest of the hash
+    rank = (64 - precision) - rest.bit_length() + 1
+    if rank > sketch[index]:
+        sketch[index] = rank
+
+
+def merge(sketches: list) -> bytearray:
+    """
+    Merges HyperLogLog sketches, the result counts the union of their values.
+
+    Args:
+        sketches (list): The sketches, all with the same precision.
+
+    Returns:
+        bytearray: The merged sketch.
+    """
+    merged = create_sketch()
+    for sketch in sketches:
+        merged = bytearray(map(max, merged, sketch))
+    return merged
+
+
+def estimate(sketch: bytearray) -> float:
+    """
+    Estimates the number of distinct values of a HyperLogLog sketch.
+
+    Args:
+        sketch (bytearray): The registers of the sketch.
+
+    Returns:
+        float: The estimated distinct count, linear counting is used for small counts.
+    """
+    registers = len(sketch)
+    alpha = 0.7213 / (1 + 1.079 / registers)
+    raw = alpha * registers**2 / sum(2.0**-rank for rank in sketch)
+    zeros = sketch.count(0)
+    if raw <= 2.5 * registers and zeros:
+        return registers * math.log(registers / zeros)
+    return raw
+
+
+def get_store_connection() -> sqlite3.Connection:
+    """
+    Opens the sketch store, creating its table on first use.
+
+    Returns:
+        sqlite3.Connection: The connection to the SQLite store.
+    """
+    global _initialized
+
+    connection = sqlite3.connect(sketch_store, timeout=5)
+    if not _initialized:
+        with _lock:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS sketches (
+                    db_number INTEGER NOT NULL,
+                    entity TEXT NOT NULL,
+                    year INTEGER NOT NULL,
+                    month INTEGER NOT NULL,
+                    precision INTEGER NOT NULL,
+                    registers BLOB NOT NULL,
+                    built_at TEXT NOT NULL,
+                    PRIMARY KEY (db_number, entity, year, month, precision)
+                )
+                """)
+            connection.commit()
+            _initialized = True
+    return connection
+
+
+def load(db_number: int, entity: str, months: list) -> dict:
+    """
+    Loads the stored sketches of some months.
+
+    Args:
+        db_number (int): The database number.
+        entity (str): The entity, e.g. clients.
+        months (list): The (year, month) tuples.
+
+    Returns:
+        dict: The sketches found, keyed by (year, month).
+    """
+    connection = get_store_connection()
+    try:
+        rows = connection.execute(
+            "SELECT year, month, registers FROM sketches "
+            "WHERE db_number = ? AND entity = ? AND precision = ?",
+            (db_number, entity, sketch_precision),
+        ).fetchall()
+    finally:
+        connection.close()
+    wanted = set(months)
+    return {
+        (year, month): bytearray(registers)
+        for year, month, registers in rows
+        if (year, month) in wanted
+    }
+
+
+def save(db_number: int, entity: str, sketches: dict):
+    """
+    Stores the sketches of some months.
+
+    Args:
+        db_number (int): The database number.
+        entity (str): The entity, e.g. clients.
+        sketches (dict): The sketches keyed by (year, month).
+    """
+    built_at = datetime.now().isoformat(timespec="seconds")
+    connection = get_store_connection()
+    try:
+        connection.executemany(
+            "INSERT OR REPLACE INTO sketches VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    db_number,
+                    entity,
+                    year,
+                    month,
+                    sketch_precision,
+                    bytes(sketch),
+                    built_at,
+                )
+                for (year, month), sketch in sketches.items()
+            ],
+        )
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def invalidate(db_number: int, entities: list, since=None) -> int:
+    """
+    Removes the stored sketches of a database from a date onwards.
+
+    Args:
+        db_number (int): The database number.
+        entities (list): The entities whose sketches are removed.
+        since (date): The first date that changed (optional), all the months if None.
+
+    Returns:
+        int: The number of sketches removed.
+    """
+    if not entities:
+        return 0
+    query = (
+        f"DELETE FROM sketches WHERE db_number = ? "
+        f"AND entity IN ({', '.join('?' for _ in entities)})"
+    )
+    params = [db_number, *entities]
+    if since is not None:
+        query += " AND year * 100 + month >= ?"
+        params.append(since.year * 100 + since.month)
+    try:
+        connection = get_store_connection()
+        try:
+            removed = connection.execute(query, params).rowcount
+            connection.commit()
+        finally:
+            connection.close()
+    except sqlite3.Error as e:
+        print(f"Error al invalidar los sketches: {e}", flush=True)
+        return 0
+    return removed
@@ -0,0 +1,188 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Queries that take longer than the threshold (in milliseconds) are recorded
+slow_query_threshold_ms = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "1000"))
+# SQLite file of the log and the number of entries kept (the oldest are rotated out)
+slow_query_log = os.getenv("SLOW_QUERY_LOG", "slow_queries.db")
+slow_query_max_entries = int(os.getenv("SLOW_QUERY_MAX_ENTRIES", "1000"))
+# Capture the execution plan of the slow queries (runs the plan request again)
+capture_plan_enabled = os.getenv("SLOW_QUERY_CAPTURE_PLAN", "false").lower() == "true"
+
+_initialized = False
+_lock = threading.Lock()
+
+
+def get_log_connection() -> sqlite3.Connection:
+    """
+    Opens the slow query log, creating its table on first use.
+
+    Returns:
+        sqlite3.Connection: The connection to the SQLite log.
+    """
+    global _initialized
+
+    connection = sqlite3.connect(slow_query_log, timeout=5)
+    if not _initialized:
+        with _lock:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS slow_queries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    recorded_at TEXT NOT NULL,
+                    endpoint TEXT NOT NULL,
+                    db_number INTEGER NOT NULL,
+                    dbms TEXT,
+                    sql TEXT NOT NULL,
+                    params TEXT,
+                    duration_ms REAL NOT NULL,
+                    row_count INTEGER,
+                    plan TEXT
+                )
+                """)
+            connection.commit()
+            _initialized = True
+    return connection
+
+
+def is_slow(duration_ms: float) -> bool:
+    """
+    Checks if a query duration is over the slow query threshold.
+
+    Args:
+        duration_ms (float): The duration of the query in milliseconds.
+
+    Returns:
+        bool: True if the query is slow.
+    """
+    return duration_ms >= slow_query_threshold_ms
+
+
+def capture_plan(conn, query: str, params=None) -> str:
+    """
+    Gets the execution plan of a query for the current DBMS.
+
+    Firebird returns the PLAN of the prepared statement, SQL Server the
+    SHOWPLAN_TEXT output and SQLite the EXPLAIN QUERY PLAN output.
+    Errors are not raised, the plan is only diagnostic information.
+
+    Args:
+        conn: An open connection to the database of the query.
+        query (str): The query.
+        params: The parameters of the query (optional).
+
+    Returns:
+        str: The execution plan, or None if it can't be captured.
+    """
+    dbms = os.getenv("DBMS")
+    cursor = conn.cursor()
+    try:
+        if dbms == "FIREBIRD":
+            return cursor.prep(query, explain_plan=True).stmt.plan
+        elif dbms == "SQLSERVER":
+            cursor.execute("SET SHOWPLAN_TEXT ON")
+            try:
+                cursor.execute(query, params or None)
+                lines = []
+                while True:
+                    lines += [str(row[0]) for row in cursor.fetchall()]
+                    if not cursor.nextset():
+                        break
+            finally:
+                cursor.execute("SET SHOWPLAN_TEXT OFF")
+            return "\n".join(lines)
+        elif dbms == "SQLITE":
+            cursor.execute(f"EXPLAIN QUERY PLAN {query}", params or [])
+            return "\n".join(str(row[-1]) for row in cursor.fetchall())
+    except Exception as e:
+        print(f"Error al obtener el plan de ejecución: {e}", flush=True)
+    finally:
+        cursor.close()
+    return None
+
+
+def record(
+    endpoint: str,
+    db_number: int,
+    query: str,
+    duration_ms: float,
+    row_count: int,
+    params=None,
+    plan: str = None,
+):
+    """
+    Records a slow query in the log and rotates out the oldest entries.
+
+    Args:
+        endpoint (str): The endpoint that ran the query.
+        db_number (int): The database number.
+        query (str): The final SQL text.
+        duration_ms (float): The execute and fetch time in milliseconds.
+        row_count (int): The number of rows returned.
+        params: The parameters of the query (optional).
+        plan (str): The execution plan (optional).
+    """
+    try:
+        connection = get_log_connection()
+        try:
+            connection.execute(
+                """
+                INSERT INTO slow_queries (recorded_at, endpoint, db_number, dbms,
+                sql, params, duration_ms, row_count, plan)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    datetime.now().isoformat(timespec="seconds"),
+                    endpoint,
+                    db_number,
+                    os.getenv("DBMS"),
+                    query,
+                    json.dumps(params, default=str) if params is not None else None,
+                    duration_ms,
+                    row_count,
+                    plan,
+                ),
+            )
+            connection.execute(
+                "DELETE FROM slow_queries WHERE id <= "
+                "(SELECT MAX(id) FROM slow_queries) - ?",
+                (slow_query_max_entries,),
+            )
+            connection.commit()
+        finally:
+            connection.close()
+    except sqlite3.Error as e:
+        print(f"Error al registrar la consulta lenta: {e}", flush=True)
+
+
+def get_worst(limit: int = 20, db_number: int = None) -> list:
+    """
+    Gets the slowest queries of the log.
+
+    Args:
+        limit (int): The number of queries to return.
+        db_number (int): Only return queries of this database (optional).
+
+    Returns:
+        list: A list of dictionaries, from the slowest query.
+    """
+    connection = get_log_connection()
+    connection.row_factory = sqlite3.Row
+    try:
+        query = "SELECT * FROM slow_queries"
+        params = []
+        if db_number is not None:
+            query += " WHERE db_number = ?"
+            params.append(db_number)
+        query += " ORDER BY duration_ms DESC LIMIT ?"
+        params.append(limit)
+        return [dict(row) for row in connection.execute(query, params).fetchall()]
+    finally:
+        connection.close()
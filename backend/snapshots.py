@@ -0,0 +1,318 @@
+"""
+Exporter of the dashboard datasets as Arrow IPC snapshot files.
+
+Writes the whole result of every (company, dataset) pair to SNAPSHOT_DIR, so a
+dashboard running on the same host can memory-map the files instead of
+requesting and parsing the JSON of the API (DATA_LOADING_MODE=local in the
+dashboard). A snapshot is written again when change detection sees a change in
+one of its source tables.
+
+Every export is written to a new file, named after the dataset, the database
+and the time of the export, and the older files are removed once no reader has
+them open (Windows doesn't allow replacing a mapped file).
+
+The API runs the exporter in the background when SNAPSHOT_INTERVAL is over 0.
+With several worker processes (see serve.py), run it as its own process instead.
+
+Usage:
+    python snapshots.py --all
+    python snapshots.py --all --watch
+"""
+
+import argparse
+import glob
+import os
+import threading
+import time
+from datetime import date, datetime
+
+import cache
+import change_detection
+import query_builder
+from db import acquire_connection, execute_cached, release_connection
+from dotenv import load_dotenv
+from schemas import (
+    GoodsVector,
+    GrossProftMarginVector,
+    LinesVector,
+    ProductsVector,
+    PurchasesVector,
+    SalesByClientVector,
+    SalesByProductVector,
+    SalesVector,
+    SalesVsProfitVector,
+    SellersVector,
+)
+
+load_dotenv()
+
+# Directory of the snapshot files shared with the dashboard, seconds between
+# checks for changed datasets (0 disables the exporter of the API) and rows
+# written per Arrow record batch
+snapshot_dir = os.getenv("SNAPSHOT_DIR", "snapshots")
+snapshot_interval = int(os.getenv("SNAPSHOT_INTERVAL", "0"))
+snapshot_batch_rows = int(os.getenv("SNAPSHOT_BATCH_ROWS", "50000"))
+
+# Datasets exported, with the response model of their endpoint, which gives the
+# column types
+SNAPSHOT_MODELS = {
+    "sales": SalesVector,
+    "purchases": PurchasesVector,
+    "sellers": SellersVector,
+    "products": ProductsVector,
+    "gross-profit-margin": GrossProftMarginVector,
+    "goods": GoodsVector,
+    "sales-vs-profit": SalesVsProfitVector,
+    "sales-by-towns": SalesVector,
+    "sales-by-lines": LinesVector,
+    "sales-by-products": SalesByProductVector,
+    "sales-by-clients": SalesByClientVector,
+    "sales-and-profits-by-towns": SalesByClientVector,
+    "sales-and-profits-by-sellers": SalesByClientVector,
+}
+
+# Fingerprints of the source tables of every exported snapshot
+_exported = {}
+_lock = threading.Lock()
+
+
+def get_schema(name: str, columns: tuple):
+    """
+    Builds the Arrow schema of a dataset from the response model of its endpoint.
+
+    Args:
+        name (str): The dataset name.
+        columns (tuple): The result columns, in the order of the query.
+
+    Returns:
+        pyarrow.Schema: The schema of the snapshot.
+    """
+    import pyarrow as pa  # Only needed for the snapshots, slow to import
+
+    types = {str: pa.string(), int: pa.int64(), float: pa.float64(), date: pa.date32()}
+    fields = SNAPSHOT_MODELS[name].model_fields
+    return pa.schema(
+        [pa.field(column, types[fields[column].annotation]) for column in columns]
+    )
+
+
+def convert(value, arrow_type):
+    """
+    Converts a value of the database driver to the type of its Arrow column.
+
+    Args:
+        value: The value, e.g. a Decimal of Firebird or a date text of SQLite.
+        arrow_type (pyarrow.DataType): The type of the column.
+
+    Returns:
+        The converted value.
+    """
+    import pyarrow as pa
+
+    if value is None:
+        return None
+    if pa.types.is_floating(arrow_type):
+        return float(value)
+    if pa.types.is_integer(arrow_type):
+        return int(value)
+    if pa.types.is_date(arrow_type):
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, str):
+            return date.fromisoformat(value[:10])
+    return value
+
+
+def get_snapshot_files(name: str, db_number: int) -> list:
+    """
+    Gets the snapshot files of a dataset, the newest last.
+
+    Args:
+        name (str): The dataset name.
+        db_number (int): The database number.
+
+    Returns:
+        list: The paths of the files.
+    """
+    return sorted(
+        glob.glob(os.path.join(snapshot_dir, f"{name}_{db_number:02d}.*.arrow"))
+    )
+
+
+def export(name: str, db_number: int) -> str:
+    """
+    Exports the whole result of a dataset as an Arrow IPC file.
+
+    The rows are fetched in batches of SNAPSHOT_BATCH_ROWS and written as
+    record batches, so the export doesn't hold the whole result in memory.
+
+    Args:
+        name (str): The dataset name.
+        db_number (int): The database number.
+
+    Returns:
+        str: The path of the snapshot, or None if the connection fails.
+    """
+    import pyarrow as pa
+
+    query, params, columns = query_builder.compile_dataset(
+        name, os.getenv("DBMS"), db_number
+    )
+    schema = get_schema(name, columns)
+
+    entry = acquire_connection(db_number)
+    if entry is None:
+        print(
+            f"Error al conectar a la base {db_number} para exportar {name}", flush=True
+        )
+        return None
+
+    os.makedirs(snapshot_dir, exist_ok=True)
+    path = os.path.join(snapshot_dir, f"{name}_{db_number:02d}.{time.time_ns()}.arrow")
+    reusable = False
+    try:
+        execute_cached(entry, query, params)
+        with pa.OSFile(f"{path}.tmp", "wb") as sink:
+            with pa.ipc.new_file(sink, schema) as writer:
+                while True:
+                    rows = entry["cursor"].fetchmany(snapshot_batch_rows)
+                    if not rows:
+                        break
+                    writer.write_batch(
+                        pa.record_batch(
+                            [
+                                pa.array(
+                                    [convert(row[i], field.type) for row in rows],
+                                    type=field.type,
+                                )
+                                for i, field in enumerate(schema)
+                            ],
+                            schema=schema,
+                        )
+                    )
+        reusable = True
+    finally:
+        release_connection(db_number, entry, reusable)
+
+    # The new file gets its final name only when it's complete
+    os.replace(f"{path}.tmp", path)
+    for previous in get_snapshot_files(name, db_number)[:-1]:
+        try:
+            os.remove(previous)
+        except OSError:
+            pass  # Still mapped by a dashboard, removed on a later export
+    return path
+
+
+def export_changed(db_number: int) -> list:
+    """
+    Exports the snapshots of a database whose source tables changed since their
+    last export, or that were never exported.
+
+    Args:
+        db_number (int): The database number.
+
+    Returns:
+        list: The names of the exported datasets.
+    """
+    tables = change_detection.get_data_version(db_number)["tables"]
+    exported = []
+    for name in SNAPSHOT_MODELS:
+        fingerprint = {
+            prefix: tables[prefix]
+            for prefix in sorted(cache.get_source_tables(name))
+            if prefix in tables
+        }
+        with _lock:
+            previous = _exported.get((name, db_number))
+        if previous == fingerprint and get_snapshot_files(name, db_number):
+            continue
+        if export(name, db_number) is not None:
+            with _lock:
+                _exported[(name, db_number)] = fingerprint
+            exported.append(name)
+    return exported
+
+
+def watch(stop: threading.Event, interval: int, db_numbers: list):
+    """
+    Exports the changed snapshots of some company databases until stopped.
+
+    Args:
+        stop (threading.Event): The event that stops the exporter.
+        interval (int): The seconds between checks.
+        db_numbers (list): The database numbers.
+    """
+    while not stop.is_set():
+        for db_number in db_numbers:
+            try:
+                exported = export_changed(db_number)
+                if exported:
+                    print(
+                        f"Snapshots exportados de la base {db_number}: "
+                        f"{', '.join(exported)}",
+                        flush=True,
+                    )
+            except Exception as e:
+                print(
+                    f"Error al exportar los snapshots de la base {db_number}: {e}",
+                    flush=True,
+                )
+        stop.wait(interval)
+
+
+def start_exporting() -> threading.Event:
+    """
+    Starts the background exporter of the snapshots, if enabled.
+
+    Returns:
+        threading.Event: The event that stops the exporter, or None if disabled.
+    """
+    if snapshot_interval <= 0:
+        return None
+    number_of_databases = int(os.getenv("NUMBER_OF_DATABASES", "1"))
+    stop = threading.Event()
+    threading.Thread(
+        target=watch,
+        args=(stop, snapshot_interval, range(1, number_of_databases + 1)),
+        daemon=True,
+    ).start()
+    return stop
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Arrow snapshots of the datasets")
+    parser.add_argument("--db-number", type=int, default=1)
+    parser.add_argument("--all", action="store_true", help="Every company database")
+    parser.add_argument(
+        "--watch", action="store_true", help="Export again when the data changes"
+    )
+    parser.add_argument("--interval", type=int, default=snapshot_interval or 60)
+    args = parser.parse_args()
+
+    db_numbers = (
+        range(1, int(os.getenv("NUMBER_OF_DATABASES", "1")) + 1)
+        if args.all
+        else [args.db_number]
+    )
+
+    if args.watch:
+        try:
+            watch(threading.Event(), args.interval, db_numbers)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    for db_number in db_numbers:
+        for name in SNAPSHOT_MODELS:
+            start = time.perf_counter()
+            path = export(name, db_number)
+            if path is not None:
+                print(
+                    f"  {os.path.basename(path):<52} "
+                    f"{(time.perf_counter() - start) * 1000:>8.1f}ms"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Benchmark of the dashboard compute engines (pandas, polars and duckdb).
+
+Builds synthetic datasets shaped like the API responses and times every
+function of dashboard/compute.py with each installed engine, checking that
+the outputs are identical to the pandas ones.
+
+Usage:
+    python benchmarks/bench_compute.py --sizes 10000 100000 1000000 10000000
+"""
+
+import argparse
+import importlib.util
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "dashboard"))
+
+import compute  # noqa: E402
+
+
+def build_dataset(rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Builds a synthetic dataset with the columns of the sales endpoints.
+
+    The names follow a Zipf-like distribution, like clients and products do.
+
+    Args:
+        rows (int): The number of rows.
+        seed (int): The seed of the random generator.
+
+    Returns:
+        pd.DataFrame: The synthetic dataset.
+    """
+    rng = np.random.default_rng(seed)
+    names = np.array([f"NOMBRE {i:06d}" for i in range(max(rows // 50, 10))])
+    weights = 1 / np.arange(1, len(names) + 1)
+    weights /= weights.sum()
+    return pd.DataFrame(
+        {
+            "name": rng.choice(names, rows, p=weights),
+            "month_concept": rng.integers(1, 13, rows),
+            "year_concept": rng.integers(2015, 2026, rows),
+            "total_sales": rng.gamma(2.0, 5000.0, rows),
+            "total_gpm": rng.gamma(2.0, 1000.0, rows),
+            "sales": rng.gamma(2.0, 5000.0, rows),
+            "profit": rng.gamma(2.0, 1000.0, rows),
+            "qty": rng.integers(1, 50, rows).astype(float),
+        }
+    )
+
+
+def get_cases(data: pd.DataFrame) -> dict:
+    """
+    Gets the functions to benchmark with their arguments.
+
+    Args:
+        data (pd.DataFrame): The synthetic dataset.
+
+    Returns:
+        dict: The name of every case and a function that runs it with an engine.
+    """
+    return {
+        "get_top": lambda engine: compute.get_top(
+            data, "name", "total_sales", 10, engine=engine
+        ),
+        "get_top_multiple_agg": lambda engine: compute.get_top_multiple_agg(
+            data, "name", "sales", "profit", "qty", 10, engine=engine
+        ),
+        "calculate_metrics": lambda engine: compute.calculate_metrics(
+            data, "total_sales", engine=engine
+        ),
+        "filter_data": lambda engine: compute.filter_data(data, 2020, 6, engine=engine),
+        "monthly_sales_vs_profits": lambda engine: compute.monthly_sales_vs_profits(
+            data, data, 2020, 12, engine=engine
+        ),
+    }
+
+
+def assert_same(result, expected):
+    """
+    Checks that the output of an engine is identical to the pandas one.
+
+    Args:
+        result: The output of the engine.
+        expected: The output of pandas.
+    """
+    if isinstance(expected, dict):
+        for key, value in expected.items():
+            assert np.isclose(result[key], value, equal_nan=True), key
+    else:
+        pd.testing.assert_frame_equal(
+            result, expected, check_dtype=False, check_index_type=False
+        )
+
+
+def time_case(function, engine: str, repeat: int) -> tuple:
+    """
+    Times the best of several runs of a case.
+
+    Args:
+        function: The function that runs the case.
+        engine (str): The compute engine.
+        repeat (int): The number of runs.
+
+    Returns:
+        tuple: The best time in seconds and the output of the last run.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(engine)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[10_000, 100_000, 1_000_000, 10_000_000],
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    engines = ["pandas"] + [
+        engine
+        for engine in ("polars", "duckdb")
+        if importlib.util.find_spec(engine) is not None
+    ]
+
+    print(f"{'rows':>10} {'function':<26}" + "".join(f"{e:>10}" for e in engines))
+    for size in args.sizes:
+        data = build_dataset(size)
+        for name, function in get_cases(data).items():
+            timings = []
+            expected = None
+            for engine in engines:
+                seconds, result = time_case(function, engine, args.repeat)
+                if expected is None:
+                    expected = result
+                else:
+                    assert_same(result, expected)
+                timings.append(seconds)
+            print(
+                f"{size:>10} {name:<26}"
+                + "".join(f"{seconds * 1000:>8.1f}ms" for seconds in timings)
+            )
+
+
+if __name__ == "__main__":
+    main()
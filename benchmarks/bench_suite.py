@@ -0,0 +1,322 @@
+"""
+End-to-end benchmark of the backend endpoints and the dashboard utilities.
+
+Generates synthetic SAE databases (benchmarks/synthetic_sae.py) at several
+scale factors, runs every endpoint of backend/main.py against them with
+DBMS=SQLITE, and runs the dashboard utilities over the endpoint outputs.
+The results can be saved as a baseline, and later runs compared against it
+to detect regressions (the exit code is 1 when a case regresses).
+
+Usage:
+    python benchmarks/bench_suite.py --scales 0.1 1 5 --output results.json
+    python benchmarks/bench_suite.py --scales 0.1 1 5 --baseline results.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date
+
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+sys.path.insert(0, os.path.join(ROOT, "dashboard"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# The backend reads the DBMS when it is imported, and the dashboard reads its
+# settings from the environment, so they are set before any import
+os.environ["DBMS"] = "SQLITE"
+# The endpoints are measured against the database, not the result cache
+os.environ["RESULT_CACHE_TTL"] = "0"
+os.environ.setdefault("INITIAL_YEAR", "2015")
+os.environ.setdefault("NUMBER_OF_DATABASES", "1")
+os.environ.setdefault("TOP_N", "10")
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+import synthetic_sae  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+# Minimum slowdown in seconds to report a regression, avoids timer noise
+MIN_REGRESSION_SECONDS = 0.002
+
+# Path parameters of the templated routes, the templated routes without them
+# are not benchmarked
+PATH_PARAMS = {
+    "/sync/{dataset}/": {"dataset": "sales"},
+    "/export/{dataset}/": {"dataset": "sales"},
+    "/abc/{entity}/": {"entity": "products"},
+    "/inventory/{level}/": {"level": "products"},
+}
+
+
+def best_of(function, repeat: int) -> tuple:
+    """
+    Runs a function several times and keeps the best time.
+
+    Args:
+        function: The function to run.
+        repeat (int): The number of runs.
+
+    Returns:
+        tuple: The best time in seconds and the output of the last run.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def get_database(data_dir: str, scale: float, regenerate: bool) -> str:
+    """
+    Gets the synthetic database of a scale factor, generating it if needed.
+
+    Args:
+        data_dir (str): The directory of the generated databases.
+        scale (float): The scale factor.
+        regenerate (bool): Whether to generate the database even if it exists.
+
+    Returns:
+        str: The path of the database.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"sae_sf{scale:g}.db")
+    if regenerate or not os.path.exists(path):
+        print(f"Generando base de datos sintética con escala {scale:g}", flush=True)
+        synthetic_sae.generate(path, scale, db_number=1)
+    return path
+
+
+def get_query_params(database: str) -> dict:
+    """
+    Gets the query parameters of the routes that need a period or a parent key:
+    the last closed year, and the line and product with the most sales.
+
+    Args:
+        database (str): The path of the synthetic database.
+
+    Returns:
+        dict: The query parameters of every route that needs them, by its path.
+    """
+    from query_builder import table_name
+
+    connection = sqlite3.connect(database)
+    try:
+        line, product = connection.execute(
+            f"SELECT b.DESC_LIN, c.CVE_ART FROM {table_name('MINVE', 1)} a "
+            f"INNER JOIN {table_name('INVE', 1)} c ON a.CVE_ART = c.CVE_ART "
+            f"INNER JOIN {table_name('CLIN', 1)} b ON c.LIN_PROD = b.CVE_LIN "
+            "WHERE a.CVE_CPTO = 51 AND a.TIPO_DOC = 'F' "
+            "GROUP BY b.DESC_LIN, c.CVE_ART ORDER BY COUNT(*) DESC LIMIT 1"
+        ).fetchone()
+    finally:
+        connection.close()
+
+    year = date.today().year - 1
+    return {
+        "/kpis/": {"year": year},
+        "/distinct-counts/": {"year": year},
+        "/abc/{entity}/": {"year": year},
+        "/inventory/{level}/": {"year": year},
+        "/drill-down/line-products/": {"year": year, "line": line},
+        "/drill-down/product-invoices/": {"year": year, "product": product},
+    }
+
+
+def bench_endpoints(client: TestClient, database: str, repeat: int) -> tuple:
+    """
+    Benchmarks every GET endpoint of the API with db_number=1, the templated
+    ones with their PATH_PARAMS, and the ones that need a period or a parent key
+    with the parameters of get_query_params().
+
+    An endpoint that fails is reported and left out of the results, the rest
+    are still benchmarked.
+
+    Args:
+        client (TestClient): The test client of the API.
+        database (str): The path of the synthetic database.
+        repeat (int): The number of runs of every endpoint.
+
+    Returns:
+        tuple: The results of every endpoint and the DataFrame of every endpoint.
+    """
+    import main
+
+    query_params = get_query_params(database)
+    results, frames = {}, {}
+    for route in main.app.routes:
+        path = getattr(route, "path", "")
+        methods = getattr(route, "methods", ())
+        if "GET" not in methods or not path.endswith("/"):
+            continue
+        if "{" in path and path not in PATH_PARAMS:
+            continue
+
+        url = path.format(**PATH_PARAMS.get(path, {}))
+        params = {"db_number": 1, **query_params.get(path, {})}
+        seconds, response = best_of(lambda: client.get(url, params=params), repeat)
+        if response.status_code >= 400:
+            print(f"  {url}: error {response.status_code}", flush=True)
+            continue
+
+        endpoint = url.strip("/")
+        result = {"seconds": seconds, "bytes": len(response.content)}
+        if response.headers["content-type"].startswith("application/json"):
+            data = response.json()
+            # The sync responses carry their rows with the version
+            rows = data.get("rows") if isinstance(data, dict) else data
+            if isinstance(rows, list):
+                result["rows"] = len(rows)
+            if isinstance(data, list):
+                frames[endpoint] = pd.DataFrame(data)
+        results[f"endpoint:{endpoint}"] = result
+    return results, frames
+
+
+def bench_utilities(frames: dict, repeat: int) -> dict:
+    """
+    Benchmarks the dashboard utilities over the endpoint outputs.
+
+    Args:
+        frames (dict): The DataFrame of every endpoint.
+        repeat (int): The number of runs of every case.
+
+    Returns:
+        dict: The results of every case.
+    """
+    import compute
+    import utilities
+
+    sales = frames["sales"]
+    year = int(sales["year_concept"].max())
+    month = int(sales[sales["year_concept"] == year]["month_concept"].max())
+    sales_filtered = utilities.filter_data(sales, year, month)
+    clients_filtered = utilities.filter_data(frames["sales-by-clients"], year, month)
+    daily = frames["sales-vs-profit"].assign(
+        movement_date=lambda df: pd.to_datetime(df["movement_date"])
+    )
+    combined = compute.monthly_sales_vs_profits(
+        sales, frames["gross-profit-margin"], year, month
+    )
+    top_clients = utilities.get_top(sales_filtered, "name", "total_sales", 10)
+
+    cases = {
+        "filter_data": lambda: utilities.filter_data(sales, year, month),
+        "calculate_metrics": lambda: utilities.calculate_metrics(
+            sales_filtered, "total_sales"
+        ),
+        "get_delta": lambda: utilities.get_delta(
+            month, year, sales, "total_sales", 1.0, 1000, "sum"
+        ),
+        "get_top": lambda: utilities.get_top(sales_filtered, "name", "total_sales", 10),
+        "get_top_multiple_agg": lambda: utilities.get_top_multiple_agg(
+            clients_filtered, "name", "sales", "profit", "qty", 10
+        ),
+        "monthly_sales_vs_profits": lambda: compute.monthly_sales_vs_profits(
+            sales, frames["gross-profit-margin"], year, month
+        ),
+        "plot_sales_vs_profits": lambda: utilities.plot_sales_vs_profits(combined),
+        "create_weekly_stacked_chart": lambda: utilities.create_weekly_stacked_chart(
+            daily.copy(), filter_current_week=False
+        ).to_dict(),
+        "generate_donut_chart": lambda: utilities.generate_donut_chart(
+            top_clients, "Clientes", "Cliente", "total_sales"
+        ),
+        "budget_chart_data": lambda: utilities.budget_chart_data(
+            daily, x_column="movement_date", y_column="sales"
+        ),
+    }
+
+    results = {}
+    for name, function in cases.items():
+        seconds, _ = best_of(function, repeat)
+        results[f"utilities:{name}"] = {"seconds": seconds}
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Compares the results against a baseline.
+
+    Args:
+        results (dict): The results of every scale factor and case.
+        baseline (dict): The baseline results.
+        tolerance (float): The allowed relative slowdown, e.g. 0.2 for 20%.
+
+    Returns:
+        list: The description of every regression.
+    """
+    regressions = []
+    for scale, cases in results.items():
+        for case, result in cases.items():
+            previous = baseline.get(scale, {}).get(case)
+            if previous is None:
+                continue
+            limit = previous["seconds"] * (1 + tolerance)
+            slowdown = result["seconds"] - previous["seconds"]
+            if result["seconds"] > limit and slowdown > MIN_REGRESSION_SECONDS:
+                regressions.append(
+                    f"sf={scale} {case}: {previous['seconds'] * 1000:.1f}ms -> "
+                    f"{result['seconds'] * 1000:.1f}ms"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SAE dashboard benchmark suite")
+    parser.add_argument("--scales", type=float, nargs="+", default=[0.1, 1.0, 5.0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--data-dir", default=os.path.join(tempfile.gettempdir(), "sae_bench")
+    )
+    parser.add_argument("--regenerate", action="store_true")
+    parser.add_argument("--output", help="JSON file to save the results")
+    parser.add_argument("--baseline", help="JSON file with previous results")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    import main as backend
+
+    # A server error of an endpoint is reported instead of aborting the run
+    client = TestClient(backend.app, raise_server_exceptions=False)
+    results = {}
+    for scale in args.scales:
+        database = get_database(args.data_dir, scale, args.regenerate)
+        os.environ["SQLITE_1"] = database
+        endpoint_results, frames = bench_endpoints(client, database, args.repeat)
+        utilities_results = bench_utilities(frames, args.repeat)
+        results[f"{scale:g}"] = {**endpoint_results, **utilities_results}
+
+        print(f"\nEscala {scale:g}")
+        for case, result in results[f"{scale:g}"].items():
+            details = ""
+            if "bytes" in result:
+                rows = f"{result['rows']:>8} filas" if "rows" in result else " " * 14
+                details = f" {rows} {result['bytes'] / 1024:>9.1f} KB"
+            print(f"  {case:<48} {result['seconds'] * 1000:>9.1f}ms{details}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRegresiones:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nSin regresiones respecto a la línea base")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Import time profile of the backend and the dashboard cold start.
+
+Runs the import of the backend app (backend/main.py) and of the dashboard
+utilities, which every Streamlit page imports, in fresh interpreters with
+python -X importtime, and reports their total time and their slowest direct
+imports. The exit code is 1 when a cold start is over its budget, or when it
+imports a module that should only load on first use (the database drivers and
+matplotlib). tests/test_import_time.py runs the same check with the default
+budgets.
+
+Usage:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --backend-budget 800 --dashboard-budget 1600
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Modules imported lazily, a cold start that imports them is a regression
+LAZY_MODULES = ["firebirdsql", "pymssql", "matplotlib"]
+
+# Import targets: the directory they run from, the import and their environment
+TARGETS = {
+    "backend": {
+        "directory": os.path.join(ROOT, "backend"),
+        "statement": "import main",
+        "environment": {"DBMS": "SQLITE", "CHANGE_DETECTION_INTERVAL": "0"},
+    },
+    "dashboard": {
+        "directory": os.path.join(ROOT, "dashboard"),
+        "statement": "import utilities",
+        "environment": {
+            "INITIAL_YEAR": "2015",
+            "NUMBER_OF_DATABASES": "1",
+            "TOP_N": "10",
+        },
+    },
+}
+
+# Cold start budgets of the targets, in milliseconds
+BUDGETS = {"backend": 1000, "dashboard": 2000}
+
+
+def profile_imports(target: dict) -> dict:
+    """
+    Imports a target in a fresh interpreter with python -X importtime.
+
+    Args:
+        target (dict): The directory, import statement and environment of the target.
+
+    Returns:
+        dict: The cumulative microseconds of every module imported, in import order.
+    """
+    environment = {**os.environ, **target["environment"]}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", target["statement"]],
+        cwd=target["directory"],
+        env=environment,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(
+            f"Error al importar {target['statement']}:\n{result.stderr[-2000:]}"
+        )
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # Header line
+        # The nesting level is the indentation of the name, top-level has none
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        modules[name.strip()] = {"microseconds": int(cumulative), "level": level}
+    return modules
+
+
+def summarize(modules: dict, top: int) -> tuple:
+    """
+    Summarizes an import profile.
+
+    Args:
+        modules (dict): The profile of profile_imports.
+        top (int): The number of slowest direct imports of the target to keep.
+
+    Returns:
+        tuple: The total milliseconds, including the interpreter startup, and the
+        slowest direct imports of the target as (module, milliseconds) pairs.
+    """
+    total = sum(
+        module["microseconds"] for module in modules.values() if module["level"] == 0
+    )
+    direct = [
+        (name, module["microseconds"] / 1000)
+        for name, module in modules.items()
+        if module["level"] == 1
+    ]
+    slowest = sorted(direct, key=lambda item: item[1], reverse=True)[:top]
+    return total / 1000, slowest
+
+
+def check_budget(name: str, budget: float, repeat: int = 3, top: int = 10) -> tuple:
+    """
+    Profiles the cold start of a target and checks it against its budget.
+
+    Args:
+        name (str): The target, a key of TARGETS.
+        budget (float): The budget of the cold start, in milliseconds.
+        repeat (int): The number of imports, the best one is kept.
+        top (int): The number of slowest direct imports of the target to keep.
+
+    Returns:
+        tuple: The total milliseconds of the best import, its slowest direct
+        imports (see summarize) and the failures, empty within the budget.
+    """
+    # The first run also writes the bytecode caches, the best run is kept
+    runs = [profile_imports(TARGETS[name]) for _ in range(repeat)]
+    summaries = [summarize(modules, top) for modules in runs]
+    total, slowest = min(summaries, key=lambda summary: summary[0])
+
+    failures = []
+    if total > budget:
+        failures.append(
+            f"{name}: {total:.0f}ms supera el presupuesto de {budget:.0f}ms"
+        )
+    loaded = [
+        module
+        for module in LAZY_MODULES
+        if any(imported.split(".")[0] == module for imported in runs[0])
+    ]
+    if loaded:
+        failures.append(f"{name}: importa al arrancar {', '.join(loaded)}")
+    return total, slowest, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--backend-budget", type=float, default=BUDGETS["backend"])
+    parser.add_argument("--dashboard-budget", type=float, default=BUDGETS["dashboard"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    budgets = {"backend": args.backend_budget, "dashboard": args.dashboard_budget}
+    failures = []
+    for name in TARGETS:
+        total, slowest, target_failures = check_budget(
+            name, budgets[name], args.repeat, args.top
+        )
+        print(f"\n{name}: {total:.0f}ms (presupuesto {budgets[name]:.0f}ms)")
+        for module, milliseconds in slowest:
+            print(f"  {module:<40} {milliseconds:>9.1f}ms")
+        failures += target_failures
+
+    if failures:
+        print("\nFuera de presupuesto:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nDentro del presupuesto")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Load test of the API with an increasing number of worker processes.
+
+Generates a synthetic SAE database (benchmarks/synthetic_sae.py), starts the
+API with backend/serve.py and DBMS=SQLITE once per worker count, and sends
+requests to the heaviest endpoints from several client processes for a fixed
+time. The results are served from the result cache after the warm-up, so the
+throughput measures the serialization of the responses, which a single worker
+runs under one GIL.
+
+Usage:
+    python benchmarks/load_test.py --workers 1 2 4 --clients 8 --duration 20
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import requests
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import synthetic_sae  # noqa: E402
+
+# Endpoints of the test, the ones with the largest responses
+ENDPOINTS = [
+    "/sales/",
+    "/sales-vs-profit/",
+    "/sales-by-clients/",
+    "/products/",
+    "/gross-profit-margin/",
+]
+
+
+def start_api(workers: int, port: int, data_dir: str, database: str):
+    """
+    Starts the API with serve.py and waits until it answers.
+
+    Args:
+        workers (int): The number of worker processes.
+        port (int): The port of the API.
+        data_dir (str): The directory of the SQLite files of the API.
+        database (str): The path of the synthetic database.
+
+    Returns:
+        subprocess.Popen: The process of the API.
+    """
+    environment = {
+        **os.environ,
+        "DBMS": "SQLITE",
+        "SQLITE_1": database,
+        "NUMBER_OF_DATABASES": "1",
+        "CHANGE_DETECTION_INTERVAL": "0",
+        "RESULT_CACHE_FILE": os.path.join(data_dir, "result_cache.db"),
+        "SLOW_QUERY_LOG": os.path.join(data_dir, "slow_queries.db"),
+        "SKETCH_STORE": os.path.join(data_dir, "sketches.db"),
+        "PROMETHEUS_MULTIPROC_DIR": os.path.join(data_dir, "metrics"),
+    }
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            os.path.join(ROOT, "backend", "serve.py"),
+            "--workers",
+            str(workers),
+            "--port",
+            str(port),
+        ],
+        env=environment,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/metrics", timeout=1).ok:
+                return process
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"La API con {workers} proceso(s) no respondió")
+
+
+def run_client(base_url: str, duration: float, offset: int) -> list:
+    """
+    Sends requests to the endpoints in turn until the duration is over.
+
+    Args:
+        base_url (str): The URL of the API.
+        duration (float): The seconds the client runs.
+        offset (int): The first endpoint of the client, so the clients interleave.
+
+    Returns:
+        list: The latency in seconds of every request.
+    """
+    session = requests.Session()
+    latencies = []
+    end = time.perf_counter() + duration
+    number = offset
+    while time.perf_counter() < end:
+        endpoint = ENDPOINTS[number % len(ENDPOINTS)]
+        start = time.perf_counter()
+        response = session.get(f"{base_url}{endpoint}", params={"db_number": 1})
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+        number += 1
+    return latencies
+
+
+def load_test(port: int, clients: int, duration: float) -> dict:
+    """
+    Runs the load test against a running API.
+
+    Args:
+        port (int): The port of the API.
+        clients (int): The number of client processes.
+        duration (float): The seconds every client runs.
+
+    Returns:
+        dict: The requests per second and the median and 95th percentile latency.
+    """
+    base_url = f"http://127.0.0.1:{port}"
+    # Warm-up, fills the result cache
+    for endpoint in ENDPOINTS:
+        requests.get(
+            f"{base_url}{endpoint}", params={"db_number": 1}
+        ).raise_for_status()
+
+    with ProcessPoolExecutor(max_workers=clients) as executor:
+        futures = [
+            executor.submit(run_client, base_url, duration, number)
+            for number in range(clients)
+        ]
+        latencies = [latency for future in futures for latency in future.result()]
+
+    return {
+        "requests": len(latencies),
+        "throughput": len(latencies) / duration,
+        "p50": statistics.median(latencies),
+        "p95": statistics.quantiles(latencies, n=20)[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--data-dir", default=os.path.join(tempfile.gettempdir(), "sae_bench")
+    )
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    database = os.path.join(args.data_dir, f"sae_sf{args.scale:g}.db")
+    if not os.path.exists(database):
+        print(f"Generando base de datos sintética con escala {args.scale:g}")
+        synthetic_sae.generate(database, args.scale, db_number=1)
+
+    print(f"CPUs: {os.cpu_count()}, clientes: {args.clients}")
+    print(f"{'procesos':>8} {'peticiones/s':>13} {'p50':>9} {'p95':>9} {'escala':>7}")
+    baseline = None
+    for workers in args.workers:
+        process = start_api(workers, args.port, args.data_dir, database)
+        try:
+            result = load_test(args.port, args.clients, args.duration)
+        finally:
+            process.terminate()
+            process.wait()
+        baseline = baseline or result["throughput"]
+        print(
+            f"{workers:>8} {result['throughput']:>13.1f} "
+            f"{result['p50'] * 1000:>7.1f}ms {result['p95'] * 1000:>7.1f}ms "
+            f"{result['throughput'] / baseline:>6.2f}x",
+            flush=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""
+Synthetic Aspel SAE dataset generator.
+
+Builds the FACTFnn, PAR_FACTFnn, CLIEnn, VENDnn, COMPCnn, PROVnn, MINVEnn,
+INVEnn and CLINnn tables used by backend/main.py in a local SQLite database,
+with the backend's table naming, so the API can run with DBMS=SQLITE and
+SQLITE_{db_number} pointing to the generated file.
+
+Clients and products are skewed (Zipf-like), sales grow over the years and
+have a monthly seasonality, and the number of lines per invoice follows a
+geometric distribution.
+
+Usage:
+    python benchmarks/synthetic_sae.py --scale 1 --db-number 1 --output sae01.db
+"""
+
+import argparse
+import os
+import sqlite3
+from datetime import date, timedelta
+
+import numpy as np
+
+# Sizes for scale factor 1, every size is multiplied by the scale factor
+BASE_SIZES = {
+    "clients": 500,
+    "sellers": 10,
+    "providers": 50,
+    "lines": 20,
+    "products": 2000,
+    "invoices": 20000,
+    "purchases": 2000,
+}
+
+YEARS = 5
+MEAN_LINES_PER_INVOICE = 4
+CANCELLED_RATIO = 0.03
+
+SCHEMA = """
+CREATE TABLE CLIE{nn} (CLAVE TEXT PRIMARY KEY, NOMBRE TEXT, MUNICIPIO TEXT);
+CREATE TABLE VEND{nn} (CVE_VEND TEXT PRIMARY KEY, NOMBRE TEXT);
+CREATE TABLE PROV{nn} (CLAVE TEXT PRIMARY KEY, NOMBRE TEXT);
+CREATE TABLE CLIN{nn} (CVE_LIN TEXT PRIMARY KEY, DESC_LIN TEXT);
+CREATE TABLE INVE{nn} (
+    CVE_ART TEXT PRIMARY KEY, DESCR TEXT, LIN_PROD TEXT,
+    EXIST REAL, COSTO_PROM REAL
+);
+CREATE TABLE FACTF{nn} (
+    CVE_DOC TEXT PRIMARY KEY, CVE_CLPV TEXT, CVE_VEND TEXT, FECHA_DOC TEXT,
+    STATUS TEXT, CAN_TOT REAL, TIPCAMB REAL
+);
+CREATE TABLE PAR_FACTF{nn} (
+    CVE_DOC TEXT, NUM_PAR INTEGER, CVE_ART TEXT, CANT REAL, PREC REAL,
+    COST REAL, TIP_CAM REAL, PRIMARY KEY (CVE_DOC, NUM_PAR)
+);
+CREATE TABLE COMPC{nn} (
+    CVE_DOC TEXT PRIMARY KEY, CVE_CLPV TEXT, FECHA_DOC TEXT, STATUS TEXT,
+    CAN_TOT REAL
+);
+CREATE TABLE MINVE{nn} (
+    NUM_MOV INTEGER PRIMARY KEY, CVE_ART TEXT, CVE_CPTO INTEGER, TIPO_DOC TEXT,
+    REFER TEXT, FECHA_DOCU TEXT, CANT REAL, PRECIO REAL, COSTO REAL
+);
+"""
+
+TOWNS = [
+    "Guadalajara",
+    "Zapopan",
+    "Tlaquepaque",
+    "Tonalá",
+    "Puebla",
+    "Toluca",
+    "Querétaro",
+    "León",
+    "Monterrey",
+    "Morelia",
+    "Iztapalapa",
+    "Coyoacán",
+]
+
+
+def table_suffix(db_number: int) -> str:
+    """
+    Builds the table suffix of a company, as backend/query_builder.py table_name does.
+
+    Args:
+        db_number (int): The database number.
+
+    Returns:
+        str: The table suffix, e.g. "01".
+    """
+    return f"0{db_number}" if db_number <= 9 else f"{db_number}"
+
+
+def zipf_weights(rng: np.random.Generator, size: int) -> np.ndarray:
+    """
+    Builds Zipf-like weights, so a few entities get most of the rows.
+
+    The weights are shuffled so the popular entities are not the first keys.
+
+    Args:
+        rng (np.random.Generator): The random generator.
+        size (int): The number of entities.
+
+    Returns:
+        np.ndarray: The probability of every entity.
+    """
+    weights = 1 / np.arange(1, size + 1) ** 1.1
+    return rng.permutation(weights / weights.sum())
+
+
+def random_dates(rng: np.random.Generator, count: int, end: date) -> np.ndarray:
+    """
+    Builds dates over the last YEARS years with growth and monthly seasonality.
+
+    Args:
+        rng (np.random.Generator): The random generator.
+        count (int): The number of dates.
+        end (date): The last date.
+
+    Returns:
+        np.ndarray: The dates as ISO strings, sorted.
+    """
+    start = date(end.year - YEARS + 1, 1, 1)
+    days = np.arange((end - start).days + 1)
+    ordinal = start.toordinal() + days
+    months = np.array([date.fromordinal(int(o)).month for o in ordinal])
+    weights = (1 + days / len(days)) * (1 + 0.3 * np.sin(months / 12 * 2 * np.pi))
+    weights /= weights.sum()
+    chosen = np.sort(rng.choice(days, count, p=weights))
+    return np.array([(start + timedelta(days=int(d))).isoformat() for d in chosen])
+
+
+def generate(path: str, scale: float = 1.0, db_number: int = 1, seed: int = 0):
+    """
+    Generates a synthetic SAE company database in a SQLite file.
+
+    Args:
+        path (str): The path of the SQLite file, it is replaced if it exists.
+        scale (float): The scale factor of the number of rows.
+        db_number (int): The database number used for the table names.
+        seed (int): The seed of the random generator.
+
+    Returns:
+        dict: The number of rows of every table.
+    """
+    rng = np.random.default_rng(seed)
+    nn = table_suffix(db_number)
+    sizes = {name: max(int(size * scale), 1) for name, size in BASE_SIZES.items()}
+    today = date.today()
+
+    if os.path.exists(path):
+        os.remove(path)
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA.format(nn=nn))
+
+    clients = [f"C{i:07d}" for i in range(sizes["clients"])]
+    sellers = [f"V{i:03d}" for i in range(sizes["sellers"])]
+    providers = [f"P{i:05d}" for i in range(sizes["providers"])]
+    lines = [f"L{i:03d}" for i in range(sizes["lines"])]
+    products = [f"A{i:07d}" for i in range(sizes["products"])]
+    costs = np.round(rng.lognormal(4, 1, sizes["products"]), 2)
+    prices = np.round(costs * rng.uniform(1.1, 1.8, sizes["products"]), 2)
+
+    connection.executemany(
+        f"INSERT INTO CLIE{nn} VALUES (?, ?, ?)",
+        [
+            (clave, f"CLIENTE {i}", TOWNS[rng.integers(len(TOWNS))])
+            for i, clave in enumerate(clients)
+        ],
+    )
+    connection.executemany(
+        f"INSERT INTO VEND{nn} VALUES (?, ?)",
+        [(clave, f"VENDEDOR {i}") for i, clave in enumerate(sellers)],
+    )
+    connection.executemany(
+        f"INSERT INTO PROV{nn} VALUES (?, ?)",
+        [(clave, f"PROVEEDOR {i}") for i, clave in enumerate(providers)],
+    )
+    connection.executemany(
+        f"INSERT INTO CLIN{nn} VALUES (?, ?)",
+        [(clave, f"LINEA {i}") for i, clave in enumerate(lines)],
+    )
+    connection.executemany(
+        f"INSERT INTO INVE{nn} VALUES (?, ?, ?, ?, ?)",
+        [
+            (
+                clave,
+                f"PRODUCTO {i}",
+                lines[rng.integers(len(lines))],
+                float(rng.integers(0, 500)),
+                float(costs[i]),
+            )
+            for i, clave in enumerate(products)
+        ],
+    )
+
+    client_weights = zipf_weights(rng, sizes["clients"])
+    product_weights = zipf_weights(rng, sizes["products"])
+    provider_weights = zipf_weights(rng, sizes["providers"])
+
+    # Invoices, their lines and their inventory movements
+    invoice_count = sizes["invoices"]
+    invoice_dates = random_dates(rng, invoice_count, today)
+    invoice_clients = rng.choice(sizes["clients"], invoice_count, p=client_weights)
+    invoice_sellers = rng.integers(0, sizes["sellers"], invoice_count)
+    cancelled = rng.random(invoice_count) < CANCELLED_RATIO
+    exchange_rates = np.where(rng.random(invoice_count) < 0.05, 17.5, 1.0)
+    lines_per_invoice = rng.geometric(1 / MEAN_LINES_PER_INVOICE, invoice_count)
+
+    split_invoice = np.repeat(np.arange(invoice_count), lines_per_invoice)
+    split_number = np.arange(len(split_invoice)) - np.repeat(
+        np.cumsum(lines_per_invoice) - lines_per_invoice, lines_per_invoice
+    )
+    split_article = rng.choice(sizes["products"], len(split_invoice), p=product_weights)
+    split_quantity = rng.integers(1, 20, len(split_invoice)).astype(float)
+    split_amount = split_quantity * prices[split_article]
+    invoice_totals = np.bincount(split_invoice, split_amount, invoice_count)
+
+    invoice_keys = [f"F{i:09d}" for i in range(invoice_count)]
+    invoices = [
+        (
+            invoice_keys[i],
+            clients[invoice_clients[i]],
+            sellers[invoice_sellers[i]],
+            invoice_dates[i],
+            "C" if cancelled[i] else "E",
+            round(float(invoice_totals[i]), 2),
+            float(exchange_rates[i]),
+        )
+        for i in range(invoice_count)
+    ]
+    splits = [
+        (
+            invoice_keys[invoice],
+            int(number) + 1,
+            products[article],
+            float(quantity),
+            float(prices[article]),
+            float(costs[article]),
+            1.0,
+        )
+        for invoice, number, article, quantity in zip(
+            split_invoice, split_number, split_article, split_quantity
+        )
+    ]
+    movements = [
+        (
+            products[article],
+            51,
+            "F",
+            invoice_keys[invoice],
+            invoice_dates[invoice],
+            float(quantity),
+            float(prices[article]),
+            float(costs[article]),
+        )
+        for invoice, article, quantity in zip(
+            split_invoice, split_article, split_quantity
+        )
+        if not cancelled[invoice]
+    ]
+
+    # Purchases and their inventory movements
+    purchase_count = sizes["purchases"]
+    purchase_dates = random_dates(rng, purchase_count, today)
+    purchase_providers = rng.choice(
+        sizes["providers"], purchase_count, p=provider_weights
+    )
+    items_per_purchase = rng.integers(1, 15, purchase_count)
+    item_purchase = np.repeat(np.arange(purchase_count), items_per_purchase)
+    item_article = rng.choice(sizes["products"], len(item_purchase), p=product_weights)
+    item_quantity = rng.integers(10, 200, len(item_purchase)).astype(float)
+    purchase_totals = np.bincount(
+        item_purchase, item_quantity * costs[item_article], purchase_count
+    )
+
+    purchase_keys = [f"C{i:09d}" for i in range(purchase_count)]
+    purchases = [
+        (
+            purchase_keys[i],
+            providers[purchase_providers[i]],
+            purchase_dates[i],
+            "E",
+            round(float(purchase_totals[i]), 2),
+        )
+        for i in range(purchase_count)
+    ]
+    movements += [
+        (
+            products[article],
+            1,
+            "c",
+            purchase_keys[purchase],
+            purchase_dates[purchase],
+            float(quantity),
+            float(costs[article]),
+            float(costs[article]),
+        )
+        for purchase, article, quantity in zip(
+            item_purchase, item_article, item_quantity
+        )
+    ]
+
+    # Movements are numbered in date order, like the SAE kardex
+    movements.sort(key=lambda movement: movement[4])
+    movements = [(number, *movement) for number, movement in enumerate(movements, 1)]
+
+    connection.executemany(
+        f"INSERT INTO FACTF{nn} VALUES (?, ?, ?, ?, ?, ?, ?)", invoices
+    )
+    connection.executemany(
+        f"INSERT INTO PAR_FACTF{nn} VALUES (?, ?, ?, ?, ?, ?, ?)", splits
+    )
+    connection.executemany(f"INSERT INTO COMPC{nn} VALUES (?, ?, ?, ?, ?)", purchases)
+    connection.executemany(
+        f"INSERT INTO MINVE{nn} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", movements
+    )
+    connection.commit()
+    connection.close()
+
+    return {
+        "CLIE": len(clients),
+        "VEND": len(sellers),
+        "PROV": len(providers),
+        "CLIN": len(lines),
+        "INVE": len(products),
+        "FACTF": len(invoices),
+        "PAR_FACTF": len(splits),
+        "COMPC": len(purchases),
+        "MINVE": len(movements),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic Aspel SAE database")
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--db-number", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="sae01.db")
+    args = parser.parse_args()
+
+    counts = generate(args.output, args.scale, args.db_number, args.seed)
+    for table, count in counts.items():
+        print(f"{table}{table_suffix(args.db_number)}: {count} filas")
+
+
+if __name__ == "__main__":
+    main()
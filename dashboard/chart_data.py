@@ -0,0 +1,234 @@
+import numpy as np
+import pandas as pd
+
+MONTH_NAMES = [
+    "Enero",
+    "Febrero",
+    "Marzo",
+    "Abril",
+    "Mayo",
+    "Junio",
+    "Julio",
+    "Agosto",
+    "Septiembre",
+    "Octubre",
+    "Noviembre",
+    "Diciembre",
+]
+
+DAY_NAMES = [
+    "lunes",
+    "martes",
+    "miércoles",
+    "jueves",
+    "viernes",
+    "sábado",
+    "domingo",
+]
+
+
+def month_names(months: pd.Series) -> pd.Categorical:
+    """
+    Maps month numbers (1-12) to their Spanish names without a per-row lookup.
+
+    Args:
+        months (pd.Series): Series with the month numbers.
+
+    Returns:
+        pd.Categorical: Ordered categorical with the month names.
+    """
+    return pd.Categorical.from_codes(
+        months.to_numpy(dtype="int64") - 1, categories=MONTH_NAMES, ordered=True
+    )
+
+
+def day_names(weekdays: pd.Series) -> pd.Categorical:
+    """
+    Maps weekday numbers (0 is Monday) to their Spanish names without a locale.
+
+    Args:
+        weekdays (pd.Series): Series with the weekday numbers.
+
+    Returns:
+        pd.Categorical: Ordered categorical with the day names.
+    """
+    return pd.Categorical.from_codes(
+        weekdays.to_numpy(dtype="int64"), categories=DAY_NAMES, ordered=True
+    )
+
+
+def prepare_sales_vs_profits(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aggregates the monthly sales and profits into one row per month.
+
+    The data is kept in wide format so the chart can fold both metrics with a
+    Vega transform instead of embedding a melted copy.
+
+    Args:
+        data (pd.DataFrame): DataFrame with columns month_concept, total_sales and total_gpm.
+
+    Returns:
+        pd.DataFrame: DataFrame with columns month_name, total_sales and total_gpm.
+    """
+    monthly = data.groupby("month_concept", as_index=False, sort=True)[
+        ["total_sales", "total_gpm"]
+    ].sum()
+    monthly["month_name"] = month_names(monthly["month_concept"])
+    return monthly[["month_name", "total_sales", "total_gpm"]]
+
+
+def prepare_weekly_sales(dataframe: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aggregates daily sales and profits by day of the week, in thousands.
+
+    The day names are resolved once per group instead of once per row.
+
+    Args:
+        dataframe (pd.DataFrame): DataFrame with columns movement_date, sales and profit.
+
+    Returns:
+        pd.DataFrame: DataFrame with columns day_name, Ventas and Ganancias.
+    """
+    weekly = (
+        dataframe.groupby(dataframe["movement_date"].dt.dayofweek, sort=True)[
+            ["sales", "profit"]
+        ].sum()
+        / 1000
+    )
+    return pd.DataFrame(
+        {
+            "day_name": day_names(weekly.index.to_series()),
+            "Ventas": weekly["sales"].to_numpy(),
+            "Ganancias": weekly["profit"].to_numpy(),
+        }
+    )
+
+
+def prepare_donut(dataframe: pd.DataFrame, column_total_amount: str) -> pd.DataFrame:
+    """
+    Keeps only the columns a donut chart embeds, one row per name.
+
+    Args:
+        dataframe (pd.DataFrame): DataFrame with columns 'name' and the amount column.
+        column_total_amount (str): Name of the amount column.
+
+    Returns:
+        pd.DataFrame: DataFrame with columns name and the amount column.
+    """
+    return dataframe.groupby("name", as_index=False, sort=False)[
+        column_total_amount
+    ].sum()
+
+
+def lttb(
+    dataframe: pd.DataFrame, x_column: str, y_column: str, threshold: int
+) -> pd.DataFrame:
+    """
+    Downsamples a time series with the Largest-Triangle-Three-Buckets algorithm.
+
+    The first and last points are always kept, and from every bucket the point
+    that forms the largest triangle with its neighbours is selected, so peaks
+    and valleys survive the downsampling.
+
+    Args:
+        dataframe (pd.DataFrame): DataFrame with the time series.
+        x_column (str): Name of the time (or numeric) column.
+        y_column (str): Name of the value column.
+        threshold (int): Maximum number of points to keep.
+
+    Returns:
+        pd.DataFrame: DataFrame with at most threshold rows.
+    """
+    length = len(dataframe)
+    if threshold >= length or threshold < 3:
+        return dataframe
+
+    dataframe = dataframe.sort_values(x_column)
+    x = dataframe[x_column]
+    if pd.api.types.is_datetime64_any_dtype(x):
+        x = x.astype("int64")
+    x = x.to_numpy(dtype="float64")
+    y = dataframe[y_column].to_numpy(dtype="float64")
+
+    every = (length - 2) / (threshold - 2)
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        # Average point of the next bucket
+        avg_start = int(np.floor((i + 1) * every)) + 1
+        avg_end = min(int(np.floor((i + 2) * every)) + 1, length)
+        avg_x = x[avg_start:avg_end].mean()
+        avg_y = y[avg_start:avg_end].mean()
+
+        # Point of the current bucket with the largest triangle area
+        range_start = int(np.floor(i * every)) + 1
+        range_end = int(np.floor((i + 1) * every)) + 1
+        areas = np.abs(
+            (x[a] - avg_x) * (y[range_start:range_end] - y[a])
+            - (x[a] - x[range_start:range_end]) * (avg_y - y[a])
+        )
+        a = range_start + int(areas.argmax())
+        selected.append(a)
+    selected.append(length - 1)
+
+    return dataframe.iloc[selected]
+
+
+def bucket_others(
+    dataframe: pd.DataFrame,
+    name_column: str,
+    amount_column: str,
+    top_n: int,
+    others_label: str = "Otros",
+) -> pd.DataFrame:
+    """
+    Keeps the top N names and adds the rest into a single "others" row.
+
+    Args:
+        dataframe (pd.DataFrame): DataFrame with one row per name.
+        name_column (str): Name of the column with the names.
+        amount_column (str): Name of the column with the amounts.
+        top_n (int): The number of names to keep.
+        others_label (str): Name of the row with the rest of the amounts.
+
+    Returns:
+        pd.DataFrame: DataFrame with at most top_n + 1 rows.
+    """
+    if len(dataframe) <= top_n:
+        return dataframe
+
+    ordered = dataframe.sort_values(amount_column, ascending=False)
+    top = ordered.head(top_n)[[name_column, amount_column]]
+    others = pd.DataFrame(
+        {
+            name_column: [others_label],
+            amount_column: [ordered[amount_column].iloc[top_n:].sum()],
+        }
+    )
+    return pd.concat([top, others], ignore_index=True)
+
+
+def keep_first_values(
+    dataframe: pd.DataFrame, column: str, threshold: int
+) -> pd.DataFrame:
+    """
+    Keeps the rows of the first values of a column, with all the rows of every
+    value kept, so a heatmap loses whole columns instead of scattered cells.
+
+    Args:
+        dataframe (pd.DataFrame): DataFrame with several rows per value.
+        column (str): Name of the column, e.g. the months since the first purchase.
+        threshold (int): Maximum number of rows to keep, the rows of the first
+            value are kept even if they are more.
+
+    Returns:
+        pd.DataFrame: DataFrame with the rows of the first values.
+    """
+    if len(dataframe) <= threshold:
+        return dataframe
+
+    counts = dataframe[column].value_counts().sort_index()
+    kept = counts.index[counts.cumsum().to_numpy() <= threshold]
+    if kept.empty:
+        kept = counts.index[:1]
+    return dataframe[dataframe[column].isin(kept)]
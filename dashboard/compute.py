@@ -0,0 +1,448 @@
+import os
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Compute engine for the dashboard aggregations: pandas, polars or duckdb
+compute_engine = os.getenv("COMPUTE_ENGINE", "pandas").lower()
+
+ENGINES = ("pandas", "polars", "duckdb")
+
+_duckdb_connection = None
+
+
+def get_engine(engine: str = None) -> str:
+    """
+    Gets the compute engine to use.
+
+    Args:
+        engine (str): The engine requested by the caller (optional).
+
+    Returns:
+        str: The requested engine, or the one configured in COMPUTE_ENGINE.
+    """
+    engine = (engine or compute_engine).lower()
+    if engine not in ENGINES:
+        raise ValueError(f"Motor de cómputo no soportado: {engine}")
+    return engine
+
+
+def get_duckdb_connection():
+    """
+    Returns the in-process DuckDB connection, creating it on first use.
+
+    Returns:
+        duckdb.DuckDBPyConnection: The DuckDB connection.
+    """
+    global _duckdb_connection
+
+    if _duckdb_connection is None:
+        import duckdb  # Optional dependency, only needed for COMPUTE_ENGINE=duckdb
+
+        _duckdb_connection = duckdb.connect()
+    return _duckdb_connection
+
+
+def run_duckdb(query: str, **tables: pd.DataFrame) -> pd.DataFrame:
+    """
+    Runs a query with DuckDB over the given pandas DataFrames.
+
+    Args:
+        query (str): The SQL query, referencing the tables by their keyword names.
+        **tables (pd.DataFrame): The DataFrames to register as tables.
+
+    Returns:
+        pd.DataFrame: The result of the query.
+    """
+    connection = get_duckdb_connection().cursor()
+    try:
+        for name, table in tables.items():
+            connection.register(name, table)
+        return connection.execute(query).df()
+    finally:
+        connection.close()
+
+
+def quote(column: str) -> str:
+    """
+    Quotes a column name for DuckDB.
+
+    Args:
+        column (str): The column name.
+
+    Returns:
+        str: The quoted column name.
+    """
+    return '"' + column.replace('"', '""') + '"'
+
+
+def get_top(
+    filtered_df: pd.DataFrame,
+    group_column: str,
+    mount_column: str,
+    top_n: int,
+    engine: str = None,
+) -> pd.DataFrame:
+    """
+    Filters the top N entries from a DataFrame based on a specified column.
+
+    Args:
+        filtered_df (pd.DataFrame): The DataFrame to filter and sort.
+        group_column (str): The column to group the DataFrame by.
+        mount_column (str): The column whose values are to be summed and sorted.
+        top_n (int): The number of top entries to return.
+        engine (str): The compute engine, defaults to COMPUTE_ENGINE.
+
+    Returns:
+        pd.DataFrame: A DataFrame containing the top N entries with the highest sums in the specified column.
+    """
+    engine = get_engine(engine)
+
+    if engine == "polars":
+        import polars as pl
+
+        df = (
+            pl.from_pandas(filtered_df[[group_column, mount_column]])
+            .lazy()
+            .drop_nulls(group_column)
+            .group_by(group_column)
+            .agg(pl.col(mount_column).sum())
+            .sort(group_column)
+            .with_row_index("__index")
+            .sort(mount_column, descending=True, maintain_order=True)
+            .head(top_n)
+            .collect()
+            .to_pandas()
+        )
+        return df.set_index("__index").rename_axis(None)
+
+    if engine == "duckdb":
+        group, mount = quote(group_column), quote(mount_column)
+        df = run_duckdb(
+            f"""
+            SELECT {group}, COALESCE(SUM({mount}), 0) AS {mount},
+            ROW_NUMBER() OVER (ORDER BY {group}) - 1 AS __index
+            FROM data WHERE {group} IS NOT NULL
+            GROUP BY {group} ORDER BY {mount} DESC, __index LIMIT {int(top_n)}
+            """,
+            data=filtered_df[[group_column, mount_column]],
+        )
+        return df.set_index("__index").rename_axis(None)
+
+    df = (
+        filtered_df.groupby(group_column, as_index=False)[mount_column]
+        .sum()
+        .sort_values(by=mount_column, ascending=False)
+        .head(top_n)
+    )
+    return df
+
+
+def get_top_multiple_agg(
+    filtered_df: pd.DataFrame,
+    group_column: str,
+    mount_column: str,
+    aggregate_column_one: str,
+    aggregate_column_two: str,
+    top_n: int,
+    engine: str = None,
+) -> pd.DataFrame:
+    """
+    Filters the top N entries from a DataFrame based on a specified column and 2 aggregates more.
+
+    Args:
+        filtered_df (pd.DataFrame): The DataFrame to filter and sort.
+        group_column (str): The column to group the DataFrame by.
+        mount_column (str): The column whose values are to be summed and sorted.
+        aggregate_column_one (str): Aggregate mumber one column name.
+        aggregate_column_two (str): Aggregate number two column name.
+        top_n (int): The number of top entries to return.
+        engine (str): The compute engine, defaults to COMPUTE_ENGINE.
+
+    Returns:
+        pd.DataFrame: A DataFrame containing the top N entries with the highest sums in the specified column.
+    """
+    engine = get_engine(engine)
+    sum_columns = [mount_column, aggregate_column_one, aggregate_column_two]
+
+    if engine == "polars":
+        import polars as pl
+
+        df = (
+            pl.from_pandas(filtered_df[[group_column] + sum_columns])
+            .lazy()
+            .drop_nulls(group_column)
+            .group_by(group_column)
+            .agg([pl.col(column).sum() for column in sum_columns])
+            .sort(group_column)
+            .with_row_index("index")
+            .sort(mount_column, descending=True, maintain_order=True)
+            .head(top_n)
+            .collect()
+            .to_pandas()
+        )
+        df.index = df["index"].to_numpy()
+        return df
+
+    if engine == "duckdb":
+        group = quote(group_column)
+        sums = ", ".join(
+            f"COALESCE(SUM({quote(column)}), 0) AS {quote(column)}"
+            for column in sum_columns
+        )
+        df = run_duckdb(
+            f"""
+            SELECT ROW_NUMBER() OVER (ORDER BY {group}) - 1 AS "index", {group}, {sums}
+            FROM data WHERE {group} IS NOT NULL
+            GROUP BY {group} ORDER BY {quote(mount_column)} DESC, "index"
+            LIMIT {int(top_n)}
+            """,
+            data=filtered_df[[group_column] + sum_columns],
+        )
+        df.index = df["index"].to_numpy()
+        return df
+
+    df = (
+        filtered_df.groupby(group_column, as_index=False)
+        .agg(
+            {
+                mount_column: "sum",
+                aggregate_column_one: "sum",
+                aggregate_column_two: "sum",
+            }
+        )
+        .reset_index()
+        .sort_values(by=mount_column, ascending=False)
+        .head(top_n)
+    )
+    return df
+
+
+def calculate_metrics(data: pd.DataFrame, column: str, engine: str = None) -> dict:
+    """
+    Calculates key metrics for a given column in the DataFrame.
+
+    Args:
+        data (pd.DataFrame): The DataFrame containing the data.
+        column (str): The name of the column to calculate metrics for.
+        engine (str): The compute engine, defaults to COMPUTE_ENGINE.
+
+    Returns:
+        dict: A dictionary containing the calculated metrics.
+    """
+    engine = get_engine(engine)
+    has_name = "name" in data
+
+    if engine in ("polars", "duckdb"):
+        if engine == "polars":
+            import polars as pl
+
+            expressions = [
+                pl.col(column).sum().alias("total"),
+                pl.col(column).mean().alias("average"),
+                pl.col(column).median().alias("median"),
+                pl.col(column).max().alias("max"),
+                pl.col(column).min().alias("min"),
+                pl.col(column).count().alias("count"),
+            ]
+            if has_name:
+                expressions.append(
+                    pl.col("name").drop_nulls().n_unique().alias("unique")
+                )
+            columns = [column, "name"] if has_name else [column]
+            row = pl.from_pandas(data[columns]).select(expressions).row(0, named=True)
+        else:
+            value = quote(column)
+            unique = ', COUNT(DISTINCT "name") AS "unique"' if has_name else ""
+            columns = [column, "name"] if has_name else [column]
+            row = run_duckdb(
+                f"""
+                SELECT COALESCE(SUM({value}), 0) AS total, AVG({value}) AS average,
+                MEDIAN({value}) AS median, MAX({value}) AS max, MIN({value}) AS min,
+                COUNT({value}) AS count{unique}
+                FROM data
+                """,
+                data=data[columns],
+            ).iloc[0]
+
+        return {
+            "total": row["total"],
+            "average": np.nan if row["average"] is None else row["average"],
+            "median": np.nan if row["median"] is None else row["median"],
+            "max": np.nan if row["max"] is None else row["max"],
+            "min": np.nan if row["min"] is None else row["min"],
+            # The row of a DuckDB result is a Series, which turns the counts
+            # into floats along with the other metrics
+            "count": int(row["count"]),
+            "unique": int(row["unique"]) if has_name else 0,
+        }
+
+    return {
+        "total": data[column].sum(),
+        "average": data[column].mean(),
+        "median": data[column].median(),
+        "max": data[column].max(),
+        "min": data[column].min(),
+        "count": data[column].count(),
+        "unique": data["name"].nunique() if has_name else 0,
+    }
+
+
+def filter_data(
+    data: pd.DataFrame, year: int, month: int = None, engine: str = None
+) -> pd.DataFrame:
+    """
+    Filters data by year and optionally by month.
+
+    The polars and duckdb engines only compute the row mask, so the filtered
+    DataFrame keeps the same index and columns as with pandas.
+
+    Args:
+        data (pd.DataFrame): The DataFrame to filter.
+        year (int): The year to filter by.
+        month (int): The month to filter by (optional).
+        engine (str): The compute engine, defaults to COMPUTE_ENGINE.
+
+    Returns:
+        pd.DataFrame: The filtered DataFrame.
+    """
+    engine = get_engine(engine)
+
+    if engine == "polars":
+        import polars as pl
+
+        condition = pl.col("year_concept") == year
+        if month is not None:
+            condition = condition & (pl.col("month_concept") == month)
+        columns = (
+            ["year_concept", "month_concept"] if month is not None else ["year_concept"]
+        )
+        mask = (
+            pl.from_pandas(data[columns])
+            .select(condition.fill_null(False).alias("mask"))
+            .to_series()
+            .to_numpy()
+        )
+        return data[mask]
+
+    if engine == "duckdb":
+        condition = f'"year_concept" = {int(year)}'
+        if month is not None:
+            condition += f' AND "month_concept" = {int(month)}'
+        columns = (
+            ["year_concept", "month_concept"] if month is not None else ["year_concept"]
+        )
+        mask = run_duckdb(
+            f"SELECT COALESCE({condition}, FALSE) AS mask FROM data",
+            data=data[columns],
+        )["mask"].to_numpy(dtype=bool)
+        return data[mask]
+
+    if month is not None:
+        return data[(data["year_concept"] == year) & (data["month_concept"] == month)]
+    return data[data["year_concept"] == year]
+
+
+def monthly_sales_vs_profits(
+    sales: pd.DataFrame,
+    gross_profit: pd.DataFrame,
+    year: int,
+    month: int,
+    engine: str = None,
+) -> pd.DataFrame:
+    """
+    Adds sales and gross profit by month for a year, up to a month.
+
+    Args:
+        sales (pd.DataFrame): DataFrame with columns month_concept, year_concept and total_sales.
+        gross_profit (pd.DataFrame): DataFrame with columns month_concept, year_concept and total_gpm.
+        year (int): The year to filter by.
+        month (int): The last month to include.
+        engine (str): The compute engine, defaults to COMPUTE_ENGINE.
+
+    Returns:
+        pd.DataFrame: DataFrame with columns year_concept, month_concept, total_sales and total_gpm.
+    """
+    engine = get_engine(engine)
+    keys = ["year_concept", "month_concept"]
+
+    if engine == "polars":
+        import polars as pl
+
+        def monthly(df: pd.DataFrame, column: str):
+            return (
+                pl.from_pandas(df[keys + [column]])
+                .lazy()
+                .filter(
+                    (pl.col("year_concept") == year)
+                    & (pl.col("month_concept") <= month)
+                )
+                .group_by(keys)
+                .agg(pl.col(column).sum())
+            )
+
+        return (
+            monthly(sales, "total_sales")
+            .join(monthly(gross_profit, "total_gpm"), on=keys, how="inner")
+            .sort(keys)
+            .collect()
+            .to_pandas()
+        )
+
+    if engine == "duckdb":
+        return run_duckdb(
+            f"""
+            WITH s AS (
+                SELECT year_concept, month_concept, SUM(total_sales) AS total_sales
+                FROM sales
+                WHERE year_concept = {int(year)} AND month_concept <= {int(month)}
+                GROUP BY year_concept, month_concept
+            ), g AS (
+                SELECT year_concept, month_concept, SUM(total_gpm) AS total_gpm
+                FROM gross_profit
+                WHERE year_concept = {int(year)} AND month_concept <= {int(month)}
+                GROUP BY year_concept, month_concept
+            )
+            SELECT s.year_concept, s.month_concept, s.total_sales, g.total_gpm
+            FROM s INNER JOIN g
+            ON s.year_concept = g.year_concept AND s.month_concept = g.month_concept
+            ORDER BY s.year_concept, s.month_concept
+            """,
+            sales=sales[keys + ["total_sales"]],
+            gross_profit=gross_profit[keys + ["total_gpm"]],
+        )
+
+    # Group and add sales
+    sales_grouped = (
+        sales[keys + ["total_sales"]]
+        .groupby(keys, as_index=False)
+        .agg({"total_sales": "sum"})
+    )
+
+    # Group and add profits
+    profits_grouped = (
+        gross_profit[keys + ["total_gpm"]]
+        .groupby(keys, as_index=False)
+        .agg({"total_gpm": "sum"})
+    )
+
+    # Filter by year and months to the month
+    sales_filtered = sales_grouped[
+        (sales_grouped["year_concept"] == year)
+        & (sales_grouped["month_concept"] <= month)
+    ]
+    profits_filtered = profits_grouped[
+        (profits_grouped["year_concept"] == year)
+        & (profits_grouped["month_concept"] <= month)
+    ]
+
+    # Combine DataFrames into one
+    return pd.merge(
+        sales_filtered,
+        profits_filtered,
+        on=["month_concept", "year_concept"],
+        how="inner",
+    )
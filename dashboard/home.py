@@ -1,8 +1,8 @@
 import os
 from datetime import datetime
 
-import numpy as np  # noqa: F401
-import pandas as pd  # noqa: F401
+import compute
+import pandas as pd
 import streamlit as st
 import utilities
 from dotenv import load_dotenv
@@ -36,94 +36,50 @@ utilities.render_header(name_of_company, st.session_state["name"], logo_base64)
 
 # Get data from database
 data = utilities.get_data(database_number, year, month)
+utilities.render_data_as_of(database_number)
 with st.container():
     st.markdown("<hr>", unsafe_allow_html=True)
 
+# Get the KPIs of the period and their deltas against the previous period
+kpis = utilities.fetch_kpis(database_number, year, month)
+
 # Get metrics
 with st.container():
     col1, col2, col3, col4 = st.columns(4)
     with col1:
         if data["sales"]["has_data"]:
-            delta_sales = None
-            sales_array_filtered_previous = None
-
-            delta_sales = utilities.get_delta(
-                month,
-                year,
-                data["sales"]["sales_array"],
-                "total_sales",
-                data["sales"]["total"],
-                1000,
-                "sum",
-            )
             utilities.get_metric(
                 ":material/sell: Total Ventas",
-                data["sales"]["total"],
+                kpis["sales"]["current"],
                 "K",
-                delta_sales,
+                utilities.get_kpi_delta(kpis["sales"], year, 1000),
                 1000,
             )
     with col2:
         if data["gross_profit_margin"]["has_data"]:
-            delta_gross_profit_margin = None
-            gross_profit_margin_array_filtered_previous = None
-
-            delta_gross_profit_margin = utilities.get_delta(
-                month,
-                year,
-                data["gross_profit_margin"]["gross_profit_margin_array"],
-                "total_gpm",
-                data["gross_profit_margin"]["total"],
-                1000,
-                "sum",
-            )
             utilities.get_metric(
                 ":material/attach_money: Total Ganancias",
-                data["gross_profit_margin"]["total"],
+                kpis["gross_profit"]["current"],
                 "K",
-                delta_gross_profit_margin,
+                utilities.get_kpi_delta(kpis["gross_profit"], year, 1000),
                 1000,
             )
     with col3:
         if data["products"]["has_data"]:
-            delta_products = None
-            sales_by_product_array_filtered_previous = None
-
-            delta_products = utilities.get_delta(
-                month,
-                year,
-                data["products"]["products_array"],
-                "total_qty",
-                data["products"]["total"],
-                1,
-                "sum",
-            )
             utilities.get_metric(
                 ":material/shopping_bag: Total Productos vendidos",
-                data["products"]["total"],
+                kpis["products_sold"]["current"],
                 "",
-                delta_products,
+                utilities.get_kpi_delta(kpis["products_sold"], year, 1),
                 1,
             )
     with col4:
         if data["sales_by_clients"]["has_data"]:
-            delta_clients = None
-            sales_array_filtered_previous = None
-
-            delta_clients = utilities.get_delta(
-                month,
-                year,
-                data["sales_by_clients"]["sales_by_clients_array"],
-                "name",
-                data["sales_by_clients"]["unique"],
-                1,
-                "nunique",
-            )
             utilities.get_metric(
                 ":material/group: Total Clientes",
-                data["sales_by_clients"]["unique"],
+                kpis["clients"]["current"],
                 "",
-                delta_clients,
+                utilities.get_kpi_delta(kpis["clients"], year, 1),
                 1,
             )
 
@@ -132,86 +88,38 @@ with st.container():
     col1, col2, col3, col4 = st.columns(4)
     with col1:
         if data["sellers"]["has_data"]:
-            delta_sellers = None
-            sales_by_seller_array_filtered_previous = None
-
-            delta_sellers = utilities.get_delta(
-                month,
-                year,
-                data["sellers"]["sellers_array"],
-                "name",
-                data["sellers"]["unique"],
-                1,
-                "nunique",
-            )
             utilities.get_metric(
                 ":material/groups: Total Vendedores",
-                data["sellers"]["unique"],
+                kpis["sellers"]["current"],
                 "",
-                delta_sellers,
+                utilities.get_kpi_delta(kpis["sellers"], year, 1),
                 1,
             )
     with col2:
         if data["purchases"]["has_data"]:
-            delta_purchases = None
-            purchases_array_filtered_previous = None
-
-            delta_purchases = utilities.get_delta(
-                month,
-                year,
-                data["purchases"]["purchases_array"],
-                "total_purchases",
-                data["purchases"]["total"],
-                1000,
-                "sum",
-            )
             utilities.get_metric(
                 ":material/shopping_cart: Total Compras",
-                data["purchases"]["total"],
+                kpis["purchases"]["current"],
                 "K",
-                delta_purchases,
+                utilities.get_kpi_delta(kpis["purchases"], year, 1000),
                 1000,
             )
     with col3:
         if data["goods"]["has_data"]:
-            delta_goods = None
-            purchases_by_product_array_filtered_previous = None
-
-            delta_goods = utilities.get_delta(
-                month,
-                year,
-                data["goods"]["goods_array"],
-                "total_qty",
-                data["goods"]["total"],
-                1,
-                "sum",
-            )
             utilities.get_metric(
                 ":material/shop_two: Total Mercancia comprada",
-                data["goods"]["total"],
+                kpis["goods"]["current"],
                 "",
-                delta_goods,
+                utilities.get_kpi_delta(kpis["goods"], year, 1),
                 1,
             )
     with col4:
         if data["purchases"]["has_data"]:
-            delta_providers = None
-            purchases_array_filtered_previous = None
-
-            delta_providers = utilities.get_delta(
-                month,
-                year,
-                data["purchases"]["purchases_array"],
-                "name",
-                data["purchases"]["unique"],
-                1,
-                "nunique",
-            )
             utilities.get_metric(
                 ":material/partner_exchange: Total Proveedores",
-                data["purchases"]["unique"],
+                kpis["providers"]["current"],
                 "",
-                delta_providers,
+                utilities.get_kpi_delta(kpis["providers"], year, 1),
                 1,
             )
 
@@ -224,43 +132,15 @@ style_metric_cards("#00")
 current_year = year
 current_month = month if month is not None else 12
 
-sales_array_filtered = data["sales"]["sales_array"][
-    ["month_concept", "year_concept", "total_sales"]
-]
-gross_profit_array_filtered = data["gross_profit_margin"]["gross_profit_margin_array"][
-    ["month_concept", "year_concept", "total_gpm"]
-]
-
-# Group and add sales
-sales_grouped = sales_array_filtered.groupby(
-    ["year_concept", "month_concept"], as_index=False
-).agg({"total_sales": "sum"})
-
-# Group and add profits
-profits_grouped = gross_profit_array_filtered.groupby(
-    ["year_concept", "month_concept"], as_index=False
-).agg({"total_gpm": "sum"})
-
-# Filter by current year and months to current month
-sales_filtered = sales_grouped[
-    (sales_grouped["year_concept"] == current_year)
-    & (sales_grouped["month_concept"] <= current_month)
-]
-
-profits_filtered = profits_grouped[
-    (profits_grouped["year_concept"] == current_year)
-    & (profits_grouped["month_concept"] <= current_month)
-]
-
-# Combine DataFrames into one
-combined_df = pd.merge(
-    sales_filtered,
-    profits_filtered,
-    on=["month_concept", "year_concept"],
-    how="inner",
+# Group, filter up to the current month and combine sales and profits
+combined_df = compute.monthly_sales_vs_profits(
+    data["sales"]["sales_array"],
+    data["gross_profit_margin"]["gross_profit_margin_array"],
+    current_year,
+    current_month,
 )
 
-sales_vs_profits_array = utilities.fetch_dashboard_data(
+sales_vs_profits_array = utilities.load_dashboard_data(
     "sales-vs-profit", database_number
 )
 
@@ -286,6 +166,34 @@ with st.container():
         else:
             st.altair_chart(chart, use_container_width=True)  # Render the graph
 
+# Forecasts of the next months, fitted by the API over the closed months
+forecasts = utilities.fetch_forecast(database_number)
+with st.container():
+    col1, col2 = st.columns(2)
+    for column, (metric, dataframe, amount_column, title) in zip(
+        (col1, col2),
+        [
+            ("sales", data["sales"]["sales_array"], "total_sales", "Ventas"),
+            (
+                "gross_profit",
+                data["gross_profit_margin"]["gross_profit_margin_array"],
+                "total_gpm",
+                "Ganancias",
+            ),
+        ],
+    ):
+        with column:
+            if metric in forecasts and not dataframe.empty:
+                st.altair_chart(
+                    utilities.build_forecast_chart(
+                        dataframe,
+                        amount_column,
+                        forecasts[metric],
+                        f"Pronóstico de {title}",
+                    ),
+                    use_container_width=True,
+                )
+
 with st.container():
     top_clients_filtered = data["sales"]["sales_array_filtered"][
         ["name", "total_sales"]
@@ -333,8 +241,18 @@ with st.container():
         number_of_entries,
     )
     with col1:
-        utilities.generate_donut_chart(top_lines, "Líneas", "Línea", "sales")
+        # A click on a line shows its products and their invoices below
+        selected_line = utilities.generate_donut_chart(
+            top_lines, "Líneas", "Línea", "sales", key="lines_donut"
+        )
     with col2:
         utilities.generate_donut_chart(
             top_products, "Productos", "Producto", "qty", False
         )
+
+# Drill-down from the selected line to its products and invoices
+if selected_line is not None:
+    utilities.render_drill_down(database_number, selected_line, year, month)
+
+# Atypical days of the daily sales and profits of the period
+utilities.render_anomalies(database_number, year, month)
@@ -0,0 +1,434 @@
+"""
+Batch generator of the dashboard reports, one HTML file per company and period.
+
+A report has the KPIs and charts of the Home page and the tables of the Tops
+page, built with the same functions of utilities.py but without Streamlit: the
+Altair charts are rendered as SVG by vl-convert and embedded in the file with
+the tables, so a report opens offline and prints to PDF from the browser.
+
+The datasets of every company are fetched from the API once, by this process,
+and the reports are rendered in parallel by a pool of worker processes. Every
+worker loads the datasets of a company once for all its periods.
+
+Usage:
+    python reports.py
+    python reports.py --periods 2024-01 2024-02 2024 --db-numbers 1 2 --workers 4
+"""
+
+import argparse
+import html
+import logging
+import os
+import pickle
+import re
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import chart_data
+import compute
+import pandas as pd
+import utilities
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Folder of the generated reports and number of processes that render them
+report_dir = os.getenv("REPORT_DIR", "reports")
+report_workers = int(os.getenv("REPORT_WORKERS", "0")) or os.cpu_count()
+
+# The charts embed their data, the url mode needs the static files of Streamlit
+utilities.chart_data_mode = "inline"
+# Streamlit warns on every call outside of its runtime
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+# KPIs of the report like the metrics of the Home page: title, KPI name, label,
+# divisor and the dataset that must have data
+REPORT_METRICS = [
+    ("Total Ventas", "sales", "K", 1000, "sales"),
+    ("Total Ganancias", "gross_profit", "K", 1000, "gross_profit_margin"),
+    ("Total Productos vendidos", "products_sold", "", 1, "products"),
+    ("Total Clientes", "clients", "", 1, "sales_by_clients"),
+    ("Total Vendedores", "sellers", "", 1, "sellers"),
+    ("Total Compras", "purchases", "K", 1000, "purchases"),
+    ("Total Mercancia comprada", "goods", "", 1, "goods"),
+    ("Total Proveedores", "providers", "", 1, "purchases"),
+]
+
+# Donut charts of the report like the Home page: dataset, amount column, title,
+# tooltip title and whether the amounts are money
+REPORT_DONUTS = [
+    ("sales", "total_sales", "Clientes", "Cliente", True),
+    ("sales_by_towns", "total_sales", "Municipios", "Municipio", True),
+    ("sales_by_lines", "sales", "Líneas", "Línea", True),
+    ("sales_by_products", "qty", "Productos", "Producto", False),
+]
+
+# Tables of the report like the Tops page: dataset, header and subject title
+REPORT_TABLES = [
+    ("sales_by_lines", "Top de Líneas", "Línea"),
+    ("sales_by_products", "Top de Productos", "Producto"),
+    ("sales_by_clients", "Top de Clientes", "Cliente"),
+    ("sales_and_profits_by_towns", "Top de Municipios", "Municipio/Delegación"),
+    ("sales_and_profits_by_sellers", "Top de Vendedores", "Vendedor"),
+]
+
+REPORT_STYLE = """
+body { font-family: sans-serif; margin: 2em; color: #222; }
+h1 { margin-bottom: 0; }
+.metrics { display: grid; grid-template-columns: repeat(4, 1fr); gap: 1em; }
+.metric { border-left: 4px solid #FFDDC1; padding: 0.5em 1em; }
+.metric .value { font-size: 1.6em; }
+.up { color: #09AB3B; }
+.down { color: #FF2B2B; }
+.charts { display: flex; flex-wrap: wrap; gap: 1em; }
+.warning { background: #FFFCE5; padding: 1em; }
+table { border-collapse: collapse; margin-bottom: 2em; }
+th, td { padding: 0.3em 0.8em; text-align: right; }
+td:nth-child(2), th:nth-child(2) { text-align: left; }
+@media print { .charts { page-break-inside: avoid; } }
+"""
+
+# Datasets of the company loaded by a worker process, reused for its periods
+_company = {"path": None, "data": None}
+
+
+def parse_periods(values: list) -> list:
+    """
+    Parses the periods of the reports, the previous month if there are none.
+
+    Args:
+        values (list): The periods, "YYYY-MM" for a month or "YYYY" for a year.
+
+    Returns:
+        list: The (year, month) pairs, the month is None for a whole year.
+
+    Raises:
+        ValueError: If a period is not valid.
+    """
+    if not values:
+        today = date.today()
+        if today.month == 1:
+            return [(today.year - 1, 12)]
+        return [(today.year, today.month - 1)]
+
+    periods = []
+    for value in values:
+        match = re.fullmatch(r"(\d{4})(?:-(\d{1,2}))?", value)
+        if match is None or (match[2] and not 1 <= int(match[2]) <= 12):
+            raise ValueError(f"Periodo no válido: {value}, use AAAA-MM o AAAA")
+        periods.append((int(match[1]), int(match[2]) if match[2] else None))
+    return periods
+
+
+def get_period_label(year: int, month: int = None) -> str:
+    """
+    Gets the label of a period, e.g. "Marzo 2024".
+
+    Args:
+        year (int): The year of the period.
+        month (int): The month of the period (optional).
+
+    Returns:
+        str: The label.
+    """
+    if month is None:
+        return f"Año {year}"
+    return f"{chart_data.MONTH_NAMES[month - 1]} {year}"
+
+
+def fetch_company(db_number: int, periods: list, data_dir: str) -> str:
+    """
+    Fetches every dataset of a company and the KPIs of the periods from the API,
+    and saves them for the worker processes.
+
+    Args:
+        db_number (int): The database number.
+        periods (list): The (year, month) pairs of the reports.
+        data_dir (str): The folder of the saved datasets.
+
+    Returns:
+        str: The path of the saved datasets.
+    """
+    endpoints = [endpoint for endpoint, _, _ in utilities.DASHBOARD_DATASETS.values()]
+    datasets = {
+        endpoint: utilities.request_dashboard_data(endpoint, db_number)
+        for endpoint in endpoints + ["sales-vs-profit"]
+    }
+    kpis = {
+        (year, month): utilities.request_kpis(db_number, year, month)
+        for year, month in periods
+    }
+
+    path = os.path.join(data_dir, f"company_{db_number:02d}.pkl")
+    with open(path, "wb") as file:
+        pickle.dump({"datasets": datasets, "kpis": kpis}, file, pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def load_company(path: str) -> dict:
+    """
+    Loads the saved datasets of a company, once per worker process.
+
+    Args:
+        path (str): The path of the saved datasets.
+
+    Returns:
+        dict: The datasets, keyed by endpoint, and the KPIs of the periods.
+    """
+    if _company["path"] != path:
+        with open(path, "rb") as file:
+            company = pickle.load(file)
+        sales_vs_profit = company["datasets"]["sales-vs-profit"]
+        if not sales_vs_profit.empty:
+            sales_vs_profit["movement_date"] = pd.to_datetime(
+                sales_vs_profit["movement_date"], errors="coerce"
+            )
+            company["datasets"]["sales-vs-profit"] = sales_vs_profit.dropna(
+                subset=["movement_date"]
+            )
+        _company.update(path=path, data=company)
+    return _company["data"]
+
+
+def render_chart(chart) -> str:
+    """
+    Renders an Altair chart as an SVG element, or the message of a missing chart.
+
+    Args:
+        chart (alt.Chart or str): The chart, or the message if there is no data.
+
+    Returns:
+        str: The HTML of the chart.
+    """
+    import vl_convert  # Only needed for the reports
+
+    if isinstance(chart, str):
+        return f'<p class="warning">{html.escape(chart)}</p>'
+    return f"<div>{vl_convert.vegalite_to_svg(chart.to_json())}</div>"
+
+
+def render_metrics(data: dict, kpis: dict, year: int) -> str:
+    """
+    Renders the KPIs of a period with their deltas against the previous period.
+
+    Args:
+        data (dict): The processed data of the period, from utilities.get_data.
+        kpis (dict): The KPIs of the period, from the API.
+        year (int): The year of the period.
+
+    Returns:
+        str: The HTML of the KPIs.
+    """
+    metrics = []
+    for title, name, label, divisor, dataset in REPORT_METRICS:
+        if not data[dataset]["has_data"]:
+            continue
+        value = utilities.format_metric_value(kpis[name]["current"], label, divisor)
+        delta = utilities.get_kpi_delta(kpis[name], year, divisor)
+        delta_html = (
+            f'<div class="{"down" if delta < 0 else "up"}">{delta} %</div>'
+            if delta is not None
+            else ""
+        )
+        metrics.append(
+            f'<div class="metric"><div>{html.escape(title)}</div>'
+            f'<div class="value">{html.escape(value)}</div>{delta_html}</div>'
+        )
+    return f'<div class="metrics">{"".join(metrics)}</div>'
+
+
+def get_last_week(sales_vs_profit: pd.DataFrame, year: int, month: int = None):
+    """
+    Gets the daily sales and profits of the last week with data of a period.
+
+    Args:
+        sales_vs_profit (pd.DataFrame): The daily sales and profits.
+        year (int): The year of the period.
+        month (int): The month of the period (optional).
+
+    Returns:
+        pd.DataFrame: The rows of the week, from Monday to the last day with data.
+    """
+    if sales_vs_profit.empty:
+        return sales_vs_profit
+    dates = sales_vs_profit["movement_date"]
+    period = dates.dt.year == year
+    if month is not None:
+        period = period & (dates.dt.month == month)
+    period_data = sales_vs_profit[period]
+    if period_data.empty:
+        return period_data
+    last_day = period_data["movement_date"].max().normalize()
+    week_start = last_day - pd.Timedelta(days=last_day.weekday())
+    return period_data[period_data["movement_date"] >= week_start].copy()
+
+
+def render_report(
+    db_number: int, year: int, month: int, path: str, output_dir: str
+) -> tuple:
+    """
+    Renders the report of a company and period as an HTML file.
+
+    Args:
+        db_number (int): The database number.
+        year (int): The year of the period.
+        month (int): The month of the period, None for the whole year.
+        path (str): The path of the saved datasets of the company.
+        output_dir (str): The folder of the reports.
+
+    Returns:
+        tuple: The path of the report and the seconds it took.
+    """
+    start = time.perf_counter()
+    company = load_company(path)
+    datasets = company["datasets"]
+    data = utilities.get_data(db_number, year, month, datasets)
+
+    # Charts of the Home page
+    combined_df = compute.monthly_sales_vs_profits(
+        data["sales"]["sales_array"],
+        data["gross_profit_margin"]["gross_profit_margin_array"],
+        year,
+        month if month is not None else 12,
+    )
+    last_week = get_last_week(datasets["sales-vs-profit"], year, month)
+    charts = [
+        utilities.build_sales_vs_profits_chart(combined_df),
+        (
+            utilities.create_weekly_stacked_chart(last_week, filter_current_week=False)
+            if not last_week.empty
+            else "No hay datos disponibles para el rango seleccionado."
+        ),
+    ]
+    for dataset, column, title, tooltip_title, is_amount in REPORT_DONUTS:
+        top = utilities.get_top(
+            data[dataset][f"{dataset}_array_filtered"],
+            "name",
+            column,
+            utilities.number_of_entries,
+        )
+        charts.append(
+            utilities.build_donut_chart(top, title, tooltip_title, column, is_amount)
+        )
+
+    # Tables of the Tops page
+    tables = []
+    for dataset, header, subject in REPORT_TABLES:
+        top = utilities.get_top_multiple_agg(
+            data[dataset][f"{dataset}_array_filtered"],
+            "name",
+            "sales",
+            "profit",
+            "qty",
+            utilities.number_of_entries,
+        )
+        column_map = {
+            "name": subject,
+            "sales": "Venta",
+            "profit": "Ganancia",
+            "qty": "Cantidad",
+        }
+        tables.append(
+            f"<h2>{html.escape(header)}</h2>"
+            + utilities.format_table(top, column_map).to_html()
+        )
+
+    company_name = os.getenv(f"COMPANY_NAME_{db_number}") or f"Empresa {db_number}"
+    period_label = get_period_label(year, month)
+    document = (
+        '<!DOCTYPE html><html lang="es"><head><meta charset="utf-8">'
+        f"<title>{html.escape(company_name)} - {period_label}</title>"
+        f"<style>{REPORT_STYLE}</style></head><body>"
+        f"<h1>{html.escape(company_name)}</h1><h3>{period_label}</h3>"
+        + render_metrics(data, company["kpis"][(year, month)], year)
+        + '<div class="charts">'
+        + "".join(render_chart(chart) for chart in charts)
+        + "</div>"
+        + "".join(tables)
+        + "</body></html>"
+    )
+
+    period = f"{year}" if month is None else f"{year}-{month:02d}"
+    report_path = os.path.join(output_dir, f"reporte_{db_number:02d}_{period}.html")
+    with open(report_path, "w", encoding="utf-8") as file:
+        file.write(document)
+    return report_path, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--periods", nargs="*", help="AAAA-MM o AAAA, el mes anterior por omisión"
+    )
+    parser.add_argument(
+        "--db-numbers",
+        type=int,
+        nargs="*",
+        default=list(range(1, utilities.number_of_databases + 1)),
+    )
+    parser.add_argument("--workers", type=int, default=report_workers)
+    parser.add_argument("--output-dir", default=report_dir)
+    args = parser.parse_args()
+
+    try:
+        periods = parse_periods(args.periods)
+    except ValueError as e:
+        parser.error(str(e))
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    data_dir = tempfile.mkdtemp(prefix="dashboard_reports_")
+    try:
+        # One fetch of the datasets per company, shared by all its periods
+        start = time.perf_counter()
+        paths = {}
+        for db_number in args.db_numbers:
+            try:
+                paths[db_number] = fetch_company(db_number, periods, data_dir)
+            except Exception as e:
+                print(
+                    f"Error al obtener los datos de la empresa {db_number}: {e}",
+                    flush=True,
+                )
+        fetch_seconds = time.perf_counter() - start
+
+        # The tasks of a company are consecutive, so a worker reuses its datasets
+        start = time.perf_counter()
+        generated = 0
+        with ProcessPoolExecutor(max_workers=max(args.workers, 1)) as executor:
+            futures = {
+                executor.submit(
+                    render_report, db_number, year, month, path, args.output_dir
+                ): (db_number, year, month)
+                for db_number, path in paths.items()
+                for year, month in periods
+            }
+            for future, (db_number, year, month) in futures.items():
+                try:
+                    report_path, seconds = future.result()
+                except Exception as e:
+                    print(
+                        f"Error al generar el reporte de la empresa {db_number} "
+                        f"de {get_period_label(year, month)}: {e}",
+                        flush=True,
+                    )
+                    continue
+                generated += 1
+                print(f"  {report_path:<48} {seconds * 1000:>8.1f}ms", flush=True)
+        render_seconds = time.perf_counter() - start
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    print(
+        f"{generated} reporte(s) de {len(paths)} empresa(s) con "
+        f"{max(args.workers, 1)} proceso(s): datos en {fetch_seconds:.1f}s, "
+        f"generación en {render_seconds:.1f}s "
+        f"({generated / render_seconds if render_seconds else 0:.1f} reportes/s)",
+        flush=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,6 @@
 import os
 from datetime import datetime
 
-import numpy as np  # noqa: F401
-import pandas as pd  # noqa: F401
 import streamlit as st
 import utilities
 from dotenv import load_dotenv
@@ -36,6 +34,7 @@ utilities.render_header(name_of_company, st.session_state["name"], logo_base64)
 
 # Get data from database
 data = utilities.get_data(database_number, year, month)
+utilities.render_data_as_of(database_number)
 
 with st.container():
     st.markdown("<hr>", unsafe_allow_html=True)
@@ -128,3 +127,11 @@ with st.container():
                 1000,
             )
     style_metric_cards("#00")
+
+# Download the monthly rows of the period
+st.subheader("Ventas mensuales")
+utilities.render_export_buttons("sales", database_number, year, month)
+
+# Retention of the clients by the month of their first purchase
+st.subheader("Retención de clientes")
+utilities.render_cohorts(database_number, year)
@@ -1,8 +1,6 @@
 import os
 from datetime import datetime
 
-import numpy as np  # noqa: F401
-import pandas as pd  # noqa: F401
 import streamlit as st
 import utilities
 from dotenv import load_dotenv
@@ -35,6 +33,7 @@ utilities.render_header(name_of_company, st.session_state["name"], logo_base64)
 
 # Get data from database
 data = utilities.get_data(database_number, year, month)
+utilities.render_data_as_of(database_number)
 
 with st.container():
     st.markdown("<hr>", unsafe_allow_html=True)
@@ -65,6 +64,9 @@ column_map = {
 st.header("Top de Líneas")
 with st.container():
     utilities.create_table(top_lines, column_map)
+    utilities.render_export_buttons(
+        "sales-by-lines", database_number, year, month, number_of_entries
+    )
 
 # Obtain the top products table
 top_products_filtered = data["sales_by_products"]["sales_by_products_array_filtered"][
@@ -88,6 +90,9 @@ column_map_products = {
 st.header("Top de Productos")
 with st.container():
     utilities.create_table(top_products, column_map_products)
+    utilities.render_export_buttons(
+        "sales-by-products", database_number, year, month, number_of_entries
+    )
 
 # Obtain the top clients table
 top_clients_filtered = data["sales_by_clients"]["sales_by_clients_array_filtered"][
@@ -111,6 +116,9 @@ column_map_clients = {
 st.header("Top de Clientes")
 with st.container():
     utilities.create_table(top_clients, column_map_clients)
+    utilities.render_export_buttons(
+        "sales-by-clients", database_number, year, month, number_of_entries
+    )
 
 # Obtain the top towns table
 top_towns_filtered = data["sales_and_profits_by_towns"][
@@ -134,6 +142,9 @@ column_map_towns = {
 st.header("Top de Municipios")
 with st.container():
     utilities.create_table(top_towns, column_map_towns)
+    utilities.render_export_buttons(
+        "sales-and-profits-by-towns", database_number, year, month, number_of_entries
+    )
 
 # Obtain the top sellers table
 top_sellers_filtered = data["sales_and_profits_by_sellers"][
@@ -157,3 +168,13 @@ column_map_sellers = {
 st.header("Top de Vendedores")
 with st.container():
     utilities.create_table(top_sellers, column_map_sellers)
+    utilities.render_export_buttons(
+        "sales-and-profits-by-sellers", database_number, year, month, number_of_entries
+    )
+
+# ABC classification of every product and client, not only the top ones
+st.header("Análisis ABC")
+with st.container():
+    utilities.render_abc(database_number, "products", "Productos", year, month)
+with st.container():
+    utilities.render_abc(database_number, "clients", "Clientes", year, month)
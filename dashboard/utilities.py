@@ -1,9 +1,15 @@
 import base64
+import glob
+import hashlib
 import os
+import threading
+import time
 from datetime import datetime
+from urllib.parse import urlencode
 
 import altair as alt
-import matplotlib.pyplot as plt
+import chart_data
+import compute
 import pandas as pd
 import requests
 import streamlit as st
@@ -19,6 +25,25 @@ final_year = datetime.now().year
 number_of_databases = int(os.getenv("NUMBER_OF_DATABASES"))
 number_of_entries = int(os.getenv("TOP_N"))
 
+# Data loading mode: "cache" (st.cache_data), "swr" (stale-while-revalidate) or
+# "local" (memory-mapped Arrow snapshots of the backend on the same host)
+data_loading_mode = os.getenv("DATA_LOADING_MODE", "cache").lower()
+# Directory of the snapshots written by backend/snapshots.py, for the local mode
+snapshot_dir = os.getenv("SNAPSHOT_DIR", "")
+# Default staleness limits (in seconds) for the stale-while-revalidate mode
+swr_max_staleness = int(os.getenv("SWR_MAX_STALENESS", "3600"))
+swr_hard_expiry = int(os.getenv("SWR_HARD_EXPIRY", "86400"))
+
+# Chart data budget: max points embedded per chart and how the data is embedded
+max_chart_points = int(os.getenv("MAX_CHART_POINTS", "1000"))
+chart_data_mode = os.getenv("CHART_DATA_MODE", "inline").lower()
+chart_url_min_rows = int(os.getenv("CHART_URL_MIN_ROWS", "500"))
+chart_static_dir = os.path.join(os.path.dirname(__file__), "static", "chart_data")
+
+# URL of the API as seen from the browser, the exports are downloaded from it
+# directly instead of going through the Streamlit process
+export_base_url = os.getenv("EXPORT_BASE_URL", base_url)
+
 
 # Convert local image to base64
 def image_to_base64(image_path: str) -> str:
@@ -74,10 +99,8 @@ def render_header(company_name: str, user_name: str, logo_base64: str):
         )
 
 
-# Function to get data from the API
-@st.cache_data(ttl=3600, show_spinner="Obteniendo datos de API")
-def fetch_dashboard_data(endpoint: str, db_number: int) -> pd.DataFrame:
-    """Fetches data from the dashboard API and returns it as a pandas DataFrame.
+def request_dashboard_data(endpoint: str, db_number: int) -> pd.DataFrame:
+    """Requests data from the dashboard API without any caching.
 
     Args:
         endpoint (str): The API endpoint to fetch data from.
@@ -92,6 +115,386 @@ def fetch_dashboard_data(endpoint: str, db_number: int) -> pd.DataFrame:
     return pd.DataFrame(data)  # Convert the data list into a DataFrame
 
 
+def request_dashboard_sync(
+    endpoint: str, db_number: int, since_version: str = None
+) -> dict:
+    """Requests the rows of a dataset that changed since a previous sync.
+
+    Args:
+        endpoint (str): The API endpoint of the dataset.
+        db_number (int): The database number to fetch data from.
+        since_version (str): The version token of the previous sync, the whole
+            dataset is requested if it's None.
+
+    Returns:
+        dict: The new version token ("version"), the first period of the rows
+        sent ("since_period", None for the whole dataset) and the rows ("data").
+    """
+    params = {"db_number": db_number}
+    if since_version is not None:
+        params["since_version"] = since_version
+    response = requests.get(f"{base_url}/sync/{endpoint}/", params=params)
+    response.raise_for_status()
+    payload = response.json()
+    return {
+        "version": payload["version"],
+        "since_period": payload["since_period"],
+        "data": pd.DataFrame(payload["rows"]),
+    }
+
+
+def merge_dashboard_delta(
+    data: pd.DataFrame, delta: pd.DataFrame, since_period: str
+) -> pd.DataFrame:
+    """
+    Merges the rows of a sync into a cached dataset.
+
+    The rows of the dataset from since_period onwards are replaced by the rows
+    of the sync, the closed periods before it are kept.
+
+    Args:
+        data (pd.DataFrame): The cached dataset.
+        delta (pd.DataFrame): The rows of the sync.
+        since_period (str): The first period (YYYY-MM) of the sync, the whole
+            dataset is replaced if it's None.
+
+    Returns:
+        pd.DataFrame: The merged dataset.
+    """
+    if since_period is None or data.empty:
+        return delta
+
+    year, month = (int(part) for part in since_period.split("-"))
+    if "year_concept" in data.columns:
+        periods = data["year_concept"] * 100 + data["month_concept"]
+        keep = periods < year * 100 + month
+    else:
+        keep = pd.to_datetime(data["movement_date"]) < pd.Timestamp(year, month, 1)
+
+    if delta.empty:
+        return data[keep].reset_index(drop=True)
+    return pd.concat([data[keep], delta], ignore_index=True)
+
+
+# Function to get data from the API
+@st.cache_data(ttl=3600, show_spinner="Obteniendo datos de API")
+def fetch_dashboard_data(endpoint: str, db_number: int) -> pd.DataFrame:
+    """Fetches data from the dashboard API and returns it as a pandas DataFrame.
+
+    Args:
+        endpoint (str): The API endpoint to fetch data from.
+        db_number (int): The database number to fetch data from.
+
+    Returns:
+        pd.DataFrame: The fetched data, converted into a pandas DataFrame.
+    """
+    return request_dashboard_data(endpoint, db_number)
+
+
+@st.cache_resource
+def get_swr_store() -> dict:
+    """
+    Returns the stale-while-revalidate store shared by every session of the process.
+
+    Each entry is keyed by (endpoint, db_number) and keeps the last good DataFrame,
+    its sync version token, the time it was fetched and whether a background
+    refresh is running.
+
+    Returns:
+        dict: A dictionary with a lock and the dataset entries.
+    """
+    return {"lock": threading.Lock(), "entries": {}}
+
+
+def get_staleness_limits(endpoint: str) -> tuple:
+    """
+    Gets the max staleness and the hard expiry of a dataset.
+
+    The defaults come from SWR_MAX_STALENESS and SWR_HARD_EXPIRY, and can be
+    overridden per dataset, e.g. SWR_MAX_STALENESS_SALES_VS_PROFIT.
+
+    Args:
+        endpoint (str): The API endpoint of the dataset.
+
+    Returns:
+        tuple: The max staleness and the hard expiry in seconds.
+    """
+    suffix = replace_hyphens_with_underscores(endpoint).upper()
+    max_staleness = int(os.getenv(f"SWR_MAX_STALENESS_{suffix}", swr_max_staleness))
+    hard_expiry = int(os.getenv(f"SWR_HARD_EXPIRY_{suffix}", swr_hard_expiry))
+    return max_staleness, hard_expiry
+
+
+def refresh_dashboard_data(endpoint: str, db_number: int):
+    """
+    Refreshes a dataset of the stale-while-revalidate store.
+
+    Only the rows that changed since the last sync are requested and merged into
+    the last good DataFrame, so a refresh usually transfers the open periods only.
+    The merged DataFrame is swapped in only if the request succeeds, otherwise the
+    last good DataFrame is kept and served.
+
+    Args:
+        endpoint (str): The API endpoint to fetch data from.
+        db_number (int): The database number to fetch data from.
+    """
+    store = get_swr_store()
+    key = (endpoint, db_number)
+    with store["lock"]:
+        entry = store["entries"][key]
+    try:
+        sync = request_dashboard_sync(endpoint, db_number, entry["version"])
+        data = merge_dashboard_delta(entry["data"], sync["data"], sync["since_period"])
+        with store["lock"]:
+            store["entries"][key] = {
+                "data": data,
+                "version": sync["version"],
+                "fetched_at": time.time(),
+                "refreshing": False,
+            }
+    except (requests.RequestException, ValueError, KeyError) as e:
+        print(f"Error al actualizar los datos de {endpoint}: {e}", flush=True)
+    finally:
+        # Any other error ends the thread too, the next read must refresh again
+        with store["lock"]:
+            store["entries"][key]["refreshing"] = False
+
+
+def fetch_dashboard_data_swr(endpoint: str, db_number: int) -> pd.DataFrame:
+    """
+    Fetches data from the dashboard API using stale-while-revalidate.
+
+    The last good DataFrame is served immediately. When it is older than the max
+    staleness a background refresh of the changed rows is triggered, and the new
+    data is served on the next rerun. When it is older than the hard expiry it is
+    fetched again whole and synchronously.
+
+    Args:
+        endpoint (str): The API endpoint to fetch data from.
+        db_number (int): The database number to fetch data from.
+
+    Returns:
+        pd.DataFrame: The fetched data, converted into a pandas DataFrame.
+    """
+    store = get_swr_store()
+    key = (endpoint, db_number)
+    max_staleness, hard_expiry = get_staleness_limits(endpoint)
+
+    with store["lock"]:
+        entry = store["entries"].get(key)
+        age = time.time() - entry["fetched_at"] if entry is not None else None
+        start_refresh = (
+            entry is not None
+            and max_staleness < age <= hard_expiry
+            and not entry["refreshing"]
+        )
+        if start_refresh:
+            entry["refreshing"] = True
+
+    if entry is None or age > hard_expiry:
+        with st.spinner("Obteniendo datos de API"):
+            sync = request_dashboard_sync(endpoint, db_number)
+        with store["lock"]:
+            store["entries"][key] = {
+                "data": sync["data"],
+                "version": sync["version"],
+                "fetched_at": time.time(),
+                "refreshing": False,
+            }
+        return sync["data"].copy()
+
+    if start_refresh:
+        threading.Thread(
+            target=refresh_dashboard_data, args=(endpoint, db_number), daemon=True
+        ).start()
+
+    # Copy so that the pages can modify the DataFrame without touching the store
+    return entry["data"].copy()
+
+
+@st.cache_resource
+def get_snapshot_store() -> dict:
+    """
+    Returns the memory-mapped snapshots shared by every session of the process.
+
+    Each entry is keyed by (endpoint, db_number) and keeps the path of the newest
+    snapshot file and its Arrow table, whose buffers point to the mapped file, so
+    the sessions and the processes reading it share the same pages.
+
+    Returns:
+        dict: A dictionary with a lock and the snapshot entries.
+    """
+    return {"lock": threading.Lock(), "entries": {}}
+
+
+def read_snapshot(endpoint: str, db_number: int) -> pd.DataFrame:
+    """
+    Reads the newest snapshot of a dataset written by the backend.
+
+    The file is memory-mapped once and kept until a newer snapshot appears, the
+    Arrow IPC format needs no parsing, only the conversion to a DataFrame.
+
+    Args:
+        endpoint (str): The API endpoint of the dataset.
+        db_number (int): The database number of the dataset.
+
+    Returns:
+        pd.DataFrame: The data of the snapshot, or None if there is no snapshot.
+    """
+    import pyarrow as pa  # Only needed for the local mode, slow to import
+
+    files = sorted(
+        glob.glob(os.path.join(snapshot_dir, f"{endpoint}_{db_number:02d}.*.arrow"))
+    )
+    if not files:
+        return None
+
+    store = get_snapshot_store()
+    key = (endpoint, db_number)
+    with store["lock"]:
+        entry = store["entries"].get(key)
+        if entry is None or entry["path"] != files[-1]:
+            try:
+                with pa.memory_map(files[-1], "r") as source:
+                    table = pa.ipc.open_file(source).read_all()
+            except OSError as e:
+                # Removed by a newer export in the meantime
+                print(f"Error al leer el snapshot de {endpoint}: {e}", flush=True)
+                return None
+            # The file name ends with the export time in nanoseconds
+            exported_at = int(files[-1].rsplit(".", 2)[-2]) / 1e9
+            entry = {"path": files[-1], "table": table, "fetched_at": exported_at}
+            store["entries"][key] = entry
+
+    # A new DataFrame per call, the pages can modify it without touching the store
+    return entry["table"].to_pandas(date_as_object=False, split_blocks=True)
+
+
+def fetch_dashboard_data_local(endpoint: str, db_number: int) -> pd.DataFrame:
+    """
+    Fetches data from the snapshots of the backend, falling back to the API.
+
+    Args:
+        endpoint (str): The API endpoint to fetch data from.
+        db_number (int): The database number to fetch data from.
+
+    Returns:
+        pd.DataFrame: The fetched data, converted into a pandas DataFrame.
+    """
+    data = read_snapshot(endpoint, db_number)
+    if data is None:
+        return fetch_dashboard_data(endpoint, db_number)
+    return data
+
+
+def load_dashboard_data(endpoint: str, db_number: int) -> pd.DataFrame:
+    """
+    Loads a dataset using the mode configured in DATA_LOADING_MODE.
+
+    Args:
+        endpoint (str): The API endpoint to fetch data from.
+        db_number (int): The database number to fetch data from.
+
+    Returns:
+        pd.DataFrame: The fetched data, converted into a pandas DataFrame.
+    """
+    if data_loading_mode == "swr":
+        return fetch_dashboard_data_swr(endpoint, db_number)
+    if data_loading_mode == "local":
+        return fetch_dashboard_data_local(endpoint, db_number)
+    return fetch_dashboard_data(endpoint, db_number)
+
+
+def render_data_as_of(db_number: int):
+    """
+    Renders a "data as of" badge with the fetch time of the oldest dataset served.
+
+    The badge is only shown in the stale-while-revalidate mode, and in the local
+    mode with the export time of the snapshots.
+
+    Args:
+        db_number (int): The database number of the datasets.
+    """
+    if data_loading_mode not in ("swr", "local"):
+        return
+
+    store = get_swr_store() if data_loading_mode == "swr" else get_snapshot_store()
+    with store["lock"]:
+        fetched_times = [
+            entry["fetched_at"]
+            for (_, number), entry in store["entries"].items()
+            if number == db_number
+        ]
+    if not fetched_times:
+        return
+
+    as_of = datetime.fromtimestamp(min(fetched_times))
+    st.caption(f":material/schedule: Datos al {as_of.strftime('%d/%m/%Y %H:%M')}")
+
+
+def get_export_url(
+    endpoint: str,
+    db_number: int,
+    year: int,
+    month: int = None,
+    file_type: str = "csv",
+    top: int = None,
+) -> str:
+    """
+    Builds the URL of the export of a dataset in the API.
+
+    Args:
+        endpoint (str): The API endpoint of the dataset.
+        db_number (int): The database number.
+        year (int): The year to export.
+        month (int): The month to export (optional), the whole year if it's None.
+        file_type (str): The file type, csv or xlsx.
+        top (int): The number of names of a Top table (optional), the monthly rows
+            are exported if it's None.
+
+    Returns:
+        str: The URL of the export.
+    """
+    params = {"db_number": db_number, "year": year, "file_type": file_type}
+    if month is not None:
+        params["month"] = month
+    if top is not None:
+        params["top"] = top
+    return f"{export_base_url}/export/{endpoint}/?{urlencode(params)}"
+
+
+def render_export_buttons(
+    endpoint: str, db_number: int, year: int, month: int = None, top: int = None
+):
+    """
+    Renders the CSV and Excel download buttons of a dataset.
+
+    The buttons are links to the export endpoint of the API, so the browser
+    downloads the file from the API without loading it in the dashboard.
+
+    Args:
+        endpoint (str): The API endpoint of the dataset.
+        db_number (int): The database number.
+        year (int): The year to export.
+        month (int): The month to export (optional), the whole year if it's None.
+        top (int): The number of names of a Top table (optional), the monthly rows
+            are exported if it's None.
+    """
+    col1, col2, _ = st.columns([1, 1, 6])
+    with col1:
+        st.link_button(
+            ":material/download: CSV",
+            get_export_url(endpoint, db_number, year, month, "csv", top),
+            use_container_width=True,
+        )
+    with col2:
+        st.link_button(
+            ":material/download: Excel",
+            get_export_url(endpoint, db_number, year, month, "xlsx", top),
+            use_container_width=True,
+        )
+
+
 def calculate_delta(previous_value: float, last_value: float, divisor: int) -> float:
     """
     Calculates the percentage difference between two values.
@@ -129,65 +532,580 @@ def get_delta(
     delta_type: str,
 ) -> float:
     """
-    Calculates the percentage difference between two values, given a divisor and a type of calculation.
+    Calculates the percentage difference between two values, given a divisor and a type of calculation.
+
+    Args:
+        number_month (int): The month of the current period.
+        number_year (int): The year of the current period.
+        concept_array (pd.DataFrame): The DataFrame containing the data to calculate the delta.
+        mount_column (str): The name of the column to calculate the delta on.
+        last_value (float): The value of the current period.
+        divisor (int): A divisor to apply to both values, e.g. 1000 to get thousands.
+        delta_type (str): The type of calculation to perform. Can be one of "sum", "mean", "median", "max", "min", or "count".
+
+    Returns:
+        float: The percentage difference between the two values, rounded to 2 decimal places.
+    """
+
+    delta = None
+    concept_array_filtered_previous = None
+
+    if number_year == initial_year:
+        if number_month is not None:
+            if number_month > 1:
+                concept_array_filtered_previous = concept_array[
+                    (concept_array["month_concept"] == number_month - 1)
+                    & (concept_array["year_concept"] == number_year)
+                ]
+    else:
+        if number_month is None:
+            concept_array_filtered_previous = concept_array[
+                concept_array["year_concept"] == number_year - 1
+            ]
+        else:
+            if number_month == 1:
+                concept_array_filtered_previous = concept_array[
+                    (concept_array["month_concept"] == 12)
+                    & (concept_array["year_concept"] == number_year - 1)
+                ]
+            else:
+                concept_array_filtered_previous = concept_array[
+                    (concept_array["month_concept"] == number_month - 1)
+                    & (concept_array["year_concept"] == number_year)
+                ]
+        if delta_type == "sum":
+            previous_value = concept_array_filtered_previous[mount_column].sum()
+        elif delta_type == "mean":
+            previous_value = concept_array_filtered_previous[mount_column].mean()
+        elif delta_type == "median":
+            previous_value = concept_array_filtered_previous[mount_column].median()
+        elif delta_type == "max":
+            previous_value = concept_array_filtered_previous[mount_column].max()
+        elif delta_type == "min":
+            previous_value = concept_array_filtered_previous[mount_column].min()
+        elif delta_type == "count":
+            previous_value = concept_array_filtered_previous[mount_column].count()
+        elif delta_type == "nunique":
+            previous_value = concept_array_filtered_previous[mount_column].nunique()
+
+        delta = calculate_delta(previous_value, last_value, divisor)
+
+        return delta
+
+
+def request_kpis(db_number: int, year: int, month: int = None) -> dict:
+    """Requests the KPIs of a period and of the previous period without any caching.
+
+    Args:
+        db_number (int): The database number to fetch data from.
+        year (int): The year of the period.
+        month (int): The month of the period (optional).
+
+    Returns:
+        dict: The current and previous values of every KPI, keyed by its name.
+    """
+    params = {"db_number": db_number, "year": year}
+    if month is not None:
+        params["month"] = month
+    response = requests.get(f"{base_url}/kpis/", params=params)
+    response.raise_for_status()
+    return {kpi["name"]: kpi for kpi in response.json()["kpis"]}
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def fetch_kpis(db_number: int, year: int, month: int = None) -> dict:
+    """Fetches the KPIs of a period and of the previous period from the API.
+
+    Args:
+        db_number (int): The database number to fetch data from.
+        year (int): The year of the period.
+        month (int): The month of the period (optional).
+
+    Returns:
+        dict: The current and previous values of every KPI, keyed by its name.
+    """
+    return request_kpis(db_number, year, month)
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def fetch_forecast(db_number: int, metrics: str = "sales,gross_profit") -> dict:
+    """Fetches the forecasts of the next months of some KPIs from the API.
+
+    Args:
+        db_number (int): The database number to fetch data from.
+        metrics (str): The KPI names separated by commas.
+
+    Returns:
+        dict: The forecast of every KPI, keyed by its name.
+    """
+    params = {"db_number": db_number, "metrics": metrics}
+    response = requests.get(f"{base_url}/forecast/", params=params)
+    response.raise_for_status()
+    return {forecast["metric"]: forecast for forecast in response.json()["forecasts"]}
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def fetch_anomalies(db_number: int, year: int, month: int = None) -> pd.DataFrame:
+    """Fetches the atypical days of the daily sales and profits of a period.
+
+    Args:
+        db_number (int): The database number to fetch data from.
+        year (int): The year of the period.
+        month (int): The month of the period (optional).
+
+    Returns:
+        pd.DataFrame: The atypical days, the most recent first.
+    """
+    params = {"db_number": db_number, "year": year}
+    if month is not None:
+        params["month"] = month
+    response = requests.get(f"{base_url}/anomalies/", params=params)
+    response.raise_for_status()
+    anomalies = pd.DataFrame(response.json()["anomalies"])
+    if not anomalies.empty:
+        anomalies["movement_date"] = pd.to_datetime(anomalies["movement_date"])
+    return anomalies
+
+
+def render_abc(
+    db_number: int, entity: str, entity_title: str, year: int, month: int = None
+):
+    """
+    Shows the ABC classification of the products or clients of a period: the
+    Pareto curve and the count and shares of every class.
+
+    Args:
+        db_number (int): The database number.
+        entity (str): The entity, products or clients.
+        entity_title (str): The title of the entity, e.g. Productos.
+        year (int): The year of the period.
+        month (int): The month of the period (optional).
+    """
+    abc = fetch_abc(db_number, entity, year, month)
+    if not abc["ranked"]:
+        st.warning(f"No hay ventas de {entity_title.lower()} en el periodo.")
+        return
+
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        st.altair_chart(
+            build_pareto_chart(abc["curve"], entity_title), use_container_width=True
+        )
+    with col2:
+        st.caption(
+            f"{abc['ranked']:,} de {abc['catalog']:,} {entity_title.lower()} "
+            "con ventas en el periodo"
+        )
+        st.dataframe(
+            pd.DataFrame(abc["classes"])[
+                ["name", "count", "sales_share", "profit_share"]
+            ],
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "name": st.column_config.TextColumn("Clase"),
+                "count": st.column_config.NumberColumn("Cantidad", format="%d"),
+                "sales_share": st.column_config.NumberColumn(
+                    "% Ventas", format="%.1f %%"
+                ),
+                "profit_share": st.column_config.NumberColumn(
+                    "% Ganancia", format="%.1f %%"
+                ),
+            },
+        )
+
+
+def get_page_cursor(state_key: str, parent: tuple):
+    """
+    Gets the cursor of the current page of a drill-down, going back to the first
+    page when its parent (company, period, line or product) changes.
+
+    The cursors of the visited pages are kept in the session state, so the
+    previous page can be shown again.
+
+    Args:
+        state_key (str): The session state key of the drill-down.
+        parent (tuple): The parent of the drill-down.
+
+    Returns:
+        The cursor of the current page, None for the first page.
+    """
+    pages = st.session_state.get(state_key)
+    if pages is None or pages["parent"] != parent:
+        pages = {"parent": parent, "cursors": [None]}
+        st.session_state[state_key] = pages
+    return pages["cursors"][-1]
+
+
+def render_page_buttons(state_key: str, next_cursor):
+    """
+    Shows the buttons to move to the previous and next pages of a drill-down.
+
+    Args:
+        state_key (str): The session state key of the drill-down.
+        next_cursor: The cursor of the next page, None on the last page.
+    """
+    cursors = st.session_state[state_key]["cursors"]
+    col1, col2, col3 = st.columns([1, 1, 3])
+    with col1:
+        if st.button(
+            "Página anterior", key=f"{state_key}_previous", disabled=len(cursors) == 1
+        ):
+            cursors.pop()
+            st.rerun()
+    with col2:
+        if st.button(
+            "Página siguiente", key=f"{state_key}_next", disabled=next_cursor is None
+        ):
+            cursors.append(next_cursor)
+            st.rerun()
+    with col3:
+        st.caption(f"Página {len(cursors)}")
+
+
+def render_drill_down(db_number: int, line: str, year: int, month: int = None):
+    """
+    Shows the sales of the products of a line, one page at a time, and the
+    invoices of the product selected in the table.
+
+    Args:
+        db_number (int): The database number.
+        line (str): The line name, a slice of the lines donut chart.
+        year (int): The year of the period.
+        month (int): The month of the period (optional).
+    """
+    st.subheader(f"Productos de la línea {line}")
+    parent = (db_number, line, year, month)
+    after = get_page_cursor("drill_down_products", parent)
+    page = fetch_line_products(db_number, line, year, month, after)
+    products = pd.DataFrame(page["products"])
+    if products.empty:
+        st.info("No hay ventas de productos de la línea en el periodo.")
+        return
+
+    event = st.dataframe(
+        products,
+        hide_index=True,
+        use_container_width=True,
+        on_select="rerun",
+        selection_mode="single-row",
+        key="drill_down_products_" + "_".join(map(str, parent + (after,))),
+        column_config={
+            "product": st.column_config.TextColumn("Clave"),
+            "name": st.column_config.TextColumn("Producto"),
+            "sales": st.column_config.NumberColumn("Venta", format="$%.2f"),
+            "profit": st.column_config.NumberColumn("Ganancia", format="$%.2f"),
+            "qty": st.column_config.NumberColumn("Movimientos", format="%d"),
+        },
+    )
+    render_page_buttons("drill_down_products", page["next"])
+    if not event.selection.rows:
+        st.caption("Selecciona un producto para ver sus facturas.")
+        return
+
+    product = products.iloc[event.selection.rows[0]]
+    st.subheader(f"Facturas de {product['name']}")
+    parent = (db_number, product["product"], year, month)
+    after = get_page_cursor("drill_down_invoices", parent)
+    page = fetch_product_invoices(db_number, product["product"], year, month, after)
+    st.dataframe(
+        pd.DataFrame(page["invoices"]),
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "movement": None,
+            "invoice": st.column_config.TextColumn("Factura"),
+            "movement_date": st.column_config.TextColumn("Fecha"),
+            "client": st.column_config.TextColumn("Cliente"),
+            "qty": st.column_config.NumberColumn("Cantidad", format="%.2f"),
+            "price": st.column_config.NumberColumn("Precio", format="$%.2f"),
+            "sales": st.column_config.NumberColumn("Venta", format="$%.2f"),
+            "profit": st.column_config.NumberColumn("Ganancia", format="$%.2f"),
+        },
+    )
+    render_page_buttons("drill_down_invoices", page["next"])
+
+
+def render_inventory(db_number: int, year: int, month: int = None):
+    """
+    Shows the inventory turnover and days of stock of the lines, and the slow
+    movers among the products of a period.
+
+    Args:
+        db_number (int): The database number.
+        year (int): The year of the period.
+        month (int): The month of the period (optional).
+    """
+    # The API doesn't roll the stock back to a period that hasn't started
+    if (year, month or 1) > (datetime.now().year, datetime.now().month):
+        st.info("El periodo seleccionado aún no empieza.")
+        return
+    lines = fetch_inventory(db_number, "lines", year, month)
+    if not lines["count"]:
+        st.info("No hay productos en el inventario.")
+        return
+    products = fetch_inventory(db_number, "products", year, month, slow=True)
+    st.caption(
+        f"Valor del inventario al cierre: ${products['stock_value']:,.2f} — "
+        f"{products['slow_count']:,} productos de lento movimiento (más de "
+        f"{products['slow_mover_days']} días de inventario o sin salidas en "
+        f"{products['days']} días)"
+    )
+    column_config = {
+        "product": st.column_config.TextColumn("Clave"),
+        "name": st.column_config.TextColumn("Nombre"),
+        "line": st.column_config.TextColumn("Línea"),
+        "stock_end": st.column_config.NumberColumn("Existencia", format="%.2f"),
+        "stock_value": st.column_config.NumberColumn(
+            "Valor del inventario", format="$%.2f"
+        ),
+        "exits": st.column_config.NumberColumn("Salidas", format="%.2f"),
+        "turnover": st.column_config.NumberColumn("Rotación", format="%.2f"),
+        "days_of_stock": st.column_config.NumberColumn(
+            "Días de inventario", format="%.0f"
+        ),
+    }
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("**Rotación por línea**")
+        st.dataframe(
+            pd.DataFrame(lines["items"])[
+                ["name", "stock_value", "turnover", "days_of_stock"]
+            ],
+            hide_index=True,
+            use_container_width=True,
+            column_config=column_config,
+        )
+    with col2:
+        st.markdown("**Productos de lento movimiento**")
+        if not products["items"]:
+            st.info("No hay productos de lento movimiento en el periodo.")
+            return
+        st.dataframe(
+            pd.DataFrame(products["items"])[
+                ["product", "name", "line", "stock_end", "stock_value", "days_of_stock"]
+            ],
+            hide_index=True,
+            use_container_width=True,
+            column_config=column_config,
+        )
+
+
+def render_cohorts(db_number: int, year: int):
+    """
+    Shows the retention of the client cohorts of a year as a heatmap.
+
+    Args:
+        db_number (int): The database number.
+        year (int): The year of the first purchase of the cohorts.
+    """
+    cohorts = fetch_cohorts(db_number, year)
+    if cohorts.empty:
+        st.info("No hay clientes con su primera compra en el año seleccionado.")
+        return
+    st.altair_chart(build_cohort_chart(cohorts), use_container_width=True)
+
+
+def render_anomalies(db_number: int, year: int, month: int = None):
+    """
+    Shows the atypical days of a period in a table.
+
+    Args:
+        db_number (int): The database number.
+        year (int): The year of the period.
+        month (int): The month of the period (optional).
+    """
+    st.subheader("Días atípicos")
+    anomalies = fetch_anomalies(db_number, year, month)
+    if anomalies.empty:
+        st.info("No hay días atípicos en el periodo seleccionado.")
+        return
+
+    st.dataframe(
+        anomalies[["movement_date", "label", "value", "expected", "score"]],
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "movement_date": st.column_config.DateColumn("Fecha", format="DD/MM/YYYY"),
+            "label": st.column_config.TextColumn("Tipo"),
+            "value": st.column_config.NumberColumn("Monto", format="$ %.2f"),
+            "expected": st.column_config.NumberColumn("Esperado", format="$ %.2f"),
+            "score": st.column_config.NumberColumn("Desviación", format="%.1f"),
+        },
+    )
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def fetch_abc(
+    db_number: int, entity: str, year: int, month: int = None, by: str = "sales"
+) -> dict:
+    """Fetches the ABC classification of the products or clients of a period.
+
+    Args:
+        db_number (int): The database number to fetch data from.
+        entity (str): The entity, products or clients.
+        year (int): The year of the period.
+        month (int): The month of the period (optional).
+        by (str): The measure of the ranking, sales or profit.
+
+    Returns:
+        dict: The classes, the Pareto curve and the first ranked items.
+    """
+    params = {
+        "db_number": db_number,
+        "year": year,
+        "by": by,
+        "limit": number_of_entries,
+    }
+    if month is not None:
+        params["month"] = month
+    response = requests.get(f"{base_url}/abc/{entity}/", params=params)
+    response.raise_for_status()
+    return response.json()
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def fetch_cohorts(db_number: int, year: int) -> pd.DataFrame:
+    """Fetches the retention of the client cohorts of a year.
+
+    Args:
+        db_number (int): The database number to fetch data from.
+        year (int): The year of the first purchase of the cohorts.
+
+    Returns:
+        pd.DataFrame: One row per cohort and month since the first purchase, with
+        the cohort (YYYY-MM), its clients, the month (offset), the clients that
+        purchased that month and their share of the cohort.
+    """
+    params = {"db_number": db_number, "year": year}
+    response = requests.get(f"{base_url}/cohorts/", params=params)
+    response.raise_for_status()
+    return pd.DataFrame(
+        [
+            {
+                "cohort": f"{cohort['year']}-{cohort['month']:02d}",
+                "size": cohort["clients"],
+                "offset": period["offset"],
+                "clients": period["clients"],
+                "share": period["share"],
+            }
+            for cohort in response.json()["cohorts"]
+            for period in cohort["retention"]
+        ]
+    )
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def fetch_inventory(
+    db_number: int, level: str, year: int, month: int = None, slow: bool = False
+) -> dict:
+    """Fetches the inventory turnover and days of stock of the products or lines.
+
+    Args:
+        db_number (int): The database number to fetch data from.
+        level (str): The level, products or lines.
+        year (int): The year of the period.
+        month (int): The month of the period (optional).
+        slow (bool): Whether to fetch only the slow movers.
+
+    Returns:
+        dict: The counts, the stock value and the first products or lines, the
+        slow movers first.
+    """
+    params = {"db_number": db_number, "year": year, "slow": slow}
+    if month is not None:
+        params["month"] = month
+    response = requests.get(f"{base_url}/inventory/{level}/", params=params)
+    response.raise_for_status()
+    return response.json()
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def fetch_line_products(
+    db_number: int, line: str, year: int, month: int = None, after: str = None
+) -> dict:
+    """Fetches a page of the sales by product of a line.
+
+    Args:
+        db_number (int): The database number to fetch data from.
+        line (str): The line name.
+        year (int): The year of the period.
+        month (int): The month of the period (optional).
+        after (str): The key of the last product of the previous page (optional).
+
+    Returns:
+        dict: The products of the page and the cursor of the next page.
+    """
+    params = {"db_number": db_number, "line": line, "year": year}
+    if month is not None:
+        params["month"] = month
+    if after is not None:
+        params["after"] = after
+    response = requests.get(f"{base_url}/drill-down/line-products/", params=params)
+    response.raise_for_status()
+    return response.json()
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def fetch_product_invoices(
+    db_number: int, product: str, year: int, month: int = None, after: int = None
+) -> dict:
+    """Fetches a page of the sales movements of a product with their invoice.
+
+    Args:
+        db_number (int): The database number to fetch data from.
+        product (str): The product key.
+        year (int): The year of the period.
+        month (int): The month of the period (optional).
+        after (int): The number of the last movement of the previous page
+            (optional).
+
+    Returns:
+        dict: The invoices of the page and the cursor of the next page.
+    """
+    params = {"db_number": db_number, "product": product, "year": year}
+    if month is not None:
+        params["month"] = month
+    if after is not None:
+        params["after"] = after
+    response = requests.get(f"{base_url}/drill-down/product-invoices/", params=params)
+    response.raise_for_status()
+    return response.json()
+
+
+def get_kpi_delta(kpi: dict, number_year: int, divisor: int) -> float:
+    """
+    Calculates the delta of a KPI from its current and previous values.
+
+    Like get_delta, there is no delta in the initial year of operations.
 
     Args:
-        number_month (int): The month of the current period.
+        kpi (dict): The KPI, with its current and previous values.
         number_year (int): The year of the current period.
-        concept_array (pd.DataFrame): The DataFrame containing the data to calculate the delta.
-        mount_column (str): The name of the column to calculate the delta on.
-        last_value (float): The value of the current period.
         divisor (int): A divisor to apply to both values, e.g. 1000 to get thousands.
-        delta_type (str): The type of calculation to perform. Can be one of "sum", "mean", "median", "max", "min", or "count".
 
     Returns:
         float: The percentage difference between the two values, rounded to 2 decimal places.
     """
+    if number_year == initial_year or kpi["previous"] is None:
+        return None
+    return calculate_delta(kpi["previous"], kpi["current"] or 0, divisor)
 
-    delta = None
-    concept_array_filtered_previous = None
 
-    if number_year == initial_year:
-        if number_month is not None:
-            if number_month > 1:
-                concept_array_filtered_previous = concept_array[
-                    (concept_array["month_concept"] == number_month - 1)
-                    & (concept_array["year_concept"] == number_year)
-                ]
-    else:
-        if number_month is None:
-            concept_array_filtered_previous = concept_array[
-                concept_array["year_concept"] == number_year - 1
-            ]
-        else:
-            if number_month == 1:
-                concept_array_filtered_previous = concept_array[
-                    (concept_array["month_concept"] == 12)
-                    & (concept_array["year_concept"] == number_year - 1)
-                ]
-            else:
-                concept_array_filtered_previous = concept_array[
-                    (concept_array["month_concept"] == number_month - 1)
-                    & (concept_array["year_concept"] == number_year)
-                ]
-        if delta_type == "sum":
-            previous_value = concept_array_filtered_previous[mount_column].sum()
-        elif delta_type == "mean":
-            previous_value = concept_array_filtered_previous[mount_column].mean()
-        elif delta_type == "median":
-            previous_value = concept_array_filtered_previous[mount_column].median()
-        elif delta_type == "max":
-            previous_value = concept_array_filtered_previous[mount_column].max()
-        elif delta_type == "min":
-            previous_value = concept_array_filtered_previous[mount_column].min()
-        elif delta_type == "count":
-            previous_value = concept_array_filtered_previous[mount_column].count()
-        elif delta_type == "nunique":
-            previous_value = concept_array_filtered_previous[mount_column].nunique()
+def format_metric_value(value: float, metric_label: str, divisor: int) -> str:
+    """
+    Formats the value of a metric as it's displayed, e.g. "1234.5 K".
 
-        delta = calculate_delta(previous_value, last_value, divisor)
+    Args:
+        value (float): The value of the metric.
+        metric_label (str): The label to display after the value.
+        divisor (int): The divisor to apply to the value.
 
-        return delta
+    Returns:
+        str: The formatted value.
+    """
+    return f"{round(value/divisor,2)} {metric_label}"
 
 
 def get_metric(
@@ -221,7 +1139,7 @@ def get_metric(
 
     return st.metric(
         label=title,
-        value=f"{round(mount_df/divisor,2)} {metric_label}",
+        value=format_metric_value(mount_df, metric_label, divisor),
         delta=f"{delta_df} %" if delta_df is not None else None,
     )
 
@@ -242,13 +1160,7 @@ def get_top(
         pd.DataFrame: A DataFrame containing the top 5 entries with the highest sums in the specified column.
     """
 
-    df = (
-        filtered_df.groupby(group_column, as_index=False)[mount_column]
-        .sum()
-        .sort_values(by=mount_column, ascending=False)
-        .head(top_n)
-    )
-    return df
+    return compute.get_top(filtered_df, group_column, mount_column, top_n)
 
 
 def get_top_multiple_agg(
@@ -274,20 +1186,14 @@ def get_top_multiple_agg(
         pd.DataFrame: A DataFrame containing the top 5 entries with the highest sums in the specified column.
     """
 
-    df = (
-        filtered_df.groupby(group_column, as_index=False)
-        .agg(
-            {
-                mount_column: "sum",
-                aggregate_column_one: "sum",
-                aggregate_column_two: "sum",
-            }
-        )
-        .reset_index()
-        .sort_values(by=mount_column, ascending=False)
-        .head(top_n)
+    return compute.get_top_multiple_agg(
+        filtered_df,
+        group_column,
+        mount_column,
+        aggregate_column_one,
+        aggregate_column_two,
+        top_n,
     )
-    return df
 
 
 def format_top_dataframe(
@@ -353,6 +1259,7 @@ def get_circular_graph(df: pd.DataFrame, mount_column: str, subject_column: str)
     -------
     A Streamlit figure widget with the circular graph.
     """
+    import matplotlib.pyplot as plt  # Only needed for this graph, slow to import
 
     fig, ax = plt.subplots()
     ax.pie(df[mount_column], labels=df[subject_column], autopct="%1.1f%%")
@@ -383,15 +1290,7 @@ def calculate_metrics(data: pd.DataFrame, column: str) -> dict:
     Returns:
         dict: A dictionary containing the calculated metrics.
     """
-    return {
-        "total": data[column].sum(),
-        "average": data[column].mean(),
-        "median": data[column].median(),
-        "max": data[column].max(),
-        "min": data[column].min(),
-        "count": data[column].count(),
-        "unique": data["name"].nunique() if "name" in data else 0,
-    }
+    return compute.calculate_metrics(data, column)
 
 
 def filter_data(data: pd.DataFrame, year: int, month: int = None) -> pd.DataFrame:
@@ -406,13 +1305,17 @@ def filter_data(data: pd.DataFrame, year: int, month: int = None) -> pd.DataFram
     Returns:
         pd.DataFrame: The filtered DataFrame.
     """
-    if month is not None:
-        return data[(data["year_concept"] == year) & (data["month_concept"] == month)]
-    return data[data["year_concept"] == year]
+    return compute.filter_data(data, year, month)
 
 
 def process_data(
-    endpoint: str, db_number: int, year: int, month: int, column: str, title: str
+    endpoint: str,
+    db_number: int,
+    year: int,
+    month: int,
+    column: str,
+    title: str,
+    data: pd.DataFrame = None,
 ) -> dict:
     """
     Fetches, filters, calculates metrics, and returns data for a specific endpoint.
@@ -424,11 +1327,14 @@ def process_data(
         month (int): The month to filter by (optional).
         column (str): The name of the column to calculate metrics for.
         title (str): The title of the data.
+        data (pd.DataFrame): The already fetched data of the endpoint (optional),
+            it's loaded if None.
 
     Returns:
         dict: A dictionary containing the processed data.
     """
-    data = fetch_dashboard_data(endpoint, db_number)
+    if data is None:
+        data = load_dashboard_data(endpoint, db_number)
     if data.empty:
         st.warning(f"No hay datos disponibles para {title}")
         return {
@@ -451,7 +1357,55 @@ def process_data(
     return metrics
 
 
-def get_data(database_number: int, year: int, month: int = None) -> dict:
+# Datasets of the dashboard pages, keyed by the name of their results: the
+# endpoint, the column of their metrics and the title of their warnings
+DASHBOARD_DATASETS = {
+    "sales": ("sales", "total_sales", "Ventas"),
+    "purchases": ("purchases", "total_purchases", "Compras"),
+    "sellers": ("sellers", "total_sales", "Ventas por vendedor"),
+    "products": ("products", "total_qty", "Ventas por producto"),
+    replace_hyphens_with_underscores("gross-profit-margin"): (
+        "gross-profit-margin",
+        "total_gpm",
+        "Margen de Ganancia Bruta",
+    ),
+    "goods": ("goods", "total_qty", "Compras por producto"),
+    replace_hyphens_with_underscores("sales-by-towns"): (
+        "sales-by-towns",
+        "total_sales",
+        "Ventas por Municipio",
+    ),
+    replace_hyphens_with_underscores("sales-by-lines"): (
+        "sales-by-lines",
+        "sales",
+        "Ventas por Línea",
+    ),
+    replace_hyphens_with_underscores("sales-by-products"): (
+        "sales-by-products",
+        "sales",
+        "Ventas y Ganancias por Producto",
+    ),
+    replace_hyphens_with_underscores("sales-by-clients"): (
+        "sales-by-clients",
+        "sales",
+        "Ventas y Ganancias por cliente",
+    ),
+    replace_hyphens_with_underscores("sales-and-profits-by-towns"): (
+        "sales-and-profits-by-towns",
+        "sales",
+        "Ventas y Ganancias por Municipio",
+    ),
+    replace_hyphens_with_underscores("sales-and-profits-by-sellers"): (
+        "sales-and-profits-by-sellers",
+        "sales",
+        "Ventas y Ganancias por Vendedor",
+    ),
+}
+
+
+def get_data(
+    database_number: int, year: int, month: int = None, datasets: dict = None
+) -> dict:
     """
     Fetches and processes dashboard data.
 
@@ -459,71 +1413,112 @@ def get_data(database_number: int, year: int, month: int = None) -> dict:
         database_number (int): The number of the database.
         year (int): The year to filter by.
         month (int): The month to filter by (optional).
+        datasets (dict): The already fetched data of every endpoint (optional),
+            keyed by the endpoint, e.g. by the report generator.
 
     Returns:
         dict: A dictionary containing the processed data.
     """
-    endpoints = {
-        "sales": ("sales", "total_sales", "Ventas"),
-        "purchases": ("purchases", "total_purchases", "Compras"),
-        "sellers": ("sellers", "total_sales", "Ventas por vendedor"),
-        "products": ("products", "total_qty", "Ventas por producto"),
-        replace_hyphens_with_underscores("gross-profit-margin"): (
-            "gross-profit-margin",
-            "total_gpm",
-            "Margen de Ganancia Bruta",
-        ),
-        "goods": ("goods", "total_qty", "Compras por producto"),
-        replace_hyphens_with_underscores("sales-by-towns"): (
-            "sales-by-towns",
-            "total_sales",
-            "Ventas por Municipio",
-        ),
-        replace_hyphens_with_underscores("sales-by-lines"): (
-            "sales-by-lines",
-            "sales",
-            "Ventas por Línea",
-        ),
-        replace_hyphens_with_underscores("sales-by-products"): (
-            "sales-by-products",
-            "sales",
-            "Ventas y Ganancias por Producto",
-        ),
-        replace_hyphens_with_underscores("sales-by-clients"): (
-            "sales-by-clients",
-            "sales",
-            "Ventas y Ganancias por cliente",
-        ),
-        replace_hyphens_with_underscores("sales-and-profits-by-towns"): (
-            "sales-and-profits-by-towns",
-            "sales",
-            "Ventas y Ganancias por Municipio",
-        ),
-        replace_hyphens_with_underscores("sales-and-profits-by-sellers"): (
-            "sales-and-profits-by-sellers",
-            "sales",
-            "Ventas y Ganancias por Vendedor",
-        ),
-    }
-
     results = {}
-    for key, (endpoint, column, title_prefix) in endpoints.items():
+    for key, (endpoint, column, title_prefix) in DASHBOARD_DATASETS.items():
         title = (
             f"{title_prefix} del año {year}"
             if month is None
             else f"{title_prefix} del mes {month} del año {year}"
         )
         results[key] = process_data(
-            endpoint, database_number, year, month, column, title
+            endpoint,
+            database_number,
+            year,
+            month,
+            column,
+            title,
+            datasets[endpoint] if datasets is not None else None,
         )
 
     # Combine results into a single dictionary
     return results
 
 
-def plot_sales_vs_profits(data: pd.DataFrame) -> None:
+def budget_chart_data(
+    dataframe: pd.DataFrame,
+    x_column: str = None,
+    y_column: str = None,
+    name_column: str = None,
+    amount_column: str = None,
+    top_n: int = None,
+    first_column: str = None,
+) -> pd.DataFrame:
+    """
+    Limits the rows of a DataFrame before it is embedded in a chart spec.
+
+    Time series (x_column and y_column) are downsampled with LTTB to MAX_CHART_POINTS,
+    categories (name_column and amount_column) beyond top_n are bucketed into "Otros",
+    and heatmaps (first_column) keep the cells of the first values of the column
+    within MAX_CHART_POINTS.
+
+    Args:
+        dataframe (pd.DataFrame): The DataFrame to embed in the chart.
+        x_column (str): Time column of a time series (optional).
+        y_column (str): Value column of a time series (optional).
+        name_column (str): Category column (optional).
+        amount_column (str): Amount column of the categories (optional).
+        top_n (int): The number of categories to keep, defaults to TOP_N.
+        first_column (str): Column whose first values a heatmap keeps (optional).
+
+    Returns:
+        pd.DataFrame: The DataFrame within the chart data budget.
+    """
+    if name_column is not None and amount_column is not None:
+        dataframe = chart_data.bucket_others(
+            dataframe,
+            name_column,
+            amount_column,
+            top_n if top_n is not None else number_of_entries,
+        )
+    if x_column is not None and y_column is not None:
+        dataframe = chart_data.lttb(dataframe, x_column, y_column, max_chart_points)
+    if first_column is not None:
+        dataframe = chart_data.keep_first_values(
+            dataframe, first_column, max_chart_points
+        )
+    return dataframe
+
+
+def chart_source(dataframe: pd.DataFrame):
+    """
+    Returns the data source for an Altair chart according to CHART_DATA_MODE.
+
+    In "url" mode, DataFrames with at least CHART_URL_MIN_ROWS rows are written once
+    as JSON into the static folder, named by their content hash, and the chart loads
+    them by URL, so the browser can cache them across reruns instead of receiving
+    them inside every spec. It requires server.enableStaticServing.
+
+    Args:
+        dataframe (pd.DataFrame): The DataFrame to embed in the chart.
+
+    Returns:
+        pd.DataFrame or alt.UrlData: The DataFrame or a URL to its JSON file.
+    """
+    if chart_data_mode != "url" or len(dataframe) < chart_url_min_rows:
+        return dataframe
+
+    payload = dataframe.to_json(orient="records", date_format="iso")
+    file_name = f"{hashlib.sha1(payload.encode('utf-8')).hexdigest()}.json"
+    file_path = os.path.join(chart_static_dir, file_name)
+    if not os.path.exists(file_path):
+        os.makedirs(chart_static_dir, exist_ok=True)
+        temporary_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as json_file:
+            json_file.write(payload)
+        os.replace(temporary_path, file_path)
+
+    return alt.UrlData(url=f"app/static/chart_data/{file_name}")
+
+
+def build_sales_vs_profits_chart(data: pd.DataFrame) -> alt.Chart:
     """
-    Generates a line graph with ticks for monthly sales and profits,
+    Builds a line graph with ticks for monthly sales and profits,
     with 'K' format and currency symbol in the tooltip.
 
     Args:
@@ -532,70 +1527,205 @@ def plot_sales_vs_profits(data: pd.DataFrame) -> None:
             - year_concept
             - total_sales
             - total_gpm
+
+    Returns:
+        alt.Chart: The Altair chart.
     """
-    # Sort by month to ensure sequence
-    data = data.sort_values("month_concept")
-
-    # Add month names
-    data["month_name"] = data["month_concept"].apply(
-        lambda x: [
-            "Enero",
-            "Febrero",
-            "Marzo",
-            "Abril",
-            "Mayo",
-            "Junio",
-            "Julio",
-            "Agosto",
-            "Septiembre",
-            "Octubre",
-            "Noviembre",
-            "Diciembre",
-        ][x - 1]
-    )
+    # One row per month, the metrics are folded and formatted by Vega
+    monthly_data = chart_data.prepare_sales_vs_profits(data)
 
-    # Change format to graph both metrics in a single column
-    melted_data = data.melt(
-        id_vars=["month_name"],
-        value_vars=["total_sales", "total_gpm"],
-        var_name="Métrica",
-        value_name="Valor",
+    # Create the graph with Altair
+    chart = (
+        alt.Chart(chart_source(monthly_data))
+        .transform_fold(["total_sales", "total_gpm"], as_=["metric_key", "Valor"])
+        .transform_calculate(
+            Métrica="datum.metric_key == 'total_sales' ? 'Ventas' : 'Ganancias'",
+            # Thousands (K) format and currency symbol
+            Valor_formateado="'$' + format(datum.Valor / 1000, ',.1f') + 'K'",
+        )
+        .mark_line(point=True)
+        .encode(
+            x=alt.X("month_name:O", title="Mes", sort=chart_data.MONTH_NAMES),
+            y=alt.Y("Valor:Q", title="Valor (en pesos)"),
+            color=alt.Color(
+                "Métrica:N",
+                title="Métrica",
+                scale=alt.Scale(
+                    domain=["Ventas", "Ganancias"], range=["blue", "green"]
+                ),
+            ),
+            tooltip=[
+                alt.Tooltip("month_name:O", title="Mes"),
+                alt.Tooltip("Métrica:N", title="Métrica"),
+                alt.Tooltip("Valor_formateado:N", title="Monto"),
+            ],
+        )
+        .properties(width=700, height=400, title="Ventas vs Ganancias Mensuales")
     )
+    return chart
+
+
+def plot_sales_vs_profits(data: pd.DataFrame) -> None:
+    """
+    Shows the line graph of the monthly sales and profits in Streamlit.
+
+    Args:
+        data (pd.DataFrame): DataFrame with columns month_concept, year_concept,
+            total_sales and total_gpm.
+    """
+    st.altair_chart(build_sales_vs_profits_chart(data), use_container_width=True)
+
+
+def build_forecast_chart(
+    dataframe: pd.DataFrame,
+    column: str,
+    forecast: dict,
+    title: str,
+    history_months: int = 24,
+) -> alt.Chart:
+    """
+    Builds a line graph of the last closed months of a KPI and its forecast,
+    with the interval of the forecast as a band.
+
+    Args:
+        dataframe (pd.DataFrame): DataFrame with columns month_concept, year_concept
+            and the KPI column.
+        column (str): The KPI column.
+        forecast (dict): The forecast of the KPI, from fetch_forecast.
+        title (str): The chart title.
+        history_months (int): The number of closed months shown before the forecast.
 
-    # Map friendly names to metrics
-    metric_labels = {"total_sales": "Ventas", "total_gpm": "Ganancias"}
-    melted_data["Métrica"] = melted_data["Métrica"].map(metric_labels)
+    Returns:
+        alt.Chart: The Altair chart.
+    """
+    totals = (
+        dataframe.groupby(["year_concept", "month_concept"])[column].sum().reset_index()
+    )
+    totals["date"] = pd.to_datetime(
+        {"year": totals["year_concept"], "month": totals["month_concept"], "day": 1}
+    )
+    last_closed = pd.Timestamp(
+        year=forecast["last_year"], month=forecast["last_month"], day=1
+    )
+    totals = totals[
+        (totals["date"] <= last_closed)
+        & (totals["date"] > last_closed - pd.DateOffset(months=history_months))
+    ]
+    history = budget_chart_data(
+        pd.DataFrame(
+            {"date": totals["date"], "value": totals[column], "Serie": "Real"}
+        ),
+        x_column="date",
+        y_column="value",
+    )
 
-    # Thousands (K) format and currency symbol
-    melted_data["Valor_formateado"] = melted_data["Valor"].apply(
-        lambda x: f"${x/1000:,.1f}K"
+    points = pd.DataFrame(forecast["points"])
+    points["date"] = pd.to_datetime(
+        {"year": points["year"], "month": points["month"], "day": 1}
+    )
+    points["Serie"] = "Pronóstico"
+    # The forecast line starts at the last closed month
+    if not history.empty:
+        points = pd.concat(
+            [history.tail(1).assign(Serie="Pronóstico"), points], ignore_index=True
+        )
+    points = points[["date", "value", "lower", "upper", "Serie"]]
+
+    base = alt.Chart(
+        chart_source(pd.concat([history, points], ignore_index=True))
+    ).encode(x=alt.X("date:T", title="Mes", axis=alt.Axis(format="%b %Y")))
+    band = (
+        base.transform_filter("isValid(datum.lower)")
+        .mark_area(opacity=0.2, color="orange")
+        .encode(y="lower:Q", y2="upper:Q")
+    )
+    line = base.mark_line(point=True).encode(
+        y=alt.Y("value:Q", title="Valor (en pesos)"),
+        color=alt.Color(
+            "Serie:N",
+            title="Serie",
+            scale=alt.Scale(domain=["Real", "Pronóstico"], range=["blue", "orange"]),
+        ),
+        tooltip=[
+            alt.Tooltip("date:T", title="Mes", format="%m/%Y"),
+            alt.Tooltip("Serie:N", title="Serie"),
+            alt.Tooltip("value:Q", title="Monto", format="$,.0f"),
+            alt.Tooltip("lower:Q", title="Mínimo", format="$,.0f"),
+            alt.Tooltip("upper:Q", title="Máximo", format="$,.0f"),
+        ],
     )
+    return (band + line).properties(width=700, height=300, title=title)
 
-    # Create the graph with Altair
-    chart = (
-        alt.Chart(melted_data)
-        .mark_line(point=True)
+
+def build_pareto_chart(curve: list, entity_title: str) -> alt.Chart:
+    """
+    Builds the Pareto curve of an ABC classification: the cumulative share of
+    sales and profit against the share of ranked products or clients.
+
+    Args:
+        curve (list): The sampled points of the curve, from fetch_abc.
+        entity_title (str): The title of the ranked entity, e.g. Productos.
+
+    Returns:
+        alt.Chart: The Altair chart.
+    """
+    return (
+        alt.Chart(chart_source(pd.DataFrame(curve)))
+        .transform_fold(["sales_share", "profit_share"], as_=["metric_key", "share"])
+        .transform_calculate(
+            Métrica="datum.metric_key == 'sales_share' ? 'Ventas' : 'Ganancias'"
+        )
+        .mark_line()
         .encode(
-            x=alt.X("month_name", title="Mes"),
-            y=alt.Y("Valor", title="Valor (en pesos)"),
+            x=alt.X("rank_share:Q", title=f"% de {entity_title}"),
+            y=alt.Y("share:Q", title="% acumulado"),
             color=alt.Color(
-                "Métrica",
+                "Métrica:N",
                 title="Métrica",
                 scale=alt.Scale(
                     domain=["Ventas", "Ganancias"], range=["blue", "green"]
                 ),
             ),
             tooltip=[
-                alt.Tooltip("month_name", title="Mes"),
-                alt.Tooltip("Métrica", title="Métrica"),
-                alt.Tooltip("Valor_formateado", title="Monto"),
+                alt.Tooltip("rank_share:Q", title=f"% de {entity_title}", format=".1f"),
+                alt.Tooltip("Métrica:N", title="Métrica"),
+                alt.Tooltip("share:Q", title="% acumulado", format=".1f"),
             ],
         )
-        .properties(width=700, height=400, title="Ventas vs Ganancias Mensuales")
+        .properties(width=700, height=350, title=f"Curva de Pareto de {entity_title}")
     )
 
-    # Show the graph with Streamlit
-    st.altair_chart(chart, use_container_width=True)
+
+def build_cohort_chart(cohorts: pd.DataFrame) -> alt.Chart:
+    """
+    Builds the retention heatmap of the client cohorts: the share of every cohort
+    that purchased every month after its first purchase.
+
+    Args:
+        cohorts (pd.DataFrame): The retention of the cohorts, from fetch_cohorts.
+
+    Returns:
+        alt.Chart: The Altair chart.
+    """
+    return (
+        alt.Chart(chart_source(budget_chart_data(cohorts, first_column="offset")))
+        .mark_rect()
+        .encode(
+            x=alt.X("offset:O", title="Meses desde la primera compra"),
+            y=alt.Y("cohort:O", title="Primera compra"),
+            color=alt.Color(
+                "share:Q", title="% de clientes", scale=alt.Scale(scheme="blues")
+            ),
+            tooltip=[
+                alt.Tooltip("cohort:O", title="Primera compra"),
+                alt.Tooltip("size:Q", title="Clientes", format=","),
+                alt.Tooltip("offset:O", title="Mes"),
+                alt.Tooltip("clients:Q", title="Compraron", format=","),
+                alt.Tooltip("share:Q", title="% de clientes", format=".1f"),
+            ],
+        )
+        .properties(width=700, height=350, title="Retención de clientes por cohorte")
+    )
 
 
 def create_weekly_stacked_chart(
@@ -623,27 +1753,20 @@ def create_weekly_stacked_chart(
             "La columna 'movement_date' contiene valores no válidos para fechas."
         )
 
-    # Get current date, week number and current year
+    # Get current date
     today = pd.Timestamp.now()
-    current_week = today.isocalendar().week
-    current_year = today.isocalendar().year
-
-    # Add column with the name of the day of the week
-    dataframe["day_name"] = dataframe["movement_date"].dt.day_name(locale="es_ES")
 
     # Filter by week and current year if required
     if filter_current_week:
-        dataframe["week"] = dataframe["movement_date"].dt.isocalendar().week
-        dataframe["year"] = dataframe["movement_date"].dt.isocalendar().year
+        # Calculate the date range of the current week
+        week_start = (today - pd.Timedelta(days=today.weekday())).normalize()
+        week_end = week_start + pd.Timedelta(days=6)
 
-        # Filter by current year and current week
+        # Filter by the current ISO week
         dataframe = dataframe[
-            (dataframe["week"] == current_week) & (dataframe["year"] == current_year)
+            (dataframe["movement_date"] >= week_start)
+            & (dataframe["movement_date"] < week_start + pd.Timedelta(days=7))
         ]
-
-        # Calculate the date range of the current week
-        week_start = today - pd.Timedelta(days=today.weekday())
-        week_end = week_start + pd.Timedelta(days=6)
     else:
         # Calculate full date range
         week_start = dataframe["movement_date"].min()
@@ -657,38 +1780,19 @@ def create_weekly_stacked_chart(
     # Create dynamic title with date range
     title = f"Semana del {week_start.strftime('%d/%m/%Y')} al {week_end.strftime('%d/%m/%Y')}"
 
-    # Group by day of the week
-    daily_data = dataframe.groupby("day_name")[["sales", "profit"]].sum().reset_index()
-
-    # Translate the columns
-    daily_data = daily_data.rename(columns={"sales": "Ventas", "profit": "Ganancias"})
-
-    # Divide values ​​into thousands for simplicity
-    daily_data["Ventas"] /= 1000
-    daily_data["Ganancias"] /= 1000
-
-    # Transform data to long format
-    long_format = daily_data.melt(
-        id_vars=["day_name"], var_name="tipo", value_name="monto"
-    )
+    # Group by day of the week, values in thousands
+    daily_data = chart_data.prepare_weekly_sales(dataframe)
 
     # Create the chart
     chart = (
-        alt.Chart(long_format)
+        alt.Chart(chart_source(daily_data))
+        .transform_fold(["Ventas", "Ganancias"], as_=["tipo", "monto"])
         .mark_bar()
         .encode(
             x=alt.X(
                 "day_name:N",
                 title="Día de la Semana",
-                sort=[
-                    "lunes",
-                    "martes",
-                    "miércoles",
-                    "jueves",
-                    "viernes",
-                    "sábado",
-                    "domingo",
-                ],
+                sort=chart_data.DAY_NAMES,
             ),
             y=alt.Y("monto:Q", title="Cantidad (en miles de pesos)"),
             color=alt.Color(
@@ -716,7 +1820,7 @@ def create_weekly_stacked_chart(
     return chart
 
 
-def generate_donut_chart(
+def build_donut_chart(
     dataframe: pd.DataFrame,
     name_title: str,
     tooltip_name_title: str,
@@ -724,7 +1828,7 @@ def generate_donut_chart(
     is_graphing_amounts=True,
 ):
     """
-    Generate a donut graph with Altair for the top.
+    Build a donut graph with Altair for the top.
     Includes manual formatting for the weight and percentage symbol.
 
     Args:
@@ -733,47 +1837,44 @@ def generate_donut_chart(
         tooltip_name_title str: title for the tooltip of element name of the top.
         column_total_amount str: name of the amouunt field
         is_graphing_amounts bool: Are amounts being graphed?
+
+    Returns:
+        alt.Chart or str: Altair chart or message if there is nothing to graph.
+
+    Raises:
+        ValueError: If the DataFrame doesn't have the required columns or types.
     """
     if dataframe.empty:
-        st.warning(f"No hay datos para mostrar en el top de {name_title}.")
-        return
+        return f"No hay datos para mostrar en el top de {name_title}."
 
     if not {"name", column_total_amount}.issubset(dataframe.columns):
-        st.error(
+        raise ValueError(
             f"El DataFrame no contiene las columnas requeridas: 'name', '{column_total_amount}'."
         )
-        return
 
     if not pd.api.types.is_numeric_dtype(dataframe[column_total_amount]):
-        st.error(f"La columna '{column_total_amount}' debe contener valores numéricos.")
-        return
+        raise ValueError(
+            f"La columna '{column_total_amount}' debe contener valores numéricos."
+        )
 
-    # Calculate the percentage
-    dataframe = dataframe.copy()
+    # Calculate the total
     total_sales_sum = dataframe[column_total_amount].sum()
     if total_sales_sum == 0:
-        st.warning("Las ventas totales son cero. No se puede generar la gráfica.")
-        return
-
-    dataframe["percentage"] = (dataframe[column_total_amount] / total_sales_sum) * 100
-
-    # Format values ​​for the tooltip
-    if is_graphing_amounts:
-        dataframe["formatted_sales"] = dataframe[column_total_amount].apply(
-            lambda x: f"${x:,.2f}"
-        )
-    else:
-        dataframe["formatted_sales"] = dataframe[column_total_amount].apply(
-            lambda x: f"{x:,.1f}"
-        )
-
-    dataframe["formatted_percentage"] = dataframe["percentage"].apply(
-        lambda x: f"{x:.1f}%"
+        return "Las ventas totales son cero. No se puede generar la gráfica."
+
+    # Only the plotted columns are embedded, the percentage and the
+    # formats of the tooltip are computed by Vega
+    donut_data = budget_chart_data(
+        chart_data.prepare_donut(dataframe, column_total_amount),
+        name_column="name",
+        amount_column=column_total_amount,
     )
 
     # Create the donut graph
     chart = (
-        alt.Chart(dataframe)
+        alt.Chart(chart_source(donut_data))
+        .transform_joinaggregate(total=f"sum({column_total_amount})")
+        .transform_calculate(percentage=f"datum['{column_total_amount}'] / datum.total")
         .mark_arc(innerRadius=50, outerRadius=100)
         .encode(
             theta=alt.Theta(
@@ -782,18 +1883,71 @@ def generate_donut_chart(
             color=alt.Color(field="name", type="nominal", title=name_title),
             tooltip=[
                 alt.Tooltip("name:N", title=tooltip_name_title),
-                alt.Tooltip("formatted_sales:N", title="Ventas"),
-                alt.Tooltip("formatted_percentage:N", title="Porcentaje"),
+                alt.Tooltip(
+                    f"{column_total_amount}:Q",
+                    title="Ventas",
+                    format="$,.2f" if is_graphing_amounts else ",.1f",
+                ),
+                alt.Tooltip("percentage:Q", title="Porcentaje", format=".1%"),
             ],
         )
         .properties(width=400, height=400, title=f"Top de {name_title} (Dona)")
     )
+    return chart
 
-    # Render the graph in Streamlit
-    st.altair_chart(chart, use_container_width=True)
 
+def generate_donut_chart(
+    dataframe: pd.DataFrame,
+    name_title: str,
+    tooltip_name_title: str,
+    column_total_amount: str,
+    is_graphing_amounts=True,
+    key: str = None,
+):
+    """
+    Generate a donut graph with Altair for the top and show it in Streamlit.
 
-def create_table(
+    Args:
+        dataframe (pd.DataFrame): DataFrame with columns 'name' and 'total_sales'.
+        name_title str: title for the element name of the top.
+        tooltip_name_title str: title for the tooltip of element name of the top.
+        column_total_amount str: name of the amouunt field
+        is_graphing_amounts bool: Are amounts being graphed?
+        key str: widget key to make the slices selectable (optional).
+
+    Returns:
+        str: The name of the selected slice, None if the chart isn't selectable
+        or nothing is selected.
+    """
+    try:
+        chart = build_donut_chart(
+            dataframe,
+            name_title,
+            tooltip_name_title,
+            column_total_amount,
+            is_graphing_amounts,
+        )
+    except ValueError as e:
+        st.error(str(e))
+        return
+
+    if isinstance(chart, str):  # Nothing to graph
+        st.warning(chart)
+        return
+
+    if key is None:
+        # Render the graph in Streamlit
+        st.altair_chart(chart, use_container_width=True)
+        return
+
+    # A click on a slice selects its name and reruns the page
+    chart = chart.add_params(alt.selection_point(name="slice", fields=["name"]))
+    event = st.altair_chart(chart, use_container_width=True, on_select="rerun", key=key)
+    selected = event.selection.get("slice") or []
+    return selected[0]["name"] if selected else None
+
+
+def format_table(
     dataframe: pd.DataFrame,
     column_map: dict,
     column_amount_one: str = "sales",
@@ -802,7 +1956,7 @@ def create_table(
     title_two: str = "Ganancia",
 ):
     """
-    Create an interactive table with custom filters and headers.
+    Format a table with custom headers, amounts in thousands.
 
     Args:
         dataframe (pd.DataFrame): DataFrame with original data.
@@ -811,6 +1965,9 @@ def create_table(
         column_amount_two (str): Name of the profit or expense column.
         title_one (str): Title for the sales or purchases column.
         title_two (str): Title for the profit or expense column.
+
+    Returns:
+        pandas.io.formats.style.Styler: The styled table.
     """
 
     # Divide amounts by 1000 and add "K" to the format
@@ -825,25 +1982,54 @@ def create_table(
     displayed_df = displayed_df.reset_index(drop=True)
     displayed_df.index = displayed_df.index + 1
 
-    # Show table with styles
-    st.dataframe(
-        displayed_df.style.set_table_styles(
-            [
-                {
-                    "selector": "thead th",
-                    "props": [
-                        ("background-color", "#FFDDC1"),
-                        ("color", "black"),
-                        ("font-weight", "bold"),
-                    ],
-                }
-            ]
-        ).format(
+    # Table with styles
+    return displayed_df.style.set_table_styles(
+        [
             {
-                title_one: "${:,.2f}K",
-                title_two: "${:,.2f}K",
-                "Cantidad": "{:,.1f}",
-            }  # Format for specific columns
+                "selector": "thead th",
+                "props": [
+                    ("background-color", "#FFDDC1"),
+                    ("color", "black"),
+                    ("font-weight", "bold"),
+                ],
+            }
+        ]
+    ).format(
+        {
+            title_one: "${:,.2f}K",
+            title_two: "${:,.2f}K",
+            "Cantidad": "{:,.1f}",
+        }  # Format for specific columns
+    )
+
+
+def create_table(
+    dataframe: pd.DataFrame,
+    column_map: dict,
+    column_amount_one: str = "sales",
+    column_amount_two: str = "profit",
+    title_one: str = "Venta",
+    title_two: str = "Ganancia",
+):
+    """
+    Create an interactive table with custom filters and headers.
+
+    Args:
+        dataframe (pd.DataFrame): DataFrame with original data.
+        column_map (dict): Dictionary that maps original column names to custom names.
+        column_amount_one (str): Name of the sales or purchases column.
+        column_amount_two (str): Name of the profit or expense column.
+        title_one (str): Title for the sales or purchases column.
+        title_two (str): Title for the profit or expense column.
+    """
+    st.dataframe(
+        format_table(
+            dataframe,
+            column_map,
+            column_amount_one,
+            column_amount_two,
+            title_one,
+            title_two,
         ),
         use_container_width=True,
     )
@@ -0,0 +1,92 @@
+"""
+Shared setup of the tests.
+
+The backend and the dashboard read their settings from the environment when
+their modules are imported, so they are set here before any test imports them:
+the API runs with DBMS=SQLITE against a synthetic SAE database
+(benchmarks/synthetic_sae.py), and its stores are written to a temporary folder.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+sys.path.insert(0, os.path.join(ROOT, "dashboard"))
+
+STORE_DIR = tempfile.mkdtemp(prefix="sae_tests_")
+os.environ.update(
+    {
+        "DBMS": "SQLITE",
+        "RESULT_CACHE_TTL": "3600",
+        "RESULT_CACHE_FILE": "",
+        "CHANGE_DETECTION_INTERVAL": "0",
+        "ANOMALY_INTERVAL": "0",
+        "SNAPSHOT_INTERVAL": "0",
+        "SLOW_QUERY_LOG": os.path.join(STORE_DIR, "slow_queries.db"),
+        "SKETCH_STORE": os.path.join(STORE_DIR, "sketches.db"),
+        "ANOMALY_STORE": os.path.join(STORE_DIR, "anomalies.db"),
+        "INITIAL_YEAR": "2015",
+        "NUMBER_OF_DATABASES": "1",
+        "TOP_N": "10",
+    }
+)
+
+# Scale factor of the synthetic database, small enough to build in a second
+TEST_SCALE = 0.05
+
+
+@pytest.fixture(scope="session")
+def synthetic_db(tmp_path_factory) -> str:
+    """
+    Builds the synthetic SAE database of company 1 once per test session.
+
+    Returns:
+        str: The path of the SQLite file.
+    """
+    import synthetic_sae
+
+    path = str(tmp_path_factory.mktemp("sae") / "sae01.db")
+    synthetic_sae.generate(path, scale=TEST_SCALE, db_number=1)
+    return path
+
+
+@pytest.fixture
+def sae_db(synthetic_db, tmp_path, monkeypatch) -> str:
+    """
+    Points company 1 at a writable copy of the synthetic database, with an empty
+    result cache and without previous change detection state.
+
+    Returns:
+        str: The path of the copy, the tests write to it with sqlite3.
+    """
+    import cache
+    import change_detection
+
+    path = str(tmp_path / "sae01.db")
+    shutil.copyfile(synthetic_db, path)
+    monkeypatch.setenv("SQLITE_1", path)
+    cache.clear()
+    change_detection._state.clear()
+    yield path
+    cache.clear()
+    change_detection._state.clear()
+
+
+@pytest.fixture
+def client(sae_db):
+    """
+    Gets a test client of the API over the copy of the synthetic database.
+
+    Returns:
+        TestClient: The client, without starting the background tasks.
+    """
+    import main
+    from fastapi.testclient import TestClient
+
+    return TestClient(main.app)
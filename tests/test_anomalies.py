@@ -0,0 +1,44 @@
+"""
+Incremental detection of atypical days.
+"""
+
+from datetime import date, timedelta
+
+import numpy as np
+
+import anomalies
+
+
+def test_incremental_detection_scores_the_new_days_of_a_sparse_series(
+    monkeypatch,
+):
+    # A sale every ten days, so the days read before the last one checked
+    # don't fill the window, and a spike on the first new day
+    first_day = date(2020, 1, 1)
+    days = [
+        first_day + timedelta(days=10 * i) for i in range(3 * anomalies.anomaly_window)
+    ]
+    spike_day = days[-1] + timedelta(days=10)
+    days.append(spike_day)
+    sales = [100.0 + i % 5 for i in range(len(days) - 1)] + [10000.0]
+
+    def fetch_series(db_number, since=None):
+        selected = [i for i, day in enumerate(days) if since is None or day >= since]
+        return (
+            np.array([days[i] for i in selected], dtype="datetime64[D]"),
+            np.array([sales[i] for i in selected]),
+            np.array([sales[i] / 2 for i in selected]),
+        )
+
+    monkeypatch.setattr(anomalies, "fetch_series", fetch_series)
+    anomalies.invalidate(1)
+    try:
+        anomalies.detect(1, spike_day)
+        assert anomalies.get_last_date(1) == spike_day - timedelta(days=1)
+        assert anomalies.detect(1, spike_day + timedelta(days=1)) == 1
+        flagged = anomalies.get_anomalies(1)
+        assert [(row["movement_date"], row["kind"]) for row in flagged] == [
+            (spike_day.isoformat(), "sales_spike")
+        ]
+    finally:
+        anomalies.invalidate(1)
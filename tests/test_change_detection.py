@@ -0,0 +1,128 @@
+"""
+Change detection of the source tables and invalidation of the result cache.
+"""
+
+import sqlite3
+from datetime import date
+
+import cache
+import change_detection
+import main
+import query_builder
+
+
+def cache_key(name: str, year: int, month: int = None) -> tuple:
+    """
+    Builds the result cache key of a dataset over a period, as run_dataset does.
+    """
+    start, end = query_builder.period_range(year, month)
+    return (name, 1, "range", start, end)
+
+
+def run_periods(periods: list):
+    """
+    Runs datasets over periods, so their results are cached.
+
+    Args:
+        periods (list): The dataset names with their year and month (or None).
+    """
+    for name, year, month in periods:
+        main.run_dataset("/test/", name, 1, year, month)
+        assert cache.get(cache_key(name, year, month)) is not None
+
+
+def test_new_invoice_invalidates_only_the_current_period(sae_db):
+    today = date.today()
+    change_detection.check(1)
+    periods = [
+        ("sales", today.year, today.month),
+        ("sales", today.year, None),
+        ("sales", today.year - 1, None),
+        ("gross-profit-margin", today.year - 1, 12),
+        ("purchases", today.year, today.month),
+    ]
+    run_periods(periods)
+    version = change_detection.get_data_version(1)["version"]
+
+    connection = sqlite3.connect(sae_db)
+    client, seller = connection.execute(
+        "SELECT CVE_CLPV, CVE_VEND FROM FACTF01 LIMIT 1"
+    ).fetchone()
+    connection.execute(
+        "INSERT INTO FACTF01 VALUES ('FTEST0001', ?, ?, ?, 'E', 1000, 1)",
+        (client, seller, today.isoformat()),
+    )
+    connection.execute(
+        "INSERT INTO PAR_FACTF01 VALUES ('FTEST0001', 1, 'A0000001', 1, 1000, 500, 1)"
+    )
+    connection.commit()
+    connection.close()
+
+    changes = change_detection.check(1)
+
+    assert changes == [("FACTF", date(today.year, today.month, 1))]
+    # The periods that contain the current month are invalidated
+    assert cache.get(cache_key("sales", today.year, today.month)) is None
+    assert cache.get(cache_key("sales", today.year)) is None
+    # The closed periods and the results of other tables are kept
+    assert cache.get(cache_key("sales", today.year - 1)) is not None
+    assert cache.get(cache_key("gross-profit-margin", today.year - 1, 12)) is not None
+    assert cache.get(cache_key("purchases", today.year, today.month)) is not None
+    assert change_detection.get_data_version(1)["version"] not in (0, version)
+
+
+def test_cancelled_old_invoice_invalidates_every_factf_result(sae_db):
+    today = date.today()
+    change_detection.check(1)
+    periods = [
+        ("sales", today.year, today.month),
+        ("sales", today.year - 2, None),
+        ("sellers", today.year - 1, None),
+        ("gross-profit-margin", today.year - 1, 12),
+        ("sales-vs-profit", today.year - 3, 6),
+        ("purchases", today.year - 1, None),
+    ]
+    run_periods(periods)
+
+    # An invoice older than the months fingerprinted one by one
+    window_start = query_builder.month_start(
+        today, change_detection.change_detection_months
+    )
+    connection = sqlite3.connect(sae_db)
+    (document,) = connection.execute(
+        "SELECT CVE_DOC FROM FACTF01 WHERE STATUS <> 'C' AND FECHA_DOC < ? "
+        "ORDER BY FECHA_DOC LIMIT 1",
+        (window_start.isoformat(),),
+    ).fetchone()
+    connection.execute("UPDATE FACTF01 SET STATUS = 'C' WHERE CVE_DOC = ?", (document,))
+    connection.commit()
+    connection.close()
+
+    changes = change_detection.check(1)
+
+    # The changed period can't be located, every FACTF result is invalidated
+    assert changes == [("FACTF", None)]
+    for name, year, month in periods:
+        cached = cache.get(cache_key(name, year, month))
+        if "FACTF" in cache.get_source_tables(name):
+            assert cached is None, name
+        else:
+            assert cached is not None, name
+
+
+def test_processes_that_checked_the_same_data_report_the_same_version(sae_db):
+    change_detection.check(1)
+    connection = sqlite3.connect(sae_db)
+    connection.execute(
+        "UPDATE COMPC01 SET STATUS = 'C' WHERE CVE_DOC = "
+        "(SELECT MIN(CVE_DOC) FROM COMPC01 WHERE STATUS <> 'C')"
+    )
+    connection.commit()
+    connection.close()
+    assert change_detection.check(1)
+    version = change_detection.get_data_version(1)["version"]
+
+    # A worker process started after the change never saw it
+    change_detection._state.clear()
+
+    assert change_detection.get_data_version(1)["version"] == version
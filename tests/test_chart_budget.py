@@ -0,0 +1,60 @@
+"""
+Data budget of the charts of the dashboard.
+"""
+
+import chart_data
+import numpy as np
+import pandas as pd
+import utilities
+
+
+def test_long_forecast_history_is_downsampled(monkeypatch):
+    monkeypatch.setattr(utilities, "max_chart_points", 20)
+    months = pd.date_range("2000-01-01", periods=240, freq="MS")
+    data = pd.DataFrame(
+        {
+            "year_concept": months.year,
+            "month_concept": months.month,
+            "total_sales": np.arange(240, dtype="float64"),
+        }
+    )
+    forecast = {
+        "last_year": 2019,
+        "last_month": 12,
+        "points": [
+            {"year": 2020, "month": 1, "value": 1.0, "lower": 0.0, "upper": 2.0}
+        ],
+    }
+
+    chart = utilities.build_forecast_chart(
+        data, "total_sales", forecast, "Ventas", history_months=240
+    )
+
+    rows = chart.data
+    history = rows[rows["Serie"] == "Real"]
+    assert len(history) == 20
+    assert history["date"].max() == pd.Timestamp("2019-12-01")
+
+
+def test_cohort_heatmap_keeps_the_first_months(monkeypatch):
+    monkeypatch.setattr(utilities, "max_chart_points", 100)
+    cohorts = pd.DataFrame(
+        [
+            {"cohort": f"2015-{month:02d}", "size": 10, "offset": offset}
+            for month in range(1, 13)
+            for offset in range(120 - month)
+        ]
+    ).assign(clients=1, share=10.0)
+
+    rows = utilities.build_cohort_chart(cohorts).data
+
+    assert len(rows) <= 100
+    assert sorted(rows["offset"].unique()) == list(range(8))
+    assert len(rows[rows["offset"] == 0]) == 12
+
+
+def test_keep_first_values_keeps_the_first_value_over_threshold():
+    dataframe = pd.DataFrame({"offset": [0] * 5 + [1] * 5})
+
+    assert len(chart_data.keep_first_values(dataframe, "offset", 3)) == 5
+    assert len(chart_data.keep_first_values(dataframe, "offset", 10)) == 10
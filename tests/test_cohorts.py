@@ -0,0 +1,44 @@
+"""
+Cohort retention counts kept in memory.
+"""
+
+import threading
+
+import cohorts
+
+
+def test_reading_the_months_of_a_company_does_not_block_the_others():
+    started = threading.Event()
+    release = threading.Event()
+    rows = [
+        {"client": "C1", "year_concept": 2024, "month_concept": 1},
+        {"client": "C1", "year_concept": 2024, "month_concept": 2},
+        {"client": "C2", "year_concept": 2024, "month_concept": 2},
+    ]
+
+    def slow_rows(since):
+        started.set()
+        release.wait(10)
+        return rows
+
+    slow = threading.Thread(
+        target=cohorts.get_cohorts, args=(101, 1, (2024, 2), slow_rows)
+    )
+    slow.start()
+    try:
+        assert started.wait(10)
+        done = threading.Event()
+        result = []
+
+        def other_company():
+            result.append(cohorts.get_cohorts(102, 1, (2024, 2), lambda since: rows))
+            done.set()
+
+        threading.Thread(target=other_company, daemon=True).start()
+        assert done.wait(5)
+        assert [cohort["clients"] for cohort in result[0]] == [1, 1]
+    finally:
+        release.set()
+        slow.join(10)
+        cohorts.invalidate(101)
+        cohorts.invalidate(102)
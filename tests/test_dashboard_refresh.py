@@ -0,0 +1,40 @@
+"""
+Background refresh of the stale-while-revalidate store of the dashboard.
+"""
+
+import pandas as pd
+import pytest
+import utilities
+
+
+@pytest.mark.parametrize("error", [ValueError("delta"), TypeError("merge")])
+def test_failed_refresh_keeps_the_data_and_can_run_again(monkeypatch, error):
+    data = pd.DataFrame({"total_sales": [1.0]})
+    store = utilities.get_swr_store()
+    key = ("sales", 99)
+    store["entries"][key] = {
+        "data": data,
+        "version": "20240101000000",
+        "fetched_at": 0,
+        "refreshing": True,
+    }
+    monkeypatch.setattr(
+        utilities,
+        "request_dashboard_sync",
+        lambda *args: {"version": "v", "since_period": None, "data": data},
+    )
+
+    def merge(*args):
+        raise error
+
+    monkeypatch.setattr(utilities, "merge_dashboard_delta", merge)
+
+    try:
+        utilities.refresh_dashboard_data(*key)
+    except TypeError:
+        pass  # Unexpected errors end the thread, after releasing the refresh
+
+    entry = store["entries"].pop(key)
+    assert entry["refreshing"] is False
+    assert entry["data"] is data
+    assert entry["version"] == "20240101000000"
@@ -0,0 +1,27 @@
+"""
+Distinct counts of clients, sellers and providers.
+"""
+
+from datetime import date
+
+
+def test_exact_counts_are_integers(client):
+    year = date.today().year - 1
+    exact = client.get(f"/distinct-counts/?year={year}").json()["counts"]
+    union = client.get(f"/distinct-counts/?year={year}&db_numbers=1,1").json()
+
+    assert exact and all(type(count) is int for count in exact.values())
+    assert union["counts"] == exact
+
+
+def test_approximate_counts_are_estimates(client):
+    year = date.today().year - 1
+    exact = client.get(f"/distinct-counts/?year={year}").json()["counts"]
+    approximate = client.get(f"/distinct-counts/?year={year}&mode=approximate").json()[
+        "counts"
+    ]
+
+    assert approximate.keys() == exact.keys()
+    for entity, count in approximate.items():
+        assert type(count) is float
+        assert abs(count - exact[entity]) <= max(exact[entity] * 0.1, 2)
@@ -0,0 +1,21 @@
+"""
+Forecasts of the monthly series of the KPIs.
+"""
+
+import pytest
+
+
+def test_forecast_of_the_default_metrics(client):
+    response = client.get("/forecast/?months=2")
+
+    assert response.status_code == 200
+    forecasts = response.json()["forecasts"]
+    assert [forecast["metric"] for forecast in forecasts] == ["sales", "gross_profit"]
+    assert all(len(forecast["points"]) == 2 for forecast in forecasts)
+
+
+@pytest.mark.parametrize(
+    "metrics", ["clients", "sellers", "providers", "sales:median", "unknown"]
+)
+def test_metrics_without_monthly_series_are_rejected(client, metrics):
+    assert client.get(f"/forecast/?metrics={metrics}").status_code == 422
@@ -0,0 +1,13 @@
+"""
+Cold start budgets of the backend and the dashboard (benchmarks/import_time.py).
+"""
+
+import pytest
+from import_time import BUDGETS, TARGETS, check_budget
+
+
+@pytest.mark.parametrize("name", list(TARGETS))
+def test_cold_start_within_budget(name):
+    _, _, failures = check_budget(name, BUDGETS[name])
+
+    assert not failures, "\n".join(failures)
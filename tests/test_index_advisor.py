@@ -0,0 +1,16 @@
+"""
+Index advisor of the access paths of the endpoints.
+"""
+
+import index_advisor
+
+
+def test_benchmark_times_the_endpoints_without_required_parameters(sae_db):
+    timings = index_advisor.benchmark(1, repeat=1)
+
+    # Endpoints with Query parameters run with their defaults
+    for path in ["/sales/", "/anomalies/", "/forecast/", "/cohorts/"]:
+        assert timings[path] > 0, path
+    # Endpoints with required parameters aren't timed
+    for path in ["/kpis/", "/distinct-counts/", "/drill-down/line-products/"]:
+        assert path not in timings, path
@@ -0,0 +1,46 @@
+"""
+Inventory turnover, days of stock and slow movers.
+"""
+
+import sqlite3
+from datetime import date
+
+import inventory
+
+
+def test_products_without_line_are_kept(client, sae_db):
+    connection = sqlite3.connect(sae_db)
+    (product,) = connection.execute("SELECT CVE_ART FROM INVE01 LIMIT 1").fetchone()
+    connection.execute(
+        "UPDATE INVE01 SET LIN_PROD = 'SIN LINEA' WHERE CVE_ART = ?", (product,)
+    )
+    (products,) = connection.execute("SELECT COUNT(*) FROM INVE01").fetchone()
+    connection.commit()
+    connection.close()
+
+    year = date.today().year - 1
+    response = client.get(f"/inventory/products/?year={year}&limit=100000")
+    assert response.status_code == 200
+    assert response.json()["count"] == products
+    items = {item["product"]: item for item in response.json()["items"]}
+    assert items[product]["line"] == inventory.NO_LINE
+
+    lines = client.get(f"/inventory/lines/?year={year}").json()["items"]
+    assert inventory.NO_LINE in [line["name"] for line in lines]
+
+
+def test_future_period_is_rejected(client):
+    today = date.today()
+    assert client.get(f"/inventory/products/?year={today.year + 1}").status_code == 422
+    assert client.get(f"/inventory/products/?year={today.year}").status_code == 200
+    if today.month < 12:
+        response = client.get(
+            f"/inventory/lines/?year={today.year}&month={today.month + 1}"
+        )
+        assert response.status_code == 422
+
+
+def test_page_must_be_valid(client):
+    year = date.today().year - 1
+    assert client.get(f"/inventory/products/?year={year}&limit=0").status_code == 422
+    assert client.get(f"/inventory/products/?year={year}&offset=-1").status_code == 422
@@ -0,0 +1,41 @@
+"""
+Labels of the request and query metrics.
+"""
+
+from datetime import date
+
+import pytest
+
+
+@pytest.mark.parametrize(
+    "url, label",
+    [
+        ("/sync/sales/", "/sync/{dataset}/"),
+        ("/sync/purchases/", "/sync/{dataset}/"),
+        ("/abc/products/?year={year}", "/abc/{entity}/"),
+        ("/inventory/lines/?year={year}", "/inventory/{level}/"),
+        ("/export/sales/?year={year}", "/export/{dataset}/"),
+    ],
+)
+def test_templated_routes_share_their_label(client, url, label):
+    year = date.today().year - 1
+    assert client.get(url.format(year=year)).status_code == 200
+
+    lines = client.get("/metrics").text.splitlines()
+
+    def labeled(metric):
+        return any(
+            line.startswith(f"{metric}_count{{")
+            and f'endpoint="{label}"' in line
+            and not line.endswith(" 0.0")
+            for line in lines
+        )
+
+    assert labeled("dashboard_request_seconds")
+    assert labeled("dashboard_db_query_seconds")
+
+
+def test_unknown_paths_share_one_label(client):
+    assert client.get("/unknown/").status_code == 404
+
+    assert 'endpoint="/unknown/"' not in client.get("/metrics").text
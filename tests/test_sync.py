@@ -0,0 +1,46 @@
+"""
+Incremental sync and export of the public datasets.
+"""
+
+import pytest
+import query_builder
+from datasets import DATASETS, PUBLIC_DATASETS
+
+
+def test_public_datasets_have_a_date_column():
+    for name in PUBLIC_DATASETS:
+        assert DATASETS[name].get("date_column", DATASETS[name].get("period")), name
+
+
+@pytest.mark.parametrize(
+    "dataset",
+    [
+        "products-catalog",
+        "clients-catalog",
+        "inventory-stock",
+        "inventory-movements",
+        "client-months",
+        "clients-distinct",
+        "clients-names",
+    ],
+)
+def test_internal_datasets_are_not_served(client, dataset):
+    assert client.get(f"/sync/{dataset}/").status_code == 404
+    assert client.get(f"/sync/{dataset}/?since_period=2024-01").status_code == 404
+    assert client.get(f"/export/{dataset}/").status_code == 404
+
+
+def test_sync_since_a_period(client):
+    response = client.get("/sync/sales/?since_period=2024-01")
+
+    assert response.status_code == 200
+    assert response.json()["since_period"] == "2024-01"
+    assert all(
+        (row["year_concept"], row["month_concept"]) >= (2024, 1)
+        for row in response.json()["rows"]
+    )
+
+
+def test_date_filter_needs_a_date_column():
+    with pytest.raises(ValueError):
+        query_builder.compile_dataset("products-catalog", "SQLITE", 1, "since")
@@ -0,0 +1,56 @@
+"""
+Validation of the query parameters of the endpoints.
+"""
+
+import pytest
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "/sales/?year=1",
+        "/sales/?year=9999",
+        "/kpis/?year=1",
+        "/kpis/?year=1&month=1",
+        "/distinct-counts/?year=1",
+        "/anomalies/?year=0",
+        "/abc/products/?year=1",
+        "/drill-down/line-products/?line=X&year=1",
+        "/drill-down/product-invoices/?product=X&year=9999",
+        "/inventory/products/?year=1",
+        "/cohorts/?year=0",
+        "/export/sales/?year=1",
+    ],
+)
+def test_invalid_year_is_rejected(client, url):
+    assert client.get(url).status_code == 422
+
+
+def test_export_top_must_be_positive(client):
+    assert client.get("/export/sales/?top=0").status_code == 422
+    assert client.get("/export/sales/?top=-1").status_code == 422
+    response = client.get("/export/sales/?top=2")
+    assert response.status_code == 200
+    assert len(response.text.strip().splitlines()) == 3
+
+
+def test_anomalies_limit_must_be_positive(client):
+    assert client.get("/anomalies/?limit=0").status_code == 422
+    assert client.get("/anomalies/?limit=-1").status_code == 422
+    response = client.get("/anomalies/?limit=1")
+    assert response.status_code == 200
+    assert len(response.json()["anomalies"]) <= 1
+
+
+@pytest.mark.parametrize("query", ["limit=0", "limit=-1", "offset=-1", "points=1"])
+def test_abc_page_must_be_valid(client, query):
+    assert client.get(f"/abc/products/?year=2024&{query}").status_code == 422
+
+
+@pytest.mark.parametrize("limit", [0, -1, 1001])
+def test_slow_queries_limit_must_be_within_the_log(client, limit):
+    assert client.get(f"/debug/slow-queries?limit={limit}").status_code == 422
+
+
+def test_slow_queries_limit(client):
+    assert client.get("/debug/slow-queries?limit=1000").status_code == 200